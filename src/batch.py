@@ -0,0 +1,338 @@
+"""
+Embedded in-process batch runner for the document summarization graph.
+
+This module invokes the compiled `graph` of `src/summarizer.py` directly, without
+going through a LangGraph server and its SDK client, over either a directory of
+documents or a JSONL file of documents. Summaries are streamed to a JSONL output
+file as soon as every document completes, so that nightly batch jobs can be resumed
+after an interruption without summarizing the already completed documents again.
+
+Every line of an input JSONL file is either a file in the information structure of
+Open WebUI ({"file": {"id": ..., "filename": ..., "meta": {...}, "data": {"content": ...}}})
+or a flat document ({"id": ..., "filename": ..., "content_type": ..., "content": ...}).
+
+Usage:
+    python -m src.batch -i documents/ -o summaries.jsonl -c 4 -r
+
+    Options:
+    -i, --input: Path to a directory of documents or to a JSONL file of documents
+    -o, --output: Path to the JSONL file to stream the summaries to
+    -c, --concurrency: Number of documents summarized concurrently (default: 4)
+    -r, --resume: Skip documents already summarized successfully in the output file (default: False)
+    -R, --recursive: Scan subdirectories of the input directory recursively (default: False)
+    -e, --extensions: List of file extensions to include from the input directory (default: all supported)
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import sys
+import time
+import uuid
+
+from src.extractors import get_document_data
+from src.utils import get_logger
+
+
+logger = get_logger()
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.html', '.htm'}
+RICH_EXTENSIONS = {'.docx', '.pdf', '.rtf', '.odt'}
+
+
+def normalize_record(record: Dict[str, Any], default_id: str = '') -> Dict[str, Any]:
+    """
+    Convert a document record into the information structure of the files in Open WebUI.
+
+    Args:
+        record (Dict[str, Any]): Either an Open WebUI file or a flat document record.
+        default_id (str): ID to assign to the document if the record has none.
+
+    Returns:
+        Dict[str, Any]: The document in the information structure of Open WebUI files.
+    """
+    if isinstance(record.get("file"), dict):
+        # IDs are compared as strings, e.g. to the keys of the summaries, so numeric IDs are converted
+        if record["file"].get("id") is not None:
+            record["file"]["id"] = str(record["file"]["id"])
+        return record
+
+    doc_id = record.get("id")
+    filename = record.get("filename") or record.get("name") or default_id
+    content = record.get("content", '')
+
+    return {
+        "file": {
+            "id": str(doc_id if doc_id not in (None, '') else default_id or filename),
+            "filename": filename,
+            "meta": {
+                "content_type": record.get("content_type") or record.get("type") or mimetypes.guess_type(filename)[0] or "text/plain",
+                "size": len(content.encode("utf-8")),
+            },
+            "data": {
+                "content": content,
+            },
+        }
+    }
+
+def record_id(record: Dict[str, Any]) -> str:
+    """Get the ID of a document in the information structure of Open WebUI files."""
+    return str(record.get("file", {}).get("id", ''))
+
+def iter_jsonl_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Lazily iterate over the documents of a JSONL file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                yield normalize_record(json.loads(line), default_id=str(line_number))
+            except (json.JSONDecodeError, AttributeError) as e:
+                logger.error(f"✕ ERROR: Invalid document on line {line_number} of {path}: {str(e)}")
+
+def iter_directory_paths(path: str, recursive: bool = False, extensions: Optional[List[str]] = None) -> Iterator[str]:
+    """Lazily iterate over the paths of the supported documents of a directory, in name order."""
+    allowed = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in extensions} if extensions else TEXT_EXTENSIONS | RICH_EXTENSIONS
+
+    if recursive:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in allowed:
+                    yield os.path.join(root, name)
+    else:
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if os.path.isfile(file_path) and os.path.splitext(name)[1].lower() in allowed:
+                yield file_path
+
+async def load_directory_record(file_path: str, base_path: str) -> Dict[str, Any]:
+    """
+    Load a document of a directory into the information structure of the files in Open WebUI.
+
+    Args:
+        file_path (str): Path to the document.
+        base_path (str): Path to the input directory, used to derive a stable document ID.
+
+    Returns:
+        Dict[str, Any]: The document in the information structure of Open WebUI files.
+    """
+    doc_id = os.path.relpath(file_path, base_path)
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in TEXT_EXTENSIONS:
+        def _read(path: str) -> str:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()
+
+        content = await asyncio.to_thread(_read, file_path)
+
+        return normalize_record({
+            "id": doc_id,
+            "filename": os.path.basename(file_path),
+            "content": content,
+        })
+
+    return await get_document_data(file_path, file_id=doc_id)
+
+def load_completed_ids(output_path: str) -> Set[str]:
+    """Get the IDs of the documents summarized successfully in an existing output file."""
+    completed = set()
+
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line of an interrupted batch
+                continue
+
+            if result.get("status") == "ok" and result.get("id"):
+                completed.add(str(result["id"]))
+
+    return completed
+
+async def summarize_record(record: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Summarize a single document by invoking the compiled graph in-process.
+
+    Args:
+        record (Dict[str, Any]): The document in the information structure of Open WebUI files.
+        config (Dict[str, Any], optional): Configuration of the graph run.
+
+    Returns:
+        Dict[str, Any]: The outcome of the summarization, as written to the output JSONL file.
+    """
+    from src.serialization import get_checkpointer
+    from src.summarizer import get_local_graph
+
+    file_info = record.get("file", {})
+    doc_id = record_id(record)
+    start_time = time.monotonic()
+
+    outcome = {
+        "id": doc_id,
+        "filename": file_info.get("filename", ''),
+        "type": file_info.get("meta", {}).get("content_type", ''),
+    }
+
+    # Every run is checkpointed in a thread of its own, deleted once it completes, so that checkpoints never pile up
+    thread_id = uuid.uuid4().hex
+    config = config or {"configurable": {"run_id": f"batch-{doc_id}"}}
+    config = {**config, "configurable": {**(config.get("configurable") or {}), "thread_id": thread_id}}
+
+    try:
+        response = await get_local_graph().ainvoke({'files': [record]}, config=config)
+        result = (response or {}).get("result", {}).get(doc_id)
+
+        if result and result.get("summary"):
+            outcome.update({"status": "ok", "summary": result["summary"]})
+        else:
+            outcome.update({"status": "error", "error": "No summary generated"})
+    except Exception as e:
+        outcome.update({"status": "error", "error": f"{type(e).__name__}: {str(e)}"})
+    finally:
+        await get_checkpointer().adelete_thread(thread_id)
+
+    outcome["duration_s"] = round(time.monotonic() - start_time, 3)
+
+    return outcome
+
+async def summarize_records(
+    records: AsyncIterator[Dict[str, Any]],
+    concurrency: int = 4,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Summarize documents with limited concurrency, yielding every outcome as soon as it is available.
+
+    Only a bounded number of documents is held in memory at any time, so arbitrarily
+    large inputs can be streamed through the graph.
+
+    Args:
+        records (AsyncIterator[Dict[str, Any]]): Documents in the information structure of Open WebUI files.
+        concurrency (int): Number of documents summarized concurrently.
+
+    Yields:
+        Dict[str, Any]: The outcome of the summarization of every document, in completion order.
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be a positive integer.")
+
+    pending = set()
+
+    async for record in records:
+        pending.add(asyncio.create_task(summarize_record(record)))
+
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    resume: bool = False,
+    recursive: bool = False,
+    extensions: Optional[List[str]] = None,
+) -> Dict[str, int]:
+    """
+    Summarize the documents of a directory or a JSONL file and stream the outcomes to a JSONL file.
+
+    Args:
+        input_path (str): Path to a directory of documents or to a JSONL file of documents.
+        output_path (str): Path to the JSONL file to stream the summaries to.
+        concurrency (int): Number of documents summarized concurrently.
+        resume (bool): Whether to skip documents already summarized successfully in the output file.
+        recursive (bool): Whether to scan subdirectories of the input directory recursively.
+        extensions (List[str], optional): File extensions to include from the input directory.
+
+    Returns:
+        Dict[str, int]: Counters of the summarized, failed and skipped documents.
+    """
+    completed = load_completed_ids(output_path) if resume else set()
+    counters = {"ok": 0, "error": 0, "skipped": 0}
+
+    if completed:
+        logger.info(f"Resuming batch, {len(completed)} document(s) already summarized in {output_path}")
+
+    async def _records() -> AsyncIterator[Dict[str, Any]]:
+        if os.path.isdir(input_path):
+            for file_path in iter_directory_paths(input_path, recursive, extensions):
+                if os.path.relpath(file_path, input_path) in completed:
+                    counters["skipped"] += 1
+                    continue
+
+                try:
+                    yield await load_directory_record(file_path, input_path)
+                except Exception as e:
+                    counters["error"] += 1
+                    logger.error(f"✕ ERROR: Could not load document {file_path}: {str(e)}")
+        else:
+            for record in iter_jsonl_records(input_path):
+                if record_id(record) in completed:
+                    counters["skipped"] += 1
+                    continue
+
+                yield record
+
+    start_time = time.monotonic()
+
+    with open(output_path, 'a' if resume else 'w', encoding='utf-8') as f:
+        async for outcome in summarize_records(_records(), concurrency=concurrency):
+            counters[outcome["status"]] += 1
+            f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+            f.flush()
+
+            if outcome["status"] == "ok":
+                logger.info(f"✓ Summarized document {outcome['id']} in {outcome['duration_s']:.2f} seconds")
+            else:
+                logger.error(f"✕ ERROR: Could not summarize document {outcome['id']}: {outcome['error']}")
+
+    logger.info(f"Batch completed in {time.monotonic() - start_time:.2f} seconds: "
+                f"{counters['ok']} summarized, {counters['error']} failed, {counters['skipped']} skipped")
+
+    return counters
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point of the batch runner."""
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Batch Runner')
+    parser.add_argument("-i", "--input", help="Path to a directory of documents or to a JSONL file of documents", type=str, required=True)
+    parser.add_argument("-o", "--output", help="Path to the JSONL file to stream the summaries to", type=str, required=True)
+    parser.add_argument("-c", "--concurrency", help="Number of documents summarized concurrently", type=int, default=4)
+    parser.add_argument("-r", "--resume", help="Skip documents already summarized successfully in the output file", action="store_true")
+    parser.add_argument("-R", "--recursive", help="Scan subdirectories of the input directory recursively", action="store_true")
+    parser.add_argument("-e", "--extensions", help="List of file extensions to include from the input directory", type=str, nargs='+', default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        sys.exit(f"Wrong path to input documents: {args.input}")
+    if args.concurrency < 1:
+        sys.exit(f"Wrong concurrency: {args.concurrency}")
+
+    counters = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        resume=args.resume,
+        recursive=args.recursive,
+        extensions=args.extensions,
+    ))
+
+    return 1 if counters["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
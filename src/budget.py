@@ -0,0 +1,315 @@
+from collections import OrderedDict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import math
+import re
+import time
+
+from src.config import BUDGET_REDUCE_RESERVE, CHUNK_SIZE, TOKEN_MAX
+from src.prompts import map_template, reduce_template, system_prompt
+from src.scheduler import estimate_tokens
+from src.utils import get_logger
+
+
+logger = get_logger()
+run_budgets: "OrderedDict[str, RunBudget]" = OrderedDict()
+
+MAX_OPEN_BUDGETS = 1024
+# Rough output sizes of the prompts, i.e. a 20 word chunk summary and a 250 word final summary
+MAP_OUTPUT_TOKENS = 40
+REDUCE_OUTPUT_TOKENS = 400
+# Chunk size and collapse fan-in multipliers tried, in order, to fit an estimate into a token budget
+FAST_SCALES = (2, 4)
+
+
+def extractive_summary(text: str, max_words: int, max_chars: Optional[int] = None) -> str:
+    """Summarize a text without an LLM, keeping its leading sentences up to a number of words and characters."""
+    words = []
+
+    for sentence in re.split(r'(?<=[.!?;])\s+', text.strip()):
+        sentence_words = sentence.split()
+
+        if words and len(words) + len(sentence_words) > max_words:
+            break
+
+        words.extend(sentence_words[:max_words - len(words)])
+
+        if len(words) >= max_words:
+            break
+
+    summary = ' '.join(words)
+
+    return summary[:max_chars] if max_chars is not None else summary
+
+
+class BudgetCallbackHandler(BaseCallbackHandler):
+    '''
+    This is a class for charging the tokens of every LLM call of a run
+    to its budget, as reported by the usage of the LLM responses, or as
+    estimated from the prompts and completions if no usage is reported.
+    The calls of every stage are estimated with its own output allowance.
+    '''
+    run_inline = True
+
+    def __init__(self, budget: "RunBudget", output_tokens: int = MAP_OUTPUT_TOKENS):
+        self.budget = budget
+        self.output_tokens = output_tokens
+        self._estimated_tokens: Dict[Any, int] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: Any, **kwargs: Any) -> None:
+        estimated = sum(estimate_tokens(str(message.content)) for batch in messages for message in batch) + self.output_tokens
+        self._estimated_tokens[run_id] = estimated
+
+        # Count the call as committed while in flight, so that concurrent calls do not overshoot the budget
+        self.budget.committed_tokens += estimated
+
+    def on_llm_end(self, response: Any, *, run_id: Any, **kwargs: Any) -> None:
+        estimated = self._estimated_tokens.pop(run_id, 0)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tokens = usage.get("total_tokens")
+
+        if not tokens:
+            tokens = estimated - self.output_tokens + sum(estimate_tokens(generation.text) for generations in response.generations for generation in generations)
+
+        self.budget.committed_tokens -= estimated
+        self.budget.charge(tokens, estimated)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self.budget.committed_tokens -= self._estimated_tokens.pop(run_id, 0)
+
+
+class RunBudget:
+    '''
+    This is a class for governing the token and latency budget of a run.
+    It plans the summarization of the documents of the run around the
+    budget, and tracks the tokens spent and the time elapsed, so that the
+    nodes degrade gracefully as the budget is consumed:
+    - "full": the documents are summarized as configured.
+    - "fast": larger chunks and a larger collapse fan-in, i.e. fewer LLM
+      calls and less prompt overhead for the same content.
+    - "extractive": only an evenly spaced share of the chunks is mapped by
+      the LLM, the others are summarized by their leading sentences.
+    A share of the budget is reserved for the reduce step. Once the rest is
+    spent, or its deadline share has passed, chunks are summarized
+    extractively, and once the whole budget is spent, so are the collapse
+    and final summaries.
+    '''
+    def __init__(self, max_tokens: Optional[int] = None, deadline_s: Optional[float] = None, reserve: float = BUDGET_REDUCE_RESERVE):
+        if max_tokens is not None and max_tokens <= 0:
+            raise ValueError("Budget maximum tokens must be a positive integer.")
+        if deadline_s is not None and deadline_s <= 0:
+            raise ValueError("Budget deadline must be a positive number of seconds.")
+
+        self.max_tokens = max_tokens
+        self.deadline_s = deadline_s
+        self.reserve = reserve
+        self.started_at = time.monotonic()
+
+        self.mode = "full"
+        self.chunk_size = CHUNK_SIZE
+        self.token_max = TOKEN_MAX
+        self.map_ratio = 1.0
+        self.estimated_tokens = 0
+
+        self.spent_tokens = 0
+        self.estimated_spent_tokens = 0
+        self.committed_tokens = 0
+        self.llm_calls = 0
+        self.degraded_calls = 0
+        # Chunk summaries are short, while collapse and final summaries are as long as a final summary
+        self.map_callback = BudgetCallbackHandler(self, MAP_OUTPUT_TOKENS)
+        self.reduce_callback = BudgetCallbackHandler(self, REDUCE_OUTPUT_TOKENS)
+
+    @staticmethod
+    def estimate(sizes: List[int], chunk_size: int, token_max: int) -> Dict[str, int]:
+        """Estimate the tokens of the map and reduce steps of documents with the given sizes in characters."""
+        map_prompt_tokens = estimate_tokens(system_prompt + map_template)
+        reduce_prompt_tokens = estimate_tokens(system_prompt + reduce_template)
+        map_tokens = reduce_tokens = 0
+
+        for size in sizes:
+            chunks = max(1, math.ceil(size / chunk_size))
+            map_tokens += chunks * (map_prompt_tokens + chunk_size // 4 + MAP_OUTPUT_TOKENS)
+
+            # Every collapse level reads all the partial summaries of the previous level
+            partial = chunks * MAP_OUTPUT_TOKENS
+            while partial > token_max:
+                groups = math.ceil(partial / token_max)
+                reduce_tokens += partial + groups * (reduce_prompt_tokens + REDUCE_OUTPUT_TOKENS)
+                partial = groups * REDUCE_OUTPUT_TOKENS
+
+            reduce_tokens += partial + reduce_prompt_tokens + REDUCE_OUTPUT_TOKENS
+
+        return {"map": map_tokens, "reduce": reduce_tokens}
+
+    def plan(self, sizes: List[int]) -> None:
+        """Plan the summarization of documents with the given sizes in characters around the token budget."""
+        estimate = self.estimate(sizes, self.chunk_size, self.token_max)
+        self.estimated_tokens = estimate["map"] + estimate["reduce"]
+
+        if self.max_tokens is None or self.estimated_tokens <= self.max_tokens:
+            return
+
+        for scale in FAST_SCALES:
+            estimate = self.estimate(sizes, CHUNK_SIZE * scale, TOKEN_MAX * scale)
+
+            self.mode = "fast"
+            self.chunk_size = CHUNK_SIZE * scale
+            self.token_max = TOKEN_MAX * scale
+            self.estimated_tokens = estimate["map"] + estimate["reduce"]
+
+            if self.estimated_tokens <= self.max_tokens:
+                return
+
+        # Map only the share of the chunks the budget left after the reduce step can afford
+        self.mode = "extractive"
+        self.map_ratio = min(1.0, self.max_tokens * (1 - self.reserve) / max(1, estimate["map"]))
+        self.estimated_tokens = int(estimate["map"] * self.map_ratio + estimate["reduce"])
+
+    def charge(self, tokens: int, estimated: int = 0) -> None:
+        """Charge the tokens of an LLM call to the budget, along with the tokens estimated for it when it started."""
+        self.spent_tokens += tokens
+        self.estimated_spent_tokens += estimated
+        self.llm_calls += 1
+
+    def projected_tokens(self) -> int:
+        """Get the tokens spent plus those of the calls in flight, scaled by how far off the estimates were so far."""
+        calibration = self.spent_tokens / self.estimated_spent_tokens if self.estimated_spent_tokens else 1.0
+
+        return self.spent_tokens + int(self.committed_tokens * calibration)
+
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_s(self, reduce: bool = True) -> Optional[float]:
+        """Get the time left until the deadline, or until its share left to map calls, or None if the run has no deadline."""
+        if self.deadline_s is None:
+            return None
+
+        return max(0.0, self.deadline_s * (1 if reduce else 1 - self.reserve) - self.elapsed_s())
+
+    def allow_map(self) -> bool:
+        """Decide whether a chunk may still be summarized by the LLM, keeping the reserve for the reduce step."""
+        if self.max_tokens is not None and self.projected_tokens() >= self.max_tokens * (1 - self.reserve):
+            return False
+        if self.deadline_s is not None and self.elapsed_s() >= self.deadline_s * (1 - self.reserve):
+            return False
+
+        return True
+
+    def allow_reduce(self) -> bool:
+        """Decide whether a collapse or final summary may still be generated by the LLM."""
+        if self.max_tokens is not None and self.projected_tokens() >= self.max_tokens:
+            return False
+        if self.deadline_s is not None and self.elapsed_s() >= self.deadline_s:
+            return False
+
+        return True
+
+    def select_chunks(self, count: int) -> List[bool]:
+        """Select the evenly spaced chunks of a document that are mapped by the LLM in extractive mode."""
+        if self.map_ratio >= 1.0:
+            return [True] * count
+
+        return [math.floor((idx + 1) * self.map_ratio) > math.floor(idx * self.map_ratio) for idx in range(count)]
+
+    def with_callbacks(self, config: Optional[RunnableConfig], reduce: bool = False) -> RunnableConfig:
+        """Add the callback charging the LLM calls of a map, or of a collapse or final summary, to the budget to the configuration of a node."""
+        return merge_configs(config, {"callbacks": [self.reduce_callback if reduce else self.map_callback]})
+
+    def report(self) -> Dict[str, Any]:
+        """Get the actual spend of the run against its budget."""
+        return {
+            "max_tokens": self.max_tokens,
+            "deadline_s": self.deadline_s,
+            "mode": self.mode,
+            "chunk_size": self.chunk_size,
+            "token_max": self.token_max,
+            "map_ratio": round(self.map_ratio, 3),
+            "estimated_tokens": self.estimated_tokens,
+            "spent_tokens": self.spent_tokens,
+            "elapsed_s": round(self.elapsed_s(), 3),
+            "llm_calls": self.llm_calls,
+            "degraded_calls": self.degraded_calls,
+            "within_budget": (self.max_tokens is None or self.spent_tokens <= self.max_tokens)
+                and (self.deadline_s is None or self.elapsed_s() <= self.deadline_s),
+        }
+
+
+async def invoke_within_budget(
+    budget: Optional[RunBudget],
+    call: Callable[[Optional[RunnableConfig]], Awaitable[Any]],
+    config: Optional[RunnableConfig],
+    reduce: bool = False,
+) -> Optional[Any]:
+    """
+    Invoke an LLM call of a node within the budget of its run, if any.
+
+    Args:
+        budget (RunBudget, optional): The budget of the run, or None if the run has no budget.
+        call (Callable[[Optional[RunnableConfig]], Awaitable[Any]]): The LLM call, given the configuration to invoke the chain with.
+        config (RunnableConfig, optional): The configuration of the node.
+        reduce (bool): Whether the call is a collapse or final summary, which may use the reserve of the budget.
+
+    Returns:
+        Optional[Any]: The response of the call, or None if the budget does not allow it, or its deadline passed
+            while waiting, so that the node falls back to an extractive summary.
+    """
+    if budget is None:
+        return await call(None)
+
+    if budget.allow_reduce() if reduce else budget.allow_map():
+        try:
+            # Map calls are cancelled once the deadline share of the map step has passed, keeping the reserve for the reduce step
+            return await asyncio.wait_for(call(budget.with_callbacks(config, reduce)), timeout=budget.remaining_s(reduce))
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠ WARNING: LLM call cancelled at the {'deadline' if reduce else 'map deadline'} of its run")
+
+    budget.degraded_calls += 1
+
+    return None
+
+def open_budget(run_id: str, spec: Optional[Dict[str, Any]], sizes: List[int]) -> Optional[RunBudget]:
+    """
+    Open the budget of a run and plan the summarization of its documents around it.
+
+    Args:
+        run_id (str): The ID of the run.
+        spec (Dict[str, Any], optional): The budget of the run, with "max_tokens" and/or "deadline_s" keys.
+        sizes (List[int]): The sizes of the documents of the run in characters.
+
+    Returns:
+        Optional[RunBudget]: The budget of the run, or None if the run has no budget.
+    """
+    if not spec or (spec.get("max_tokens") is None and spec.get("deadline_s") is None):
+        return None
+
+    budget = RunBudget(
+        max_tokens=int(spec["max_tokens"]) if spec.get("max_tokens") is not None else None,
+        deadline_s=float(spec["deadline_s"]) if spec.get("deadline_s") is not None else None,
+    )
+    budget.plan(sizes)
+
+    run_budgets[run_id] = budget
+
+    # Budgets of runs that failed before reporting are eventually dropped
+    while len(run_budgets) > MAX_OPEN_BUDGETS:
+        run_budgets.popitem(last=False)
+
+    logger.info(f"→ Planned run {run_id} in {budget.mode} mode for a budget of {budget.max_tokens} tokens "
+                f"and {budget.deadline_s} seconds, estimated {budget.estimated_tokens} tokens")
+
+    return budget
+
+def get_budget(run_id: str) -> Optional[RunBudget]:
+    """Get the budget of a run, or None if the run has no budget."""
+    return run_budgets.get(run_id)
+
+def close_budget(run_id: str) -> Optional[Dict[str, Any]]:
+    """Close the budget of a run, returning its actual spend against the budget, or None if the run has no budget."""
+    budget = run_budgets.pop(run_id, None)
+
+    return budget.report() if budget else None
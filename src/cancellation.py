@@ -0,0 +1,75 @@
+from langchain_core.runnables import RunnableConfig
+from typing import Any, Callable, Dict
+import asyncio
+import inspect
+
+from src.budget import close_budget
+from src.coalescing import get_coalescer
+from src.config import PERSIST_PARTIAL_RESULTS
+from src.incremental import close_run_manifests
+from src.profiling import close_memory_profile
+from src.results import close_output_mode
+from src.scheduler import close_flow
+from src.stages import close_stage_latencies
+from src.tracing import close_trace
+from src.utils import get_logger, get_run_id
+
+
+logger = get_logger()
+
+
+async def release_run(run_id: str, persist_partial: bool = PERSIST_PARTIAL_RESULTS) -> None:
+    """
+    Release everything held on behalf of a run that was cancelled or failed, without waiting for it to report.
+
+    The in-flight and queued LLM calls of the run are cancelled along with its nodes, which frees their slots
+    of the scheduler window, so this releases what outlives them: the flights it leads are abandoned to their
+    followers, the summaries it generated so far are stored for the next run of its documents, if enabled,
+    and its budget, fair share, statistics, trace and memory profile are dropped, without exporting or storing them.
+
+    Args:
+        run_id (str): The ID of the run.
+        persist_partial (bool): Whether to store the summaries generated so far in the chunk-summary manifests.
+    """
+    get_coalescer().abandon_run(run_id)
+
+    stored = await close_run_manifests(run_id, commit=persist_partial)
+
+    close_budget(run_id)
+    close_flow(run_id)
+    close_output_mode(run_id)
+    close_stage_latencies(run_id)
+    close_memory_profile(run_id, store=False)
+    await close_trace(run_id, export=False)
+
+    if stored:
+        logger.info(f"✓ Stored the partial summaries of {stored} document(s) of aborted run {run_id}")
+
+def release_run_on_failure(node: Callable) -> Callable:
+    """
+    Wrap a graph node, so that its run is released if the node is cancelled or fails,
+    which happens when the run is aborted (e.g. the user closed the tab) or errors out.
+
+    Args:
+        node (Callable): The asynchronous node function.
+
+    Returns:
+        Callable: The wrapped node function, accepting the run configuration.
+    """
+    accepts_config = "config" in inspect.signature(node).parameters
+
+    async def wrapper(state: Dict[str, Any], config: RunnableConfig) -> Any:
+        try:
+            if accepts_config:
+                return await node(state, config)
+            return await node(state)
+        except BaseException:
+            # Every node of the run cancelled along with the failed one releases it again, which is harmless
+            await asyncio.shield(release_run(get_run_id(config)))
+            raise
+
+    wrapper.__name__ = node.__name__
+    wrapper.__qualname__ = node.__qualname__
+    wrapper.__doc__ = node.__doc__
+
+    return wrapper
@@ -0,0 +1,141 @@
+from typing import List, Sequence, Tuple
+import re
+import zlib
+
+from src.config import CLUSTER_DIMENSIONS, CLUSTER_SIMILARITY
+
+
+# Digits are folded, so that listings differing only in amounts, dates or IDs hash alike
+TOKEN_PATTERN = re.compile(r"\w+")
+DIGITS_PATTERN = re.compile(r"\d")
+WEIGHT_PATTERN = "[{} similar sections] "
+
+
+def hashing_vectors(texts: Sequence[str], dimensions: int = CLUSTER_DIMENSIONS):
+    """
+    Embed texts locally with a signed hashing vectorizer over their words and word bigrams.
+
+    Args:
+        texts (Sequence[str]): The texts to embed, e.g. the chunks of a document.
+        dimensions (int): The number of dimensions of the vectors.
+
+    Returns:
+        numpy.ndarray: The L2-normalized vectors of the texts, one row per text.
+    """
+    import numpy as np
+
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+
+    for row, text in enumerate(texts):
+        words = TOKEN_PATTERN.findall(DIGITS_PATTERN.sub("0", text.lower()))
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+        if not features:
+            continue
+
+        # CRC32 is stable across processes, unlike the built-in hash of strings
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vectors[row], (hashes & 0x7FFFFFFF) % dimensions, signs)
+
+    # Term frequencies are dampened, so that a repeated word does not dominate a chunk
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return vectors / np.where(norms > 0, norms, 1)
+
+def cluster_vectors(vectors, similarity: float = CLUSTER_SIMILARITY, iterations: int = 10) -> List[List[int]]:
+    """
+    Cluster normalized vectors so that every member is at least as similar as a threshold to the centroid of its cluster.
+
+    The number of clusters is not known in advance, so a single leader pass seeds one cluster per group of
+    similar vectors, which spherical k-means then refines. Members left below the threshold by the refinement
+    become clusters of their own, so that dissimilar chunks are never merged.
+
+    Args:
+        vectors (numpy.ndarray): The L2-normalized vectors, one row per item.
+        similarity (float): The minimum cosine similarity of a member to the centroid of its cluster.
+        iterations (int): The maximum number of k-means iterations.
+
+    Returns:
+        List[List[int]]: The indices of the members of every cluster, ordered by their first member.
+    """
+    import numpy as np
+
+    count = len(vectors)
+
+    if not count:
+        return []
+
+    # Leader pass, in document order
+    centroids = np.zeros_like(vectors)
+    labels = np.empty(count, dtype=np.int64)
+    k = 0
+
+    for i in range(count):
+        if k:
+            similarities = centroids[:k] @ vectors[i]
+            best = int(np.argmax(similarities))
+
+            if similarities[best] >= similarity:
+                labels[i] = best
+                continue
+
+        centroids[k] = vectors[i]
+        labels[i] = k
+        k += 1
+
+    centroids = centroids[:k]
+
+    # Spherical k-means refinement, dropping emptied clusters
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms > 0, norms, 1))[norms[:, 0] > 0]
+
+        updated = np.argmax(vectors @ centroids.T, axis=1)
+
+        if np.array_equal(updated, labels):
+            break
+
+        labels = updated
+
+    fits = np.einsum("ij,ij->i", vectors, centroids[labels]) >= similarity
+
+    clusters = {}
+
+    for i in range(count):
+        clusters.setdefault(int(labels[i]) if fits[i] else -1 - i, []).append(i)
+
+    return sorted(clusters.values(), key=lambda members: members[0])
+
+def cluster_chunks(chunks: Sequence[str], similarity: float = CLUSTER_SIMILARITY, dimensions: int = CLUSTER_DIMENSIONS) -> Tuple[List[str], List[int]]:
+    """
+    Reduce the chunks of a document to a representative of every cluster of near-duplicate chunks.
+
+    Args:
+        chunks (Sequence[str]): The chunks of the document.
+        similarity (float): The minimum cosine similarity of a chunk to the centroid of its cluster.
+        dimensions (int): The number of dimensions of the hashing vectors.
+
+    Returns:
+        Tuple[List[str], List[int]]: The representative chunks, the member closest to the centroid of its
+            cluster, in the order of the first member of their cluster, and the size of every cluster.
+    """
+    import numpy as np
+
+    vectors = hashing_vectors(chunks, dimensions)
+    representatives = []
+    weights = []
+
+    for members in cluster_vectors(vectors, similarity):
+        centroid = vectors[members].sum(axis=0)
+        representatives.append(chunks[members[int(np.argmax(vectors[members] @ centroid))]])
+        weights.append(len(members))
+
+    return representatives, weights
+
+def weigh_summary(summary: str, weight: int) -> str:
+    """Prefix the summary of a representative chunk with the size of its cluster, for the reduce prompt to weigh it by."""
+    return WEIGHT_PATTERN.format(weight) + summary if weight > 1 else summary
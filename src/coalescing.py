@@ -0,0 +1,206 @@
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+
+from src.config import COALESCE_TIMEOUT_S, LLM_STAGES
+from src.incremental import hash_parts
+from src.oifile import OIFile
+from src.prompts import map_template, reduce_template, system_prompt
+from src.utils import get_logger, get_stage_signature
+
+
+logger = get_logger()
+coalescer = None
+
+
+class FlightAbandoned(Exception):
+    """Raised to the followers of a flight whose leading run was aborted or failed."""
+
+
+class Flight:
+    '''
+    This is a class for representing the in-flight summarization of
+    a document, led by a single run and awaited by any number of
+    concurrent runs summarizing a document with identical content.
+    '''
+    def __init__(self, key: str, leader: str):
+        self.key = key
+        self.leader = leader
+        self.followers = 0
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SummaryCoalescer:
+    '''
+    This is a class for coalescing the summarization of identical
+    documents across concurrent runs (singleflight). The first run
+    to summarize a document leads the flight of its key, and every
+    other run summarizing a document with the same cleaned content,
+    prompts and model awaits the summary of the leading run instead
+    of starting its own.
+
+    A run either leads or follows flights, never both, so a run
+    waiting for another run can never be awaited itself, and runs
+    can never wait on each other in a cycle. If the leading run is
+    aborted or fails, its flights are abandoned, and the first of
+    their followers to notice takes over as the new leader.
+    '''
+    def __init__(self, timeout_s: float = COALESCE_TIMEOUT_S):
+        self.timeout_s = timeout_s
+        self._flights: Dict[str, Flight] = {}
+        self._leading: Dict[str, Set[str]] = {}
+        self._following: Dict[str, int] = {}
+        self._tickets: Dict[Tuple[str, str], Flight] = {}
+        self._loop = None
+
+        self.flights = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.abandoned = 0
+        self.takeovers = 0
+        self.timeouts = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Get the counters of the coalesced summarizations."""
+        return {
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "abandoned": self.abandoned,
+            "takeovers": self.takeovers,
+            "timeouts": self.timeouts,
+        }
+
+    @staticmethod
+    def key_for(document: OIFile) -> str:
+        """Get the coalescing key of a document: a hash of its cleaned content, the prompts and the models of the stages."""
+        return hash_parts(system_prompt, map_template, reduce_template, *map(get_stage_signature, LLM_STAGES), document.get_content())
+
+    def lead_or_follow(self, key: str, run_id: str, document_id: Optional[str] = None) -> Optional[Flight]:
+        """
+        Register a run summarizing a document with the given key.
+
+        Args:
+            key (str): The coalescing key of the document.
+            run_id (str): The ID of the run summarizing the document.
+            document_id (str, optional): The ID of the document in the run, to claim the flight to await later with.
+
+        Returns:
+            Optional[Flight]: The flight to await if the run follows another run, otherwise None.
+        """
+        flight = self._flights.get(key)
+
+        if flight and flight.leader != run_id and not self._leading.get(run_id):
+            flight.followers += 1
+            self._following[run_id] = self._following.get(run_id, 0) + 1
+            if document_id is not None:
+                self._tickets[(run_id, document_id)] = flight
+            self.coalesced += 1
+
+            logger.info(f"⇉ Coalesced summarization of document {key[:12]} of run {run_id} with in-flight run {flight.leader}: {self.stats()}")
+
+            return flight
+
+        if not flight and not self._following.get(run_id):
+            self._flights[key] = Flight(key, run_id)
+            self._leading.setdefault(run_id, set()).add(key)
+            self.flights += 1
+
+        return None
+
+    def claim(self, run_id: str, document_id: str) -> Optional[Flight]:
+        """Get the flight a document of a run was registered to follow, if any."""
+        return self._tickets.pop((run_id, document_id), None)
+
+    def resolve(self, key: str, run_id: str, summary: str) -> None:
+        """Complete the flight of a key led by a run with the generated summary."""
+        flight = self._flights.get(key)
+
+        if flight and flight.leader == run_id:
+            self._end(flight)
+            flight.future.set_result(summary)
+            self.completed += 1
+
+    def abandon(self, key: str, run_id: str) -> None:
+        """Abandon the flight of a key led by a run, e.g. because its summarization failed."""
+        flight = self._flights.get(key)
+
+        if flight and flight.leader == run_id:
+            self._end(flight)
+            flight.future.set_exception(FlightAbandoned(key))
+            # Mark the exception as retrieved, a flight may have no followers
+            flight.future.exception()
+            self.abandoned += 1
+
+            logger.warning(f"⚠ WARNING: Abandoned summarization of document {key[:12]} led by run {run_id} with {flight.followers} follower(s)")
+
+    def abandon_run(self, run_id: str) -> None:
+        """Abandon every flight led by a run, e.g. because the run was cancelled or failed."""
+        for key in list(self._leading.get(run_id, ())):
+            self.abandon(key, run_id)
+
+    def _end(self, flight: Flight) -> None:
+        self._flights.pop(flight.key, None)
+
+        keys = self._leading.get(flight.leader, set())
+        keys.discard(flight.key)
+        if not keys:
+            self._leading.pop(flight.leader, None)
+
+    async def wait(self, flight: Flight, run_id: str) -> Optional[str]:
+        """
+        Wait for the summary of a flight followed by a run.
+
+        Args:
+            flight (Flight): The flight to wait for.
+            run_id (str): The ID of the following run.
+
+        Returns:
+            Optional[str]: The summary of the flight, or None if the flight was abandoned or timed out
+                and the following run has to summarize the document itself.
+        """
+        try:
+            # Shielded, so that a cancelled follower never cancels the flight of the other runs
+            return await asyncio.wait_for(asyncio.shield(flight.future), timeout=self.timeout_s)
+        except FlightAbandoned:
+            return None
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"⚠ WARNING: Timed out waiting for summarization of document {flight.key[:12]} led by run {flight.leader}")
+            return None
+        finally:
+            flight.followers -= 1
+            remaining = self._following.get(run_id, 1) - 1
+
+            if remaining > 0:
+                self._following[run_id] = remaining
+            else:
+                self._following.pop(run_id, None)
+
+    def take_over(self, key: str, run_id: str) -> Optional[Flight]:
+        """Lead the flight of a key after its leader was abandoned, or follow whoever took it over first."""
+        flight = self._flights.get(key)
+
+        if flight:
+            return self.lead_or_follow(key, run_id)
+
+        self._flights[key] = Flight(key, run_id)
+        self._leading.setdefault(run_id, set()).add(key)
+        self.flights += 1
+        self.takeovers += 1
+
+        return None
+
+
+def get_coalescer() -> SummaryCoalescer:
+    """Get the summary coalescer of the running event loop."""
+    global coalescer
+
+    loop = asyncio.get_running_loop()
+
+    # Futures are bound to an event loop, so a new loop gets a fresh coalescer
+    if not coalescer or coalescer._loop is not loop:
+        coalescer = SummaryCoalescer()
+        coalescer._loop = loop
+
+    return coalescer
@@ -10,6 +10,81 @@ AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "")
 AZURE_OPENAI_MODEL_NAME = os.getenv("AZURE_OPENAI_MODEL_NAME", "")
 
+# Model configuration of every LLM stage ("map": chunk summaries, "collapse": collapsed summaries,
+# "reduce": final summaries), e.g. MAP_MODEL_NAME or REDUCE_MAX_TOKENS, falling back to the model above.
+# An empty deployment is the model name, empty max tokens leave the completion length to the model,
+# and a concurrency of 0 only limits a stage by the scheduler window.
+LLM_STAGES = ("map", "collapse", "reduce")
+STAGE_MODELS = {
+    stage: {
+        "model": os.getenv(f"{stage.upper()}_MODEL_NAME", "") or AZURE_OPENAI_MODEL_NAME,
+        "deployment": os.getenv(f"{stage.upper()}_DEPLOYMENT_NAME", ""),
+        "max_tokens": int(os.getenv(f"{stage.upper()}_MAX_TOKENS", "") or 0) or None,
+        "temperature": float(os.getenv(f"{stage.upper()}_TEMPERATURE", "") or 0),
+        "concurrency": int(os.getenv(f"{stage.upper()}_CONCURRENCY", "") or 0),
+    }
+    for stage in LLM_STAGES
+}
+
+# Files of the run input may reference files in a locally mounted store, and carry compressed content, within limits
+FILE_STORE_DIR = os.getenv("FILE_STORE_DIR", "")
+MAX_CONTENT_BYTES = int(os.getenv("MAX_CONTENT_BYTES", 64 * 1024 * 1024))
+MAX_COMPRESSION_RATIO = float(os.getenv("MAX_COMPRESSION_RATIO", 200))
+
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 128))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1024))
-TOKEN_MAX = int(os.getenv("TOKEN_MAX", 1000))
\ No newline at end of file
+TOKEN_MAX = int(os.getenv("TOKEN_MAX", 1000))
+# Chunking strategy, "cdc" (content-defined) or "recursive", defaulting to "cdc" only if incremental summarization is enabled
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "").lower()
+MAP_WINDOW_SIZE = int(os.getenv("MAP_WINDOW_SIZE", 32))
+SCHEDULING_POLICY = os.getenv("SCHEDULING_POLICY", "sjf").lower()
+SCHEDULING_STARVATION_S = float(os.getenv("SCHEDULING_STARVATION_S", 30))
+# Weighted fair sharing of the scheduler window across the tenants of the runs, and across runs without a tenant,
+# with the weight of every tenant given as e.g. "interactive=4,bulk=1" (default weight 1)
+FAIR_SHARING_ENABLED = os.getenv("FAIR_SHARING_ENABLED", "true").lower() in ("1", "true", "yes")
+TENANT_WEIGHTS = os.getenv("TENANT_WEIGHTS", "")
+
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")
+COALESCE_TIMEOUT_S = float(os.getenv("COALESCE_TIMEOUT_S", 600))
+
+# Incremental summarization is opt-in, as it switches the default chunking to content-defined chunks without overlap
+INCREMENTAL_ENABLED = os.getenv("INCREMENTAL_ENABLED", "false").lower() in ("1", "true", "yes")
+CHUNKING_STRATEGY = CHUNKING_STRATEGY or ("cdc" if INCREMENTAL_ENABLED else "recursive")
+# Chunk-summary manifests of the summarized documents, per tenant and document name, are kept in memory unless a
+# directory is configured to persist them to, as they hold summaries of document content, and evicted by count and age
+MANIFEST_DIR = os.getenv("MANIFEST_DIR", "")
+MANIFEST_MAX_DOCUMENTS = int(os.getenv("MANIFEST_MAX_DOCUMENTS", 1024))
+MANIFEST_TTL_DAYS = float(os.getenv("MANIFEST_TTL_DAYS", 30))
+# Store the summaries generated by runs that were cancelled or failed, for the next run of their documents to reuse
+PERSIST_PARTIAL_RESULTS = os.getenv("PERSIST_PARTIAL_RESULTS", "true").lower() in ("1", "true", "yes")
+
+# Collapse complete groups of partial summaries while the remaining chunks of a document are still being summarized
+FOLDING_ENABLED = os.getenv("FOLDING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Summarize only a representative of every cluster of near-duplicate chunks, e.g. of templated sections or listings
+CLUSTERING_ENABLED = os.getenv("CLUSTERING_ENABLED", "false").lower() in ("1", "true", "yes")
+CLUSTER_SIMILARITY = float(os.getenv("CLUSTER_SIMILARITY", 0.9))
+CLUSTER_MIN_CHUNKS = int(os.getenv("CLUSTER_MIN_CHUNKS", 8))
+CLUSTER_DIMENSIONS = int(os.getenv("CLUSTER_DIMENSIONS", 4096))
+
+BUDGET_REDUCE_RESERVE = float(os.getenv("BUDGET_REDUCE_RESERVE", 0.2))
+
+# Shape of every document of the run output: "lean" (ID, name, type and summary), "stats" (lean, along with
+# the chunk count, estimated tokens, LLM calls and duration of its summarization) or "full" (lean, along with its content)
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "lean").lower()
+
+WARM_UP_ON_LOAD = os.getenv("WARM_UP_ON_LOAD", "false").lower() in ("1", "true", "yes")
+# Opt-in memory profiling of every graph node with tracemalloc, expensive, so only meant for benchmarks
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "false").lower() in ("1", "true", "yes")
+MEMORY_PROFILE_TOP = int(os.getenv("MEMORY_PROFILE_TOP", 10))
+MEMORY_PROFILE_DIR = os.getenv("MEMORY_PROFILE_DIR", "")
+
+# Logging, written by a background thread, with per-chunk events logged only for a sample of the chunks
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+
+# Per-run tracing of nodes, LLM calls, retries and collapse rounds, exported as JSON files ("json") or to an OTLP/HTTP collector ("otlp")
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "").lower()
+TRACE_DIR = os.getenv("TRACE_DIR", ".traces")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
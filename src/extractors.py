@@ -0,0 +1,330 @@
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import mimetypes
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+
+
+# XML namespaces of the main document parts of DOCX (WordprocessingML) and ODT (OpenDocument) files
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+TABLE_NS = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+OFFICE_NS = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+
+
+async def get_document_data(file_path: str, file_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get both metadata and content for a document file.
+
+    Args:
+        file_path (str): Path to the file
+        file_id (str, optional): ID to assign to the file
+
+    Returns:
+        Dict[str, Any]: Dictionary containing file metadata and content
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    # Extract content
+    content = await extract_file_content(file_path)
+
+    # Get metadata
+    filename = os.path.basename(file_path)
+    mime_type = await get_file_mime_type(file_path)
+    file_size = os.path.getsize(file_path)
+
+    # Simulate the information structure of the files in Open WebUI
+    return {
+        "file": {
+            "id": file_id or os.path.splitext(filename)[0],
+            "filename": filename,
+            "meta": {
+                "content_type": mime_type,
+                "size": file_size
+            },
+            "data": {
+                "content": content
+            }
+        }
+    }
+
+# Main function to extract file content based on type
+async def extract_file_content(file_path: str) -> str:
+    """
+    Extract content from a file based on its extension.
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: Extracted text content
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    # Get file extension in lowercase
+    extension = os.path.splitext(file_path)[1].lower()
+
+    # Map extensions to handler functions
+    handlers = {
+        '.txt': read_text_file,
+        '.md': read_markdown_file,
+        '.docx': read_docx_file,
+        '.pdf': read_pdf_file,
+        '.rtf': read_rtf_file,
+        '.odt': read_odt_file
+    }
+
+    if extension in handlers:
+        return await handlers[extension](file_path)
+    else:
+        raise ValueError(f"Unsupported file format: {extension}")
+
+# File MIME type detection
+async def get_file_mime_type(file_path: str) -> str:
+    """
+    Get the MIME type of a file.
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: MIME type of the file
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    if not mimetypes.inited:
+        # Configure acceptable mimetypes
+        mimetypes.init()
+        mimetypes.add_type('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx')
+        mimetypes.add_type('application/pdf', '.pdf')
+        mimetypes.add_type('text/plain', '.txt')
+        mimetypes.add_type('text/markdown', '.md')
+        mimetypes.add_type('application/rtf', '.rtf')
+        mimetypes.add_type('application/vnd.oasis.opendocument.text', '.odt')
+
+    # Get mime type based on file extension
+    mime_type, _ = mimetypes.guess_type(file_path)
+
+    # Fallback if mime type couldn't be determined
+    if not mime_type:
+        # Check file signature
+        file_start = await read_file_start(file_path)
+
+        if file_start.startswith(b'%PDF'):
+            return 'application/pdf'
+        elif file_start.startswith(b'\x50\x4B\x03\x04'):  # ZIP signature (docx, xlsx)
+            if file_path.endswith('.docx'):
+                return 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+        return 'application/octet-stream'
+
+    return mime_type
+
+async def read_file_start(file_path: str, bytes_to_read: int = 512) -> bytes:
+    """Read the first bytes of a file to determine its type."""
+    def _read(path: str, size: int) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read(size)
+
+    return await asyncio.to_thread(_read, file_path, bytes_to_read)
+
+# Content readers for different file types
+async def read_text_file(file_path: str) -> str:
+    """Read content from a plain text file."""
+    def _read(path: str) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    return await asyncio.to_thread(_read, file_path)
+
+async def read_markdown_file(file_path: str) -> str:
+    """Read content from a markdown file."""
+    # For basic markdown files, we can treat them as text
+    return await read_text_file(file_path)
+
+def extract_docx_text(file_path: str) -> str:
+    """
+    Extract the plain text of a DOCX file by streaming its document XML out of the zip container,
+    without any layout analysis: paragraphs are separated by blank lines, headings are prefixed
+    with "#" by their level and the cells of every table row are joined with " | ".
+
+    Raises:
+        zipfile.BadZipFile, KeyError, ET.ParseError: If the file is not a well-formed DOCX file.
+    """
+    blocks = []
+    paragraph = []
+    cells = []
+    heading = 0
+    table_depth = 0
+
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+
+            if event == "start":
+                if tag == f"{W_NS}tbl":
+                    table_depth += 1
+                elif tag == f"{W_NS}tc":
+                    cells.append('')
+                continue
+
+            if tag == f"{W_NS}t":
+                paragraph.append(elem.text or '')
+            elif tag == f"{W_NS}tab":
+                paragraph.append("\t")
+            elif tag in (f"{W_NS}br", f"{W_NS}cr"):
+                paragraph.append("\n")
+            elif tag == f"{W_NS}pStyle":
+                style = elem.get(f"{W_NS}val", '')
+                if style.lower().startswith("heading") and style[7:].isdigit():
+                    heading = int(style[7:])
+            elif tag == f"{W_NS}p":
+                text = ''.join(paragraph).strip()
+                paragraph = []
+
+                if table_depth and cells:
+                    # Paragraphs of a table cell are kept on the line of its row
+                    cells[-1] = f"{cells[-1]} {text}".strip()
+                elif text:
+                    blocks.append(f"{'#' * heading} {text}" if heading else text)
+
+                heading = 0
+                elem.clear()
+            elif tag == f"{W_NS}tr":
+                if any(cells):
+                    blocks.append(" | ".join(cells))
+                cells = []
+                elem.clear()
+            elif tag == f"{W_NS}tbl":
+                table_depth -= 1
+
+    return "\n\n".join(blocks)
+
+def extract_odt_text(file_path: str) -> str:
+    """
+    Extract the plain text of an ODT file by streaming its content XML out of the zip container,
+    in the same shape as extract_docx_text, leaving out notes and annotations.
+
+    Raises:
+        zipfile.BadZipFile, KeyError, ET.ParseError: If the file is not a well-formed ODT file.
+    """
+    skipped = (f"{TEXT_NS}note", f"{OFFICE_NS}annotation", f"{TEXT_NS}tracked-changes")
+
+    def _render(elem: ET.Element) -> str:
+        parts = [elem.text or '']
+
+        for child in elem:
+            if child.tag == f"{TEXT_NS}s":
+                parts.append(" " * int(child.get(f"{TEXT_NS}c", 1)))
+            elif child.tag == f"{TEXT_NS}tab":
+                parts.append("\t")
+            elif child.tag == f"{TEXT_NS}line-break":
+                parts.append("\n")
+            elif child.tag not in skipped:
+                parts.append(_render(child))
+            parts.append(child.tail or '')
+
+        return ''.join(parts)
+
+    blocks = []
+    cells = []
+    paragraph_depth = 0
+    table_depth = 0
+    skip_depth = 0
+
+    with zipfile.ZipFile(file_path) as archive, archive.open("content.xml") as xml:
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            is_paragraph = tag in (f"{TEXT_NS}p", f"{TEXT_NS}h")
+
+            if event == "start":
+                paragraph_depth += is_paragraph
+                table_depth += tag == f"{TABLE_NS}table"
+                skip_depth += tag in skipped
+                if tag == f"{TABLE_NS}table-cell" and not skip_depth:
+                    cells.append('')
+                continue
+
+            if is_paragraph:
+                paragraph_depth -= 1
+
+                # Nested paragraphs, e.g. of notes or frames, are rendered along with their outer paragraph
+                if paragraph_depth or skip_depth:
+                    continue
+
+                text = _render(elem).strip()
+                level = int(elem.get(f"{TEXT_NS}outline-level", 1)) if tag == f"{TEXT_NS}h" else 0
+                elem.clear()
+
+                if table_depth and cells:
+                    cells[-1] = f"{cells[-1]} {text}".strip()
+                elif text:
+                    blocks.append(f"{'#' * level} {text}" if level else text)
+            elif tag in skipped:
+                skip_depth -= 1
+            elif tag == f"{TABLE_NS}table-row" and not skip_depth:
+                if any(cells):
+                    blocks.append(" | ".join(cells))
+                cells = []
+                elem.clear()
+            elif tag == f"{TABLE_NS}table":
+                table_depth -= 1
+
+    return "\n\n".join(blocks)
+
+def _extract_with_fallback(file_path: str, fast_extractor: Callable[[str], str], fallback: Callable[[str], str]) -> str:
+    """Extract the text of a file with a fast extractor, falling back to a full one if the file is malformed, encrypted or has no text, e.g. only scanned images."""
+    from src.utils import get_logger
+
+    try:
+        content = fast_extractor(file_path)
+        if content.strip():
+            return content
+        reason = "no text"
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, RuntimeError, ValueError) as e:
+        reason = f"{type(e).__name__}: {str(e)}"
+
+    get_logger().debug(f"Falling back to {fallback.__name__} for {file_path} ({reason})")
+    return fallback(file_path)
+
+def read_docx_with_docling(file_path: str) -> str:
+    """Extract text from DOCX file using DoclingLoader, with its full layout pipeline."""
+    from langchain_docling import DoclingLoader
+
+    documents = DoclingLoader(file_path=file_path).load()
+    return '\n'.join([d.page_content for d in documents])
+
+def read_with_pandoc(file_path: str) -> str:
+    """Extract text from a file using pypandoc."""
+    try:
+        import pypandoc
+    except ImportError:
+        raise ImportError(f"pypandoc is required for reading {os.path.splitext(file_path)[1].upper()[1:]} files. Install it with 'pip install pypandoc'.")
+
+    return pypandoc.convert_file(file_path, "plain")
+
+async def read_docx_file(file_path: str) -> str:
+    """Extract text from DOCX file out of its XML, falling back to DoclingLoader for the files that need it."""
+    return await asyncio.to_thread(_extract_with_fallback, file_path, extract_docx_text, read_docx_with_docling)
+
+async def read_pdf_file(file_path: str) -> str:
+    """Extract text from PDF file using PyPDFLoader."""
+    def _read_with_pypdf(path: str) -> str:
+        from langchain_community.document_loaders import PyPDFLoader
+
+        documents = PyPDFLoader(path).load()
+        return '\n'.join([d.page_content for d in documents])
+
+    return await asyncio.to_thread(_read_with_pypdf, file_path)
+
+async def read_rtf_file(file_path: str) -> str:
+    """Extract text from RTF file using pypandoc."""
+    return await asyncio.to_thread(read_with_pandoc, file_path)
+
+async def read_odt_file(file_path: str) -> str:
+    """Extract text from ODT file out of its XML, falling back to pypandoc for the files that need it."""
+    return await asyncio.to_thread(_extract_with_fallback, file_path, extract_odt_text, read_with_pandoc)
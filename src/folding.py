@@ -0,0 +1,93 @@
+from langchain_core.documents import Document
+from typing import Awaitable, Callable, Hashable, List, Optional
+import asyncio
+
+from src.scheduler import estimate_tokens, get_chunk_scheduler
+from src.tracing import trace_span
+from src.utils import SummaryGrouper, get_logger, length_function
+
+
+logger = get_logger()
+
+
+class SummaryFolder:
+    '''
+    This is a class for folding the partial summaries of a document
+    while its remaining chunks are still being summarized. Summaries
+    are fed as their chunks complete, in any order, and grouped in
+    document order into token-bounded groups, exactly as the first
+    collapse round would group them. Once the summaries so far exceed
+    the token limit, so that the document has to be collapsed anyway,
+    every complete group is collapsed in the background, within the
+    window of the scheduler, overlapping the collapse round with the
+    tail of the map step. The last, incomplete group is never folded,
+    so the summaries handed to the reduce step are the folded groups
+    followed by the partial summaries of the last group.
+    '''
+    def __init__(
+        self,
+        count: int,
+        token_max: int,
+        collapse: Callable[[List[Document], int], Awaitable[Document]],
+        key: Hashable = None,
+        run_id: str = '',
+        document_id: str = '',
+        is_boundary: Optional[Callable[[Document], bool]] = None,
+    ):
+        self.count = count
+        self.token_max = token_max
+        self.collapse = collapse
+        self.key = key
+        self.run_id = run_id
+        self.document_id = document_id
+        self.summaries: List[Optional[str]] = [None] * count
+        self.folding = False
+        self.folded = 0
+        self._grouper = SummaryGrouper(token_max, is_boundary)
+        self._next = 0
+        self._lock = asyncio.Lock()
+        self._pending: List[List[Document]] = []
+        self._folds: List[asyncio.Task] = []
+
+    async def add(self, idx: int, summary: str) -> None:
+        """Add the partial summary of a chunk, folding the groups it completes once the document has to be collapsed."""
+        self.summaries[idx] = summary
+
+        # Summaries are grouped in document order, by the first task to find the next one complete
+        async with self._lock:
+            while self._next < self.count and self.summaries[self._next] is not None:
+                doc = Document(self.summaries[self._next])
+                self._pending.extend(self._grouper.add(doc, await length_function([doc])))
+                self._next += 1
+
+            if not self.folding and self._grouper.total_tokens > self.token_max:
+                self.folding = True
+                logger.debug(f"→ Folding summaries of document with ID {self.document_id} while mapping its remaining chunks")
+
+            if self.folding:
+                self.folded += sum(len(group) for group in self._pending)
+                self._folds.extend(asyncio.create_task(self._fold(group)) for group in self._pending)
+                self._pending = []
+
+    async def _fold(self, group: List[Document]) -> Document:
+        tokens = sum(estimate_tokens(doc.page_content) for doc in group)
+
+        async with get_chunk_scheduler().slot(key=self.key, tokens=tokens):
+            with trace_span(self.run_id, "collapse_round", "collapse_round", document_id=self.document_id, round=0, summaries=len(group)):
+                return await self.collapse(group, max(1, self.count // len(group)))
+
+    async def result(self) -> List[Document]:
+        """Wait for the folded groups and get the summaries of the document, once every chunk was summarized."""
+        folded = list(await asyncio.gather(*self._folds))
+
+        if folded:
+            logger.debug(f"✓ Folded {self.folded} summaries of document with ID {self.document_id} into {len(folded)} while mapping")
+
+        rest = [doc for group in self._pending + self._grouper.flush() for doc in group]
+
+        return folded + rest
+
+    def cancel(self) -> None:
+        """Cancel the folds still running, e.g. because the map step failed."""
+        for task in self._folds:
+            task.cancel()
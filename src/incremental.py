@@ -0,0 +1,391 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from src.config import INCREMENTAL_ENABLED, MANIFEST_DIR, MANIFEST_MAX_DOCUMENTS, MANIFEST_TTL_DAYS
+from src.oifile import OIFile
+from src.prompts import map_template, reduce_template, system_prompt
+from src.scheduler import DEFAULT_TENANT, get_tenant
+from src.utils import get_logger, get_stage_signature
+
+
+logger = get_logger()
+manifest_store = None
+open_manifests: "OrderedDict[Tuple[str, str], ChunkManifest]" = OrderedDict()
+
+# Pseudorandom but fixed byte mapping of the gear rolling hash, chunk boundaries must never change between versions
+GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], "little") for i in range(256))
+MAX_OPEN_MANIFESTS = 1024
+WHITESPACE = re.compile(r"\s")
+# Stored manifests are evicted by count and age every so many saves, as listing the directory on every save is costly
+EVICT_EVERY_SAVES = 64
+
+
+def hash_parts(*parts: str) -> str:
+    """Get a SHA-256 hex digest of a sequence of strings."""
+    digest = hashlib.sha256()
+
+    for part in parts:
+        digest.update(part.encode("utf-8", errors="surrogatepass"))
+        digest.update(b"\x00")
+
+    return digest.hexdigest()
+
+def _gear_candidates(text: str, mask: int) -> List[int]:
+    """Get the positions of a text at which the gear rolling hash over the last 32 characters matches a mask."""
+    import numpy as np
+
+    codes = np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32) & 0xFF
+    hashes = np.array(GEAR, dtype=np.uint32)[codes]
+
+    # The hash at every position is the sum of the gears of the last 32 characters, each shifted by its distance,
+    # which is computed for all positions at once by doubling the window instead of rolling it one character at a time
+    for shift in (1, 2, 4, 8, 16):
+        hashes[shift:] += hashes[:-shift] << np.uint32(shift)
+
+    return np.flatnonzero((hashes & np.uint32(mask)) == 0).tolist()
+
+def content_defined_split(text: str, chunk_size: int) -> Tuple[str, ...]:
+    """
+    Split a text into chunks whose boundaries depend only on the surrounding content (content-defined chunking).
+
+    A gear rolling hash, which only depends on the last 32 characters, is computed over the text and a chunk
+    ends once the hash matches a mask, moved forward to the next whitespace, or back to the previous one if
+    there is none before the chunk size, so that words are only split if a chunk holds no whitespace at all.
+    Chunks are at most the chunk size long, and at least a quarter of it unless moved back to a whitespace.
+    As boundaries only depend on the local content, an edit only changes the chunks around it, and the
+    unchanged regions of a new version of a document produce identical chunks.
+
+    Args:
+        text (str): The text to split.
+        chunk_size (int): The maximum size of a chunk in characters.
+
+    Returns:
+        Tuple[str, ...]: The chunks of the text, whose concatenation is the text itself.
+    """
+    min_size = max(1, chunk_size // 4)
+    # A boundary is expected about every half chunk size past the minimum size, the mask covers the
+    # high bits of the hash, which depend on the last 32 characters and not only on the last few
+    bits = max(1, (chunk_size // 2).bit_length() - 1)
+    mask = ((1 << bits) - 1) << (32 - bits)
+    # Past the first 32 characters of a chunk, its rolling hash equals the hash of the whole text at the same position
+    candidates = _gear_candidates(text, mask) if min_size >= 32 else None
+
+    chunks = []
+    start = 0
+    length = len(text)
+
+    while start < length:
+        end = min(start + chunk_size, length)
+
+        if end - start > min_size:
+            cut = end
+
+            if candidates is not None:
+                idx = bisect.bisect_left(candidates, start + min_size)
+                if idx < len(candidates) and candidates[idx] < end:
+                    cut = candidates[idx] + 1
+            else:
+                h = 0
+                for i in range(start, end):
+                    h = ((h << 1) + GEAR[ord(text[i]) & 0xFF]) & 0xFFFFFFFF
+
+                    if i - start >= min_size and not (h & mask):
+                        cut = i + 1
+                        break
+
+            # Move the boundary forward to the next whitespace, without exceeding the chunk size
+            match = WHITESPACE.search(text, cut - 1, end)
+            cut = match.end() if match else end
+
+            # Or else back to the previous whitespace, unless the chunk ends the text
+            if not match and end < length:
+                back = end - 1
+                while back > start and not text[back - 1].isspace():
+                    back -= 1
+                if back > start:
+                    cut = back
+
+            end = cut
+
+        chunks.append(text[start:end])
+        start = end
+
+    return tuple(chunks)
+
+
+class ChunkManifest:
+    '''
+    This is a class for representing the chunk-summary manifest of a
+    document version being summarized. It holds the summaries of the
+    chunks and of the reduce steps (collapses and final summary) of the
+    previous version of the document, keyed by a hash of their input,
+    prompt and model, and records the summaries of the current version,
+    either reused or generated, so that only they are stored for the next
+    version. It also counts the LLM calls made and saved. Manifests of
+    documents of the same name, but of different tenants, are distinct.
+    '''
+    def __init__(self, name: str, previous: Optional[Dict[str, str]] = None, tenant: str = DEFAULT_TENANT):
+        self.name = name
+        self.tenant = tenant
+        self.previous = previous or {}
+        self.current: Dict[str, str] = {}
+        self.made = 0
+        self.saved = 0
+
+    @staticmethod
+    def key_for(kind: str, text: str) -> str:
+        """Get the manifest key of the input of a stage ("map", "collapse" or "reduce"), including the model of the stage."""
+        template = map_template if kind == "map" else reduce_template
+        return hash_parts(kind, system_prompt, template, get_stage_signature(kind), text)
+
+    def lookup(self, kind: str, text: str) -> Optional[str]:
+        """Get the summary of an input from the previous version of the document, if any."""
+        key = self.key_for(kind, text)
+        summary = self.current.get(key) or self.previous.get(key)
+
+        if summary is not None:
+            self.current[key] = summary
+            self.saved += 1
+
+        return summary
+
+    def record(self, kind: str, text: str, summary: str) -> None:
+        """Record the summary of an input generated for the current version of the document."""
+        self.current[self.key_for(kind, text)] = summary
+        self.made += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of LLM calls made and saved for the document."""
+        return {"made": self.made, "saved": self.saved}
+
+
+class ManifestStore:
+    '''
+    This is a class for storing the chunk-summary manifests of the
+    summarized documents, one per tenant and document name, so that
+    re-uploaded versions of a document find the manifest of their
+    previous version, and never the manifest of a same-named document
+    of another tenant. Manifests are kept in memory, or, if a directory
+    is configured, as JSON files in it, replaced atomically. At most
+    `max_documents` manifests are kept, evicting the least recently
+    used ones, and stored manifests unused for `ttl_s` are evicted.
+    '''
+    def __init__(self, directory: str = MANIFEST_DIR, max_documents: int = MANIFEST_MAX_DOCUMENTS, ttl_s: float = MANIFEST_TTL_DAYS * 86400):
+        self.directory = directory
+        self.max_documents = max_documents
+        self.ttl_s = ttl_s
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._saves = 0
+
+    @staticmethod
+    def _key(tenant: str, name: str) -> str:
+        return hash_parts(tenant, name)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, tenant: str, name: str) -> Dict[str, str]:
+        """Load the manifest entries of a document of a tenant, or none if the document was never summarized."""
+        key = self._key(tenant, name)
+
+        if not self.directory:
+            with self._lock:
+                saved_at, entries = self._memory.get(key, (0.0, {}))
+
+                if entries and time.time() - saved_at > self.ttl_s:
+                    del self._memory[key]
+                    return {}
+                if entries:
+                    self._memory.move_to_end(key)
+
+                return entries
+
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("entries", {})
+
+            # The modification time of a manifest is the time it was last used, for eviction
+            os.utime(self._path(key))
+            return entries
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠ WARNING: Could not load manifest of document {name}: {str(e)}")
+            return {}
+
+    def save(self, tenant: str, name: str, entries: Dict[str, str]) -> None:
+        """Store the manifest entries of a document of a tenant, replacing those of its previous version."""
+        key = self._key(tenant, name)
+
+        if not self.directory:
+            with self._lock:
+                self._memory[key] = (time.time(), entries)
+                self._memory.move_to_end(key)
+
+                while len(self._memory) > self.max_documents:
+                    self._memory.popitem(last=False)
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"tenant": tenant, "name": name, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            evict = self._saves % EVICT_EVERY_SAVES == 0
+            self._saves += 1
+
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete the stored manifests unused for longer than the TTL and the least recently used ones beyond the maximum, returning how many."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+
+        manifests = []
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    manifests.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+
+        manifests.sort(reverse=True)
+        now = time.time()
+        evicted = 0
+
+        for idx, (used_at, path) in enumerate(manifests):
+            if idx >= self.max_documents or now - used_at > self.ttl_s:
+                try:
+                    os.unlink(path)
+                    evicted += 1
+                except FileNotFoundError:
+                    continue
+
+        if evicted:
+            logger.debug(f"Evicted {evicted} manifest(s) from {self.directory}")
+
+        return evicted
+
+
+def get_manifest_store() -> ManifestStore:
+    """Get the store of the chunk-summary manifests."""
+    global manifest_store
+
+    if not manifest_store:
+        manifest_store = ManifestStore()
+
+    return manifest_store
+
+async def open_manifest(run_id: str, document: OIFile) -> ChunkManifest:
+    """
+    Open the chunk-summary manifest of a document summarized by a run, loading the manifest of its previous version.
+
+    Args:
+        run_id (str): The ID of the run summarizing the document.
+        document (OIFile): The document being summarized.
+
+    Returns:
+        ChunkManifest: The manifest of the document, shared by the nodes of the run.
+    """
+    tenant = get_tenant(run_id)
+    previous = await asyncio.to_thread(get_manifest_store().load, tenant, document.get_name()) if INCREMENTAL_ENABLED else {}
+    manifest = ChunkManifest(document.get_name(), previous, tenant)
+
+    open_manifests[(run_id, document.get_id())] = manifest
+
+    # Manifests of runs that failed before completing are eventually dropped
+    while len(open_manifests) > MAX_OPEN_MANIFESTS:
+        open_manifests.popitem(last=False)
+
+    return manifest
+
+def get_manifest(run_id: str, document_id: str) -> ChunkManifest:
+    """Get the open chunk-summary manifest of a document summarized by a run, or an empty one if it is not open."""
+    manifest = open_manifests.get((run_id, document_id))
+
+    if manifest is None:
+        manifest = open_manifests[(run_id, document_id)] = ChunkManifest(document_id, tenant=get_tenant(run_id))
+
+    return manifest
+
+async def close_manifest(run_id: str, document_id: str, commit: bool = True) -> Dict[str, int]:
+    """
+    Close the chunk-summary manifest of a document summarized by a run, storing it for the next version of the document.
+
+    Args:
+        run_id (str): The ID of the run summarizing the document.
+        document_id (str): The ID of the document.
+        commit (bool): Whether to store the manifest, i.e. whether the document was summarized successfully.
+
+    Returns:
+        Dict[str, int]: The number of LLM calls made and saved for the document.
+    """
+    manifest = open_manifests.pop((run_id, document_id), None)
+
+    if manifest is None:
+        return {"made": 0, "saved": 0}
+
+    if commit and INCREMENTAL_ENABLED and manifest.current:
+        try:
+            await asyncio.to_thread(get_manifest_store().save, manifest.tenant, manifest.name, manifest.current)
+        except OSError as e:
+            logger.warning(f"⚠ WARNING: Could not store manifest of document {manifest.name}: {str(e)}")
+
+    if manifest.saved:
+        logger.info(f"✓ Reused {manifest.saved} summaries of the previous version of document {manifest.name}, made {manifest.made} LLM call(s)")
+
+    return manifest.stats()
+
+async def close_run_manifests(run_id: str, commit: bool = True) -> int:
+    """
+    Close the open chunk-summary manifests of a run that was cancelled or failed, storing the summaries generated so far.
+
+    The manifest of a document summarized partially is stored along with the entries of its previous version,
+    so that the next run of the document reuses both the unchanged and the already summarized chunks.
+
+    Args:
+        run_id (str): The ID of the run.
+        commit (bool): Whether to store the manifests that hold generated summaries.
+
+    Returns:
+        int: The number of stored manifests.
+    """
+    # Every manifest of the run is detached before storing any, as concurrent nodes of the run may close them too
+    manifests = [open_manifests.pop(key) for key in [key for key in open_manifests if key[0] == run_id]]
+    stored = 0
+
+    for manifest in manifests:
+        if not (commit and INCREMENTAL_ENABLED and manifest.made):
+            continue
+
+        try:
+            await asyncio.to_thread(get_manifest_store().save, manifest.tenant, manifest.name, {**manifest.previous, **manifest.current})
+            stored += 1
+        except OSError as e:
+            logger.warning(f"⚠ WARNING: Could not store partial manifest of document {manifest.name}: {str(e)}")
+
+    return stored
+
+def is_group_boundary(summary: str, fanout: int = 4) -> bool:
+    """Decide whether a group of partial summaries to collapse ends after a summary, depending only on its content."""
+    return int(hash_parts(summary)[:8], 16) % fanout == 0
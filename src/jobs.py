@@ -0,0 +1,535 @@
+"""
+Persistent multi-process job queue for bulk summarization.
+
+Documents are enqueued once as jobs in a SQLite queue file, then summarized by any
+number of worker processes, each invoking the compiled `graph` of `src/summarizer.py`
+in-process on its own event loop, so that archive backfills are not bound by a single
+event loop. Workers claim jobs under a lease that they renew while summarizing them:
+the jobs of a worker that dies are claimed again once its lease expires, and failed
+jobs are retried with a backoff until they run out of attempts. Workers on several
+hosts can share a queue file on a file system with working locks (not NFS).
+
+Usage:
+    python -m src.jobs enqueue -q jobs.db -i documents/ -R
+    python -m src.jobs work -q jobs.db -w 4 -c 4
+    python -m src.jobs status -q jobs.db
+    python -m src.jobs export -q jobs.db -o summaries.jsonl
+
+    Commands:
+    enqueue: Add the documents of a directory or of a JSONL file to the queue
+    work: Summarize the queued documents with worker processes until the queue is drained
+    status: Report the progress, throughput and ETA of the queue
+    retry: Queue the failed documents again
+    export: Write the outcome of every completed document to a JSONL file
+
+    Options:
+    -q, --queue: Path to the SQLite queue file
+    -i, --input: Path to a directory of documents or to a JSONL file of documents (enqueue)
+    -R, --recursive: Scan subdirectories of the input directory recursively (enqueue, default: False)
+    -e, --extensions: List of file extensions to include from the input directory (enqueue, default: all supported)
+    -w, --workers: Number of worker processes on this host (work, default: 1)
+    -c, --concurrency: Number of documents summarized concurrently by every worker (work, default: 4)
+    -l, --lease: Lease of the claimed jobs in seconds, renewed while they run (work, default: 60)
+    -a, --attempts: Maximum number of attempts of every job (work, default: 3)
+    -r, --report: Interval of the progress reports in seconds (work, default: 10)
+    -o, --output: Path to the JSONL file to write the outcomes to (export)
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+from src.utils import get_logger
+
+
+logger = get_logger()
+
+JOB_STATUSES = ("pending", "leased", "done", "failed")
+RETRY_BACKOFF_S = 10
+MAX_RETRY_BACKOFF_S = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    type TEXT,
+    record TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    completed_at REAL,
+    duration_s REAL,
+    summary TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at, seq);
+CREATE INDEX IF NOT EXISTS jobs_completed ON jobs (completed_at);
+"""
+
+
+class JobQueue:
+    '''
+    This is a class for a persistent queue of summarization jobs in
+    a SQLite file, shared by worker processes on one or more hosts.
+    Every state transition is a short write transaction, so that
+    claiming stays cheap next to the LLM calls of a job. A job is
+    leased to the worker that claims it, and only that worker can
+    complete it while its lease holds; an expired lease makes the
+    job claimable again, counting the lost run as an attempt.
+    '''
+    def __init__(self, path: str, lease_s: float = 60, max_attempts: int = 3):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        # Workers call the queue from threads, to keep the event loop free while waiting for locks
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, operation, *args):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+            try:
+                result = operation(*args)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        """Close the connection to the queue file."""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Add documents to the queue, ignoring those whose ID is already queued.
+
+        Args:
+            records (List[Dict[str, Any]]): Documents in the information structure of Open WebUI files.
+
+        Returns:
+            int: The number of documents added.
+        """
+        now = time.time()
+        rows = [(
+            str(record["file"]["id"]),
+            record["file"].get("filename", ''),
+            record["file"].get("meta", {}).get("content_type", ''),
+            json.dumps(record, ensure_ascii=False),
+            now,
+        ) for record in records]
+
+        def _enqueue():
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO jobs (id, filename, type, record, enqueued_at) VALUES (?, ?, ?, ?, ?)", rows)
+            return self._conn.total_changes - before
+
+        return self._transaction(_enqueue)
+
+    def claim(self, worker: str, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Lease up to a number of jobs to a worker, in enqueuing order.
+
+        Args:
+            worker (str): The ID of the worker.
+            limit (int): The maximum number of jobs to claim.
+
+        Returns:
+            List[Tuple[int, Dict[str, Any]]]: The sequence number and the document of every claimed job.
+        """
+        def _claim():
+            now = time.time()
+
+            # Jobs whose lease expired on their last attempt failed, e.g. because they crashed their workers
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, completed_at = ?, error = 'Lease expired on the last attempt' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+
+            rows = self._conn.execute(
+                "SELECT seq, record FROM jobs WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY seq LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, started_at = ? WHERE seq = ?",
+                [(worker, now + self.lease_s, now, seq) for seq, _ in rows],
+            )
+
+            return rows
+
+        if limit < 1:
+            return []
+
+        return [(seq, json.loads(record)) for seq, record in self._transaction(_claim)]
+
+    def renew(self, worker: str, seqs: List[int]) -> None:
+        """Extend the lease of the jobs a worker is still running."""
+        if seqs:
+            self._transaction(lambda: self._conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE seq = ? AND worker = ? AND status = 'leased'",
+                [(time.time() + self.lease_s, seq, worker) for seq in seqs],
+            ))
+
+    def complete(self, worker: str, seq: int, outcome: Dict[str, Any]) -> str:
+        """
+        Record the outcome of a job, retrying it later if it failed and has attempts left.
+
+        Args:
+            worker (str): The ID of the worker that ran the job.
+            seq (int): The sequence number of the job.
+            outcome (Dict[str, Any]): The outcome of the summarization, as returned by `summarize_record`.
+
+        Returns:
+            str: The new status of the job, or an empty string if the worker had lost its lease.
+        """
+        def _complete():
+            now = time.time()
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE seq = ? AND worker = ? AND status = 'leased'", (seq, worker)).fetchone()
+
+            if not row:
+                return ''
+
+            if outcome["status"] == "ok":
+                status, available_at = "done", 0
+            elif row[0] < self.max_attempts:
+                status, available_at = "pending", now + min(MAX_RETRY_BACKOFF_S, RETRY_BACKOFF_S * 2 ** (row[0] - 1))
+            else:
+                status, available_at = "failed", 0
+
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, available_at = ?, completed_at = ?, duration_s = ?, summary = ?, error = ? WHERE seq = ?",
+                (status, available_at, now if status != "pending" else None, outcome.get("duration_s"), outcome.get("summary"), outcome.get("error"), seq),
+            )
+
+            return status
+
+        return self._transaction(_complete)
+
+    def release(self, worker: str) -> int:
+        """Return the jobs leased to a worker to the queue, without counting an attempt, e.g. when it shuts down."""
+        def _release():
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL, attempts = MAX(attempts - 1, 0) WHERE worker = ? AND status = 'leased'",
+                (worker,),
+            ).rowcount
+
+        return self._transaction(_release)
+
+    def retry_failed(self) -> int:
+        """Queue the failed jobs again, with all their attempts."""
+        return self._transaction(lambda: self._conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, completed_at = NULL, error = NULL WHERE status = 'failed'"
+        ).rowcount)
+
+    def is_drained(self) -> bool:
+        """Check whether every job of the queue is either done or failed."""
+        with self._lock:
+            return not self._conn.execute("SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1").fetchone()
+
+    def stats(self, window_s: float = 60) -> Dict[str, Any]:
+        """
+        Report the progress of the queue, aggregated over all its workers.
+
+        Args:
+            window_s (float): Window in seconds of the recent throughput, from which the ETA is estimated.
+
+        Returns:
+            Dict[str, Any]: The number of jobs per status, the overall and recent throughput in
+                documents per second, the ETA in seconds and the completed jobs of every worker.
+        """
+        now = time.time()
+
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            first, last, completed = self._conn.execute(
+                "SELECT MIN(started_at), MAX(completed_at), COUNT(*) FROM jobs WHERE completed_at IS NOT NULL"
+            ).fetchone()
+            recent = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE completed_at >= ?", (now - window_s,)).fetchone()[0]
+            running = self._conn.execute("SELECT worker, COUNT(*) FROM jobs WHERE status = 'leased' GROUP BY worker").fetchall()
+
+        counts = {status: counts.get(status, 0) for status in JOB_STATUSES}
+        remaining = counts["pending"] + counts["leased"]
+        elapsed = (last - first) if completed and last > first else 0
+        # The recent window is shortened to the time the queue has been worked on
+        window = min(window_s, now - first) if first else 0
+        recent_throughput = recent / window if window > 0 else 0
+
+        return {
+            **counts,
+            "total": sum(counts.values()),
+            "throughput_per_s": round(completed / elapsed, 3) if elapsed else 0,
+            "recent_throughput_per_s": round(recent_throughput, 3),
+            "eta_s": round(remaining / recent_throughput) if recent_throughput else None,
+            "running_by_worker": dict(running),
+        }
+
+    def outcomes(self) -> List[Dict[str, Any]]:
+        """Get the outcome of every completed job, in the format of the batch runner output."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, filename, type, status, summary, error, duration_s FROM jobs WHERE status IN ('done', 'failed') ORDER BY seq"
+            ).fetchall()
+
+        return [
+            {"id": id, "filename": filename, "type": type, "status": "ok", "summary": summary, "duration_s": duration_s}
+            if status == "done" else
+            {"id": id, "filename": filename, "type": type, "status": "error", "error": error, "duration_s": duration_s}
+            for id, filename, type, status, summary, error, duration_s in rows
+        ]
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Format the progress of a queue for logging."""
+    eta = f"{stats['eta_s']}s" if stats["eta_s"] is not None else "unknown"
+
+    return (f"{stats['done']}/{stats['total']} done, {stats['failed']} failed, {stats['leased']} running, {stats['pending']} pending, "
+            f"{stats['recent_throughput_per_s']:.2f} docs/s recently ({stats['throughput_per_s']:.2f} docs/s overall), ETA {eta}")
+
+async def enqueue_documents(queue: JobQueue, input_path: str, recursive: bool = False, extensions: Optional[List[str]] = None, batch_size: int = 500) -> int:
+    """
+    Add the documents of a directory or of a JSONL file to a queue, in batches.
+
+    Args:
+        queue (JobQueue): The queue.
+        input_path (str): Path to a directory of documents or to a JSONL file of documents.
+        recursive (bool): Whether to scan subdirectories of the input directory recursively.
+        extensions (List[str], optional): File extensions to include from the input directory.
+        batch_size (int): Number of documents added per transaction.
+
+    Returns:
+        int: The number of documents added.
+    """
+    from src.batch import iter_directory_paths, iter_jsonl_records, load_directory_record
+
+    async def _records() -> AsyncIterator[Dict[str, Any]]:
+        if os.path.isdir(input_path):
+            for file_path in iter_directory_paths(input_path, recursive, extensions):
+                try:
+                    yield await load_directory_record(file_path, input_path)
+                except Exception as e:
+                    logger.error(f"✕ ERROR: Could not load document {file_path}: {str(e)}")
+        else:
+            for record in iter_jsonl_records(input_path):
+                yield record
+
+    added = 0
+    batch = []
+
+    async for record in _records():
+        batch.append(record)
+
+        if len(batch) >= batch_size:
+            added += await asyncio.to_thread(queue.enqueue, batch)
+            batch = []
+
+    if batch:
+        added += await asyncio.to_thread(queue.enqueue, batch)
+
+    return added
+
+async def run_worker(queue: JobQueue, worker: str, concurrency: int = 4, poll_s: float = 1.0) -> Dict[str, int]:
+    """
+    Summarize the jobs of a queue until it is drained, renewing the leases of the running jobs.
+
+    Args:
+        queue (JobQueue): The queue.
+        worker (str): The ID of the worker, unique across all the hosts sharing the queue.
+        concurrency (int): Number of documents summarized concurrently.
+        poll_s (float): Interval in seconds of claiming new jobs while the queue has none available.
+
+    Returns:
+        Dict[str, int]: Counters of the summarized, retried, failed and lost jobs.
+    """
+    from src.batch import summarize_record
+
+    if concurrency < 1:
+        raise ValueError("Concurrency must be a positive integer.")
+
+    running: Dict[asyncio.Task, int] = {}
+    counters = {"done": 0, "pending": 0, "failed": 0, "lost": 0}
+
+    async def _renew_leases():
+        while True:
+            await asyncio.sleep(queue.lease_s / 3)
+            await asyncio.to_thread(queue.renew, worker, list(running.values()))
+
+    heartbeat = asyncio.create_task(_renew_leases())
+
+    try:
+        while True:
+            for seq, record in await asyncio.to_thread(queue.claim, worker, concurrency - len(running)):
+                running[asyncio.create_task(summarize_record(record))] = seq
+
+            if not running:
+                if await asyncio.to_thread(queue.is_drained):
+                    break
+
+                # The remaining jobs are leased to other workers or waiting for a retry
+                await asyncio.sleep(poll_s)
+                continue
+
+            done, _ = await asyncio.wait(running, timeout=poll_s, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                outcome = task.result()
+                status = await asyncio.to_thread(queue.complete, worker, running.pop(task), outcome)
+                counters[status or "lost"] += 1
+
+                if status == "done":
+                    logger.info(f"✓ Summarized document {outcome['id']} in {outcome['duration_s']:.2f} seconds")
+                elif status:
+                    logger.error(f"✕ ERROR: Could not summarize document {outcome['id']} ({'retrying' if status == 'pending' else 'failed'}): {outcome['error']}")
+                else:
+                    logger.warning(f"⚠ WARNING: Lease of document {outcome['id']} expired before it was summarized, discarding the outcome")
+    finally:
+        heartbeat.cancel()
+
+        for task in running:
+            task.cancel()
+
+        # Jobs interrupted by a shutdown are returned to the queue without losing an attempt
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+            released = queue.release(worker)
+            logger.warning(f"⚠ WARNING: Worker {worker} stopped, returned {released} job(s) to the queue")
+
+    return counters
+
+def _worker_main(path: str, concurrency: int, lease_s: float, max_attempts: int) -> None:
+    """Entry point of a worker process."""
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(path, lease_s=lease_s, max_attempts=max_attempts)
+
+    try:
+        counters = asyncio.run(run_worker(queue, worker, concurrency=concurrency))
+        logger.info(f"✓ Worker {worker} finished: {counters['done']} summarized, {counters['pending']} retried, {counters['failed']} failed")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+def run_workers(path: str, workers: int = 1, concurrency: int = 4, lease_s: float = 60, max_attempts: int = 3, report_s: float = 10) -> Dict[str, Any]:
+    """
+    Summarize the jobs of a queue with worker processes on this host, reporting the progress of the queue until it is drained.
+
+    Args:
+        path (str): Path to the SQLite queue file.
+        workers (int): Number of worker processes.
+        concurrency (int): Number of documents summarized concurrently by every worker.
+        lease_s (float): Lease of the claimed jobs in seconds.
+        max_attempts (int): Maximum number of attempts of every job.
+        report_s (float): Interval of the progress reports in seconds.
+
+    Returns:
+        Dict[str, Any]: The final statistics of the queue.
+    """
+    # Every worker gets a fresh interpreter, with its own event loop, scheduler and LLM clients
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_main, args=(path, concurrency, lease_s, max_attempts)) for _ in range(workers)]
+    queue = JobQueue(path, lease_s=lease_s, max_attempts=max_attempts)
+    start_time = time.monotonic()
+
+    for process in processes:
+        process.start()
+
+    try:
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(timeout=report_s / len(processes))
+
+            logger.info(f"→ Queue {path}: {format_stats(queue.stats())}")
+    except KeyboardInterrupt:
+        # The workers got the interrupt too, and return their jobs to the queue
+        for process in processes:
+            process.join()
+
+    stats = queue.stats()
+    queue.close()
+    logger.info(f"Workers completed in {time.monotonic() - start_time:.2f} seconds: {format_stats(stats)}")
+
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point of the job queue."""
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Job Queue')
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add the documents of a directory or of a JSONL file to the queue")
+    enqueue.add_argument("-i", "--input", help="Path to a directory of documents or to a JSONL file of documents", type=str, required=True)
+    enqueue.add_argument("-R", "--recursive", help="Scan subdirectories of the input directory recursively", action="store_true")
+    enqueue.add_argument("-e", "--extensions", help="List of file extensions to include from the input directory", type=str, nargs='+', default=None)
+
+    work = commands.add_parser("work", help="Summarize the queued documents with worker processes until the queue is drained")
+    work.add_argument("-w", "--workers", help="Number of worker processes on this host", type=int, default=1)
+    work.add_argument("-c", "--concurrency", help="Number of documents summarized concurrently by every worker", type=int, default=4)
+    work.add_argument("-l", "--lease", help="Lease of the claimed jobs in seconds, renewed while they run", type=float, default=60)
+    work.add_argument("-a", "--attempts", help="Maximum number of attempts of every job", type=int, default=3)
+    work.add_argument("-r", "--report", help="Interval of the progress reports in seconds", type=float, default=10)
+
+    commands.add_parser("status", help="Report the progress, throughput and ETA of the queue")
+    commands.add_parser("retry", help="Queue the failed documents again")
+
+    export = commands.add_parser("export", help="Write the outcome of every completed document to a JSONL file")
+    export.add_argument("-o", "--output", help="Path to the JSONL file to write the outcomes to", type=str, required=True)
+
+    for command in commands.choices.values():
+        command.add_argument("-q", "--queue", help="Path to the SQLite queue file", type=str, required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command != "enqueue" and not os.path.exists(args.queue):
+        sys.exit(f"Wrong path to queue file: {args.queue}")
+
+    if args.command == "work":
+        if args.workers < 1 or args.concurrency < 1:
+            sys.exit(f"Wrong number of workers or concurrency: {args.workers}, {args.concurrency}")
+        if args.lease <= 0 or args.attempts < 1:
+            sys.exit(f"Wrong lease or attempts: {args.lease}, {args.attempts}")
+
+        stats = run_workers(args.queue, args.workers, args.concurrency, args.lease, args.attempts, args.report)
+        return 1 if stats["failed"] else 0
+
+    queue = JobQueue(args.queue)
+
+    try:
+        if args.command == "enqueue":
+            if not os.path.exists(args.input):
+                sys.exit(f"Wrong path to input documents: {args.input}")
+
+            added = asyncio.run(enqueue_documents(queue, args.input, args.recursive, args.extensions))
+            logger.info(f"✓ Added {added} document(s) to queue {args.queue}")
+        elif args.command == "status":
+            print(json.dumps(queue.stats(), indent=2))
+        elif args.command == "retry":
+            logger.info(f"✓ Queued {queue.retry_failed()} failed document(s) again")
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                for outcome in queue.outcomes():
+                    f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+    finally:
+        queue.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
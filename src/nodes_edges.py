@@ -1,21 +1,52 @@
 from langchain_core.documents import Document
-from langchain.chains.combine_documents.reduce import acollapse_docs
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.graph import END
 from langgraph.types import Send
-from typing import Literal
-
-from src.config import TOKEN_MAX
+from typing import Dict, List, Literal
+import asyncio
+import itertools
+import logging
+import time
+
+from src.budget import close_budget, extractive_summary, get_budget, invoke_within_budget, open_budget
+from src.clustering import cluster_chunks, weigh_summary
+from src.coalescing import get_coalescer
+from src.folding import SummaryFolder
+from src.config import CHUNK_SIZE, CLUSTER_MIN_CHUNKS, CLUSTERING_ENABLED, COALESCING_ENABLED, FOLDING_ENABLED, INCREMENTAL_ENABLED, TOKEN_MAX
+from src.incremental import close_manifest, get_manifest, is_group_boundary, open_manifest
 from src.oifile import OIFile
-from src.states import InputState, OverallState, OutputState, LoadState, SplitState, MapSummaryState, CollapseState, ReduceSummaryState
-from src.utils import split_list_of_docs_async, chunk_document, get_logger, get_map_chain, get_reduce_chain, length_function
+from src.payloads import content_size, load_content
+from src.profiling import close_memory_profile
+from src.results import close_output_mode, document_result, get_output_mode, open_output_mode
+from src.scheduler import close_flow, estimate_tokens, get_chunk_scheduler, open_flow
+from src.stages import close_stage_latencies, stage_call
+from src.structured_logging import log_sampled
+from src.tracing import close_trace
+from src.states import InputState, OverallState, OutputState, DocumentState, LoadState, SplitState, ClusterState, MapSummaryState, CollapseState, ReduceSummaryState, CoalesceState
+from src.utils import split_list_of_docs_async, chunk_document, get_collapse_chain, get_logger, get_map_chain, get_reduce_chain, get_run_id, length_function
 
 
 logger = get_logger()
 
 
-async def _map_input(state: InputState) -> LoadState:
+async def _map_input(state: InputState, config: RunnableConfig) -> LoadState:
     """Map input files to load_document state."""
     sends = []
 
+    # Plan the run around its budget, if any, from the lengths of the texts of its documents, decompressed if needed,
+    # as neither the length of compressed or referenced content nor the size of the original file tells it
+    sizes = []
+
+    if state.get('budget'):
+        files = [file.get("file", {}) for file in state.get('files', []) if isinstance(file, dict)]
+        sizes = await asyncio.to_thread(lambda: [content_size(info.get("data")) for info in files])
+
+    open_budget(get_run_id(config), state.get('budget'), sizes)
+    # Share the LLM capacity fairly with the concurrent runs, as a run of its tenant, if any
+    open_flow(get_run_id(config), state.get('tenant'))
+    open_output_mode(get_run_id(config), state.get('output_mode'))
+
     # Send each file in the input state to the load_document state in parallel
     for file in state.get('files', []):
         sends.append(
@@ -26,9 +57,10 @@ async def _map_input(state: InputState) -> LoadState:
 
     return sends
 
-async def _load_document(state: LoadState) -> OverallState:
+async def _load_document(state: LoadState, config: RunnableConfig) -> OverallState:
     """Load a document from the provided file information dictionary."""
     results = []
+    coalesced = {}
 
     try:
         file = state.get('file', {})
@@ -37,14 +69,25 @@ async def _load_document(state: LoadState) -> OverallState:
             file_info = file["file"]
             logger.debug(f"Loading document with ID {file_info.get('id', '')}")
 
-            if file_info.get('data', {}).get('content', ''):
+            # The content is inline, compressed or a reference to the file store, resolved only now
+            content = await load_content(file_info.get('data', {}))
+
+            if content:
                 results.append(OIFile(
                     id=file_info['id'],
                     name=file_info['filename'],
                     type=file_info['meta']['content_type'],
-                    content=file_info['data']['content']
+                    content=content
                 ))
                 logger.debug(f"✓ Successfully loaded document: {results[0]}")
+
+                if COALESCING_ENABLED:
+                    # Await the summary of a concurrent run summarizing the same document, if any
+                    coalescer = get_coalescer()
+                    key = coalescer.key_for(results[0])
+
+                    if coalescer.lead_or_follow(key, get_run_id(config), results[0].get_id()):
+                        coalesced[results[0].get_id()] = key
             else:
                 logger.error(f"✕ ERROR: Missing data or content of document with ID {file_info.get('id', '')}")
         else:
@@ -52,156 +95,369 @@ async def _load_document(state: LoadState) -> OverallState:
     except Exception as e:
         logger.error(f"✕ ERROR: Could not load document: {str(e)}")
 
-    return {'documents': results}
+    return {'documents': results, 'coalesced_documents': coalesced}
 
 async def _map_documents(state: OverallState) -> SplitState:
-    """Map loaded documents to split_document state."""
+    """Map loaded documents to summarize_document state, or to await_coalesced_summary state if summarized by another run."""
     sends = []
 
+    coalesced = state.get('coalesced_documents', {})
+
+    # Every document runs through its own pipeline, so it never waits for the other documents of the run
     for doc in state.get('documents', []):
         sends.append(
-            Send("split_document", {
+            Send("await_coalesced_summary" if doc.get_id() in coalesced else "summarize_document", {
                 "document": doc,
             })
         )
 
     return sends
 
-async def _split_document(state: SplitState) -> OverallState:
-    """Split a document into chunks."""
+def _document_timings(doc: OIFile, started_at: float) -> Dict[str, Dict[str, float]]:
+    """Get the start and completion timestamps of the summarization of a document."""
+    completed_at = time.time()
+
+    return {
+        doc.get_id(): {
+            "started_at": started_at,
+            "completed_at": completed_at,
+            "duration_s": round(completed_at - started_at, 3),
+        }
+    }
+
+async def _summarize_document(state: SplitState, config: RunnableConfig) -> OutputState:
+    """Summarize a document by running its own split, map and reduce pipeline."""
+    # Imported here, as the document graph is built by the summarizer module, which imports this module
+    from src.summarizer import get_document_graph
+
+    doc = state.get('document', None)
+
+    if not doc:
+        logger.error("✕ ERROR: No document provided to '_summarize_document'")
+        return {"result": {}}
+
+    started_at = time.time()
+
+    # The document ID is inherited by the nodes of the pipeline through the metadata, to annotate their logs with,
+    # and its chunks are only read back to count them, not to return them
+    output = await get_document_graph().ainvoke(
+        {"document": doc, "document_id": doc.get_id()},
+        merge_configs(config, {"metadata": {"document_id": doc.get_id()}}),
+        output_keys=["result", "llm_calls", "clustering", "chunks", "chunk_weights"],
+    )
+
+    logger.debug(f"✓ Completed summarization pipeline of document {doc.get_name()} in {time.time() - started_at:.2f} seconds")
+
+    timings = _document_timings(doc, started_at)
+    results = output.get("result") or {}
+    llm_calls = output.get("llm_calls") or {}
+
+    # The pipeline returns the summary of the document, which is shaped by the output mode of the run
+    if doc.get_id() in results:
+        doc.set_summary(results[doc.get_id()]["summary"])
+        results = {doc.get_id(): document_result(
+            doc,
+            get_output_mode(get_run_id(config)),
+            chunks=sum(output.get("chunk_weights") or ()) or len(output.get("chunks") or ()),
+            llm_calls=llm_calls.get(doc.get_id()),
+            duration_s=timings[doc.get_id()]["duration_s"],
+        )}
+
+    return {
+        "result": results,
+        "llm_calls": llm_calls,
+        "clustering": output.get("clustering") or {},
+        "document_timings": timings,
+    }
+
+async def _await_coalesced_summary(state: CoalesceState, config: RunnableConfig) -> OutputState:
+    """Await the summary of a document generated by a concurrent run, taking over if that run is aborted or fails."""
     results = {}
 
+    doc = state.get('document', None)
+
+    if doc:
+        coalescer = get_coalescer()
+        run_id = get_run_id(config)
+        key = coalescer.key_for(doc)
+        started_at = time.time()
+
+        # No flight to claim if the run was resumed, e.g. after a restart, so summarize the document directly
+        flight = coalescer.claim(run_id, doc.get_id())
+        summary = None
+
+        while flight:
+            summary = await coalescer.wait(flight, run_id)
+
+            if summary is not None:
+                break
+
+            # The leading run was aborted or failed, so either lead the flight now or follow whoever did first
+            flight = coalescer.take_over(key, run_id)
+
+        if summary is not None:
+            doc.set_summary(summary)
+            timings = _document_timings(doc, started_at)
+            results[doc.get_id()] = document_result(doc, get_output_mode(run_id), llm_calls={"made": 0, "saved": 0}, duration_s=timings[doc.get_id()]["duration_s"])
+
+            logger.debug(f"✓ Successfully reused the summary of a concurrent run for {doc.get_name()}")
+
+            return {"result": results, "document_timings": timings}
+
+        logger.debug(f"→ Summarizing document {doc.get_name()} of run {run_id} itself")
+
+        output = await _summarize_document({"document": doc}, config)
+        output["document_timings"] = _document_timings(doc, started_at)
+
+        return output
+    else:
+        logger.error("✕ ERROR: No document provided to '_await_coalesced_summary'")
+
+    return {"result": results}
+
+async def _split_document(state: SplitState, config: RunnableConfig) -> DocumentState:
+    """Split a document into chunks."""
+    results = ()
+
     file = state.get('document', None)
 
     if file:
         logger.debug(f"Splitting document: {file}")
 
-        chunks = await chunk_document(file)
+        budget = get_budget(get_run_id(config))
+        chunks = await chunk_document(file, chunk_size=budget.chunk_size if budget else CHUNK_SIZE)
 
         if chunks:
-            # Store chunks in dictionary with file ID as key
-            results[file.get_id()] = chunks
+            results = chunks
+
+            # Load the chunk and reduce summaries of the previous version of the document, if any
+            await open_manifest(get_run_id(config), file)
 
             logger.debug(f"✓ Successfully split document {file.get_name()} into {len(chunks)} chunks")
         else:
             logger.warning(f"⚠ WARNING: No chunks generated for document {file.get_name()}")
+
+            # No summary will be generated, so let runs awaiting it summarize the document themselves
+            get_coalescer().abandon(get_coalescer().key_for(file), get_run_id(config))
     else:
         logger.error("✕ ERROR: No document provided to '_split_document'")
 
-    return {'document_chunks': results}
+    return {'chunks': results}
 
-async def _map_chunks(state: OverallState) -> MapSummaryState:
-    """Map document chunks to generate_summary state."""
-    sends = []
+async def _should_summarize(state: DocumentState) -> Literal["cluster_chunks", "generate_summary", "__end__"]:
+    """Decide whether to cluster the chunks of a document, to summarize them or to end, if no chunks were generated."""
+    if not state.get('chunks'):
+        return END
 
-    for fid, chunks in state.get('document_chunks', {}).items():
-        for chunk in chunks:
-            sends.append(
-                Send("generate_summary", {
-                    "document_id": fid,
-                    "content": chunk,
-                })
-            )
+    return "cluster_chunks" if CLUSTERING_ENABLED and len(state['chunks']) >= CLUSTER_MIN_CHUNKS else "generate_summary"
 
-    return sends
+async def _cluster_chunks(state: ClusterState, config: RunnableConfig) -> DocumentState:
+    """Reduce the chunks of a document to a representative of every cluster of near-duplicate chunks."""
+    file_id = state.get("document_id", '')
+    chunks = [chunk for chunk in state.get("chunks", ()) if chunk]
+
+    try:
+        started_at = time.perf_counter()
+        # Embedding and clustering are CPU-bound, so they run off the event loop
+        representatives, weights = await asyncio.to_thread(cluster_chunks, chunks)
+        duration = time.perf_counter() - started_at
+    except ImportError as e:
+        logger.warning(f"⚠ WARNING: Could not cluster the chunks of document with ID {file_id}: {str(e)}")
+        return {}
+
+    stats = {
+        "chunks": len(chunks),
+        "clusters": len(representatives),
+        "map_calls_saved": len(chunks) - len(representatives),
+        "map_call_reduction": round(1 - len(representatives) / len(chunks), 3) if chunks else 0,
+        "duration_s": round(duration, 4),
+    }
 
-async def _generate_summary(state: MapSummaryState) -> OverallState:
-    """Generate a summary for a document chunk."""
-    document_ids = []
+    logger.info(f"✓ Clustered {len(chunks)} chunks of document with ID {file_id} into {len(representatives)} clusters "
+                f"in {duration:.3f} seconds, saving {stats['map_calls_saved']} map call(s)")
+
+    return {"chunks": tuple(representatives), "chunk_weights": weights, "clustering": {file_id: stats}}
+
+async def _generate_summary(state: MapSummaryState, config: RunnableConfig) -> DocumentState:
+    """Generate a summary for each chunk of a document."""
     partial_summaries = []
 
     file_id = state.get("document_id", '')
-    context = state.get("content", '')
+    # Chunks standing for a cluster of near-duplicate chunks are weighted by the size of their cluster
+    weighted = [(chunk, weight) for chunk, weight in zip(state.get("chunks", ()), state.get("chunk_weights") or itertools.repeat(1)) if chunk]
+    chunks = [chunk for chunk, _ in weighted]
+    weights = [weight for _, weight in weighted]
 
-    if file_id and context:
+    if file_id and chunks:
         map_chain = get_map_chain()
-        response = await map_chain.ainvoke({'context': context})
-        document_ids.append(file_id)
-        partial_summaries.append(response)
+        manifest = get_manifest(get_run_id(config), file_id)
+        budget = get_budget(get_run_id(config))
+        selected = budget.select_chunks(len(chunks)) if budget else [True] * len(chunks)
+        folder = None
+
+        if FOLDING_ENABLED:
+            # Collapse complete groups of summaries while the remaining chunks are still being summarized
+            folder = SummaryFolder(
+                len(chunks),
+                budget.token_max if budget else TOKEN_MAX,
+                lambda group, groups: _collapse_group(group, file_id, groups, config),
+                key=(get_run_id(config), file_id),
+                run_id=get_run_id(config),
+                document_id=file_id,
+                is_boundary=(lambda doc: is_group_boundary(doc.page_content)) if INCREMENTAL_ENABLED else None,
+            )
+
+        async def _summarize_chunk(idx: int) -> str:
+            context = chunks[idx]
+            summary = None
 
-        logger.debug(f"✓ Successfully generated summary for document with ID {file_id}")
+            async def _call(cfg: RunnableConfig) -> str:
+                async with stage_call("map", get_run_id(config), document_id=file_id, chunk=idx):
+                    return await map_chain.ainvoke({'context': context}, config=cfg)
+
+            if selected[idx]:
+                summary = await invoke_within_budget(budget, _call, config)
+
+            # Out of budget, so summarize the chunk by its leading sentences, which is never recorded in the manifest
+            if summary is None:
+                summary = extractive_summary(context, 20)
+            else:
+                manifest.record("map", context, summary)
+                log_sampled(logger, logging.DEBUG, "✓ Summarized chunk %d of %d (%d characters) of document with ID %s", idx, len(chunks), len(context), file_id)
+
+            summary = weigh_summary(summary, weights[idx])
+
+            if folder:
+                await folder.add(idx, summary)
+
+            return summary
+
+        # Only the chunks changed since the previous version of the document are summarized again
+        partial_summaries = [manifest.lookup("map", chunk) for chunk in chunks]
+        missing = [idx for idx, summary in enumerate(partial_summaries) if summary is None]
+        partial_summaries = [summary if summary is None else weigh_summary(summary, weight) for summary, weight in zip(partial_summaries, weights)]
+
+        try:
+            if folder:
+                for idx, summary in enumerate(partial_summaries):
+                    if summary is not None:
+                        await folder.add(idx, summary)
+
+            # Keep at most a window of chunk tasks in flight, pulling more as results arrive
+            summaries = await get_chunk_scheduler().map(
+                _summarize_chunk,
+                missing,
+                key=(get_run_id(config), file_id),
+                costs=[estimate_tokens(chunks[idx]) for idx in missing],
+                label=f"for document with ID {file_id}",
+            )
+
+            for idx, summary in zip(missing, summaries):
+                partial_summaries[idx] = summary
+
+            logger.debug(f"✓ Successfully generated {len(partial_summaries)} summaries for document with ID {file_id}")
+
+            if folder and folder.folding:
+                return {"summaries": await folder.result()}
+        finally:
+            if folder:
+                folder.cancel()
     else:
         logger.error('✕ ERROR: No text content for generating summary on')
 
-    # Return with document and chunk indexes to maintain structure
-    return {
-        "document_ids": document_ids,
-        "partial_summaries": partial_summaries,
-    }
+    return {"summaries": [Document(partial_summary) for partial_summary in partial_summaries]}
 
-async def _group_partial_summaries(state: OverallState) -> OverallState:
-    """Group partial summaries by their document IDs."""
-    results_by_doc = {}
+async def _should_collapse(state: DocumentState, config: RunnableConfig) -> Literal["collapse_summaries", "generate_final_summary"]:
+    """Decide whether to collapse the summaries of a document or to generate its final summary."""
+    fid = state.get("document_id", '')
+    budget = get_budget(get_run_id(config))
+    token_count = await length_function(state.get("summaries", []))
 
-    # Collect all items with their document indexes
-    for fid, partial_summary in zip(state.get("document_ids", []), state.get("partial_summaries", [])):
-        results_by_doc.setdefault(fid, []).append(Document(partial_summary))
+    if token_count > (budget.token_max if budget else TOKEN_MAX):
+        logger.debug(f"→ Directed flow to 'collapse_summaries' for file with ID {fid}")
+        return "collapse_summaries"
 
-    logger.debug(f"✓ Successfully grouped {len(results_by_doc)} partial summaries by document ID")
+    logger.debug(f"→ Directed flow to 'generate_final_summary' for file with ID {fid}")
+    return "generate_final_summary"
 
-    return {"document_partial_summaries": results_by_doc}
+async def _collapse_group(doc_list: List[Document], file_id: str, groups: int, config: RunnableConfig) -> Document:
+    """Collapse a group of summaries of a document, one of about `groups` groups, reusing its summary from the previous version of the document."""
+    from langchain.chains.combine_documents.reduce import acollapse_docs
 
-async def _should_collapse(state: OverallState) -> Literal["collapse_summaries", "generate_final_summary"]:
-    """Decide whether to collapse summaries or generate final summary."""
-    sends = []
+    budget = get_budget(get_run_id(config))
+    token_max = budget.token_max if budget else TOKEN_MAX
+    manifest = get_manifest(get_run_id(config), file_id)
 
-    # Create mapping of documents by ID for easier lookup
-    doc_map = {doc.get_id(): doc for doc in state.get("documents", [])}
-
-    for fid, partial_summaries in state.get('document_partial_summaries', {}).items():
-        if fid in doc_map:
-            if not doc_map[fid].get_summary():
-                # Use async version - add await here
-                token_count = await length_function(partial_summaries)
-
-                if token_count > TOKEN_MAX:
-                    sends.append(
-                        Send("collapse_summaries", {
-                            "document_id": fid,
-                            "summaries": partial_summaries,
-                        })
-                    )
-                    logger.debug(f"→ Directed flow to 'collapse_summaries' for file with ID {fid}")
-                else:
-                    sends.append(
-                        Send("generate_final_summary", {
-                            "document": doc_map[fid],
-                            "summaries": partial_summaries,
-                        })
-                    )
-                    logger.debug(f"→ Directed flow to 'generate_final_summary' for file with ID {fid}")
+    text = "\n\n".join(doc.page_content for doc in doc_list)
+    summary = manifest.lookup("collapse", text)
 
-    return sends
+    if summary is not None:
+        return Document(summary)
+
+    collapse_chain = get_collapse_chain()
+
+    async def _call(cfg: RunnableConfig) -> Document:
+        async with stage_call("collapse", get_run_id(config), document_id=file_id, summaries=len(doc_list)):
+            return await acollapse_docs(doc_list, collapse_chain.ainvoke, config=cfg)
+
+    collapsed = await invoke_within_budget(budget, _call, config, reduce=True)
+
+    # Out of budget, so keep the leading sentences of the group, at most half of it, so that collapsing converges
+    if collapsed is None:
+        return Document(extractive_summary(text, max(20, token_max * 3 // 4 // groups), max_chars=len(text) // 2))
+
+    manifest.record("collapse", text, collapsed.page_content)
+    log_sampled(logger, logging.DEBUG, "✓ Collapsed %d summaries of document with ID %s", len(doc_list), file_id)
+
+    return collapsed
 
-async def _collapse_summaries(state: CollapseState) -> OverallState:
+async def _collapse_summaries(state: CollapseState, config: RunnableConfig) -> DocumentState:
     """Collapse summaries for a document."""
-    results = {}
+    results = []
 
     file_id = state.get('document_id', '')
     summaries = state.get('summaries', [])
 
     if file_id and summaries:
-        # Use our async version instead of the synchronous one
+        budget = get_budget(get_run_id(config))
+        token_max = budget.token_max if budget else TOKEN_MAX
+
+        # Use our async version instead of the synchronous one, with content-defined group boundaries,
+        # so that the groups of unchanged partial summaries are the same as in the previous version
         doc_lists = await split_list_of_docs_async(
             summaries,
             length_function,
-            TOKEN_MAX
+            token_max,
+            is_boundary=(lambda doc: is_group_boundary(doc.page_content)) if INCREMENTAL_ENABLED else None,
         )
 
-        if doc_lists:
-            results[file_id] = []
+        # Every round must reduce the number of summaries, or collapsing would never end, e.g. when
+        # identical summaries of repetitive sections all end a group, so fall back to grouping by tokens only
+        if INCREMENTAL_ENABLED and len(doc_lists) >= len(summaries):
+            doc_lists = await split_list_of_docs_async(summaries, length_function, token_max)
 
-            reduce_chain = get_reduce_chain()
-            for doc_list in doc_lists:
-                results[file_id].append(await acollapse_docs(doc_list, reduce_chain.ainvoke))
+        # Summaries each filling most of the token limit are collapsed in pairs
+        if len(doc_lists) >= len(summaries) > 1:
+            doc_lists = [summaries[idx:idx + 2] for idx in range(0, len(summaries), 2)]
+
+        if doc_lists:
+            # Collapse the groups of the document concurrently, within the window of the scheduler
+            results = await get_chunk_scheduler().map(
+                lambda doc_list: _collapse_group(doc_list, file_id, len(doc_lists), config),
+                doc_lists,
+                key=(get_run_id(config), file_id),
+                costs=[sum(estimate_tokens(doc.page_content) for doc in doc_list) for doc_list in doc_lists],
+                label=f"for collapsing document with ID {file_id}",
+            )
 
             logger.debug(f"✓ Successfully collapsed summaries for document ID: {file_id}")
 
-    return {"document_partial_summaries": results}
+    return {"summaries": results}
 
-async def _generate_final_summary(state: ReduceSummaryState) -> OutputState:
+async def _generate_final_summary(state: ReduceSummaryState, config: RunnableConfig) -> OutputState:
     """Generate the final summary for a document."""
     results = {}
+    llm_calls = {}
 
     doc = state.get("document", None)
     summaries = state.get("summaries", [])
@@ -209,12 +465,48 @@ async def _generate_final_summary(state: ReduceSummaryState) -> OutputState:
     if doc and summaries:
         try:
             reduce_chain = get_reduce_chain()
-            response = await reduce_chain.ainvoke({'docs': summaries})
+            manifest = get_manifest(get_run_id(config), doc.get_id())
+            text = "\n\n".join(summary.page_content for summary in summaries)
+            response = manifest.lookup("reduce", text)
+
+            degraded = False
+
+            if response is None:
+                budget = get_budget(get_run_id(config))
+                tokens = sum(estimate_tokens(summary.page_content) for summary in summaries)
+
+                async def _call(cfg: RunnableConfig) -> str:
+                    async with stage_call("reduce", get_run_id(config), document_id=doc.get_id(), summaries=len(summaries)):
+                        return await reduce_chain.ainvoke({'docs': summaries}, config=cfg)
+
+                async with get_chunk_scheduler().slot(key=(get_run_id(config), doc.get_id()), tokens=tokens):
+                    response = await invoke_within_budget(budget, _call, config, reduce=True)
+
+                if response is None:
+                    # Out of budget, so keep the leading sentences of the partial summaries
+                    response = extractive_summary(text, 250)
+                    degraded = True
+                else:
+                    manifest.record("reduce", text, response)
+
             doc.set_summary(response)
-            results[doc.get_id()] = doc.to_dict()
+            # Shaped by the output mode of the run once the pipeline of the document completes
+            results[doc.get_id()] = doc.to_dict(include_content=False)
+
+            # Store the manifest for the next version of the document and report the LLM calls made and saved
+            llm_calls[doc.get_id()] = await close_manifest(get_run_id(config), doc.get_id())
+
+            # Hand the summary over to the concurrent runs awaiting the same document, unless degraded by the budget of this run
+            if degraded:
+                get_coalescer().abandon(get_coalescer().key_for(doc), get_run_id(config))
+            else:
+                get_coalescer().resolve(get_coalescer().key_for(doc), get_run_id(config), response)
 
             logger.debug(f"✓ Successfully generated final summary for {doc.get_name()}")
         except Exception as e:
+            await close_manifest(get_run_id(config), doc.get_id(), commit=False)
+            get_coalescer().abandon(get_coalescer().key_for(doc), get_run_id(config))
+
             logger.error(f"✕ ERROR: Exception while generating final summary for {doc.get_name()}: {str(e)}")
     else:
         if not doc:
@@ -223,4 +515,49 @@ async def _generate_final_summary(state: ReduceSummaryState) -> OutputState:
         if not summaries:
             logger.warning(f"⚠ WARNING: No summaries provided for {doc.get_name()}, using placeholder")
 
-    return {"result": results}
\ No newline at end of file
+    return {"result": results, "llm_calls": llm_calls}
+
+async def _report_run(state: OverallState, config: RunnableConfig) -> OutputState:
+    """Report the latency of the LLM calls of every stage of the run, its queue waits, its actual spend against its budget, its memory profile and its critical path, if any."""
+    # The input files and loaded documents are no longer needed once summarized, so they are dropped from the final checkpoint
+    report = {"stage_latency": close_stage_latencies(get_run_id(config)), "files": [], "documents": None}
+    close_output_mode(get_run_id(config))
+
+    if report["stage_latency"]:
+        logger.info(f"✓ Run {get_run_id(config)} LLM latency per stage: " + ", ".join(
+            f"{stage} ({stats['model']}) {stats['calls']} call(s), p50 {stats['p50_s']:.2f}s, p95 {stats['p95_s']:.2f}s"
+            for stage, stats in report["stage_latency"].items()
+        ))
+
+    queue_wait = close_flow(get_run_id(config))
+
+    if queue_wait is not None:
+        logger.info(f"✓ Run {get_run_id(config)} of tenant {queue_wait['tenant']} waited for {queue_wait['waits']} LLM slot(s), "
+                    f"p50 {queue_wait['p50_s']:.2f}s, p95 {queue_wait['p95_s']:.2f}s, max {queue_wait['max_s']:.2f}s")
+
+        report["queue_wait"] = queue_wait
+
+    budget = close_budget(get_run_id(config))
+
+    if budget is not None:
+        logger.info(f"✓ Run {get_run_id(config)} spent {budget['spent_tokens']} tokens of {budget['max_tokens']} "
+                    f"in {budget['elapsed_s']:.2f} of {budget['deadline_s']} seconds, {budget['degraded_calls']} call(s) degraded")
+
+        report["budget"] = budget
+
+    memory_profile = close_memory_profile(get_run_id(config))
+
+    if memory_profile is not None:
+        logger.info(f"✓ Run {get_run_id(config)} raised the process peak RSS by {memory_profile['peak_rss_growth_bytes']} bytes to {memory_profile['process_peak_rss_bytes']} bytes, traced peak {memory_profile['traced_peak_bytes']} bytes")
+
+        report["memory_profile"] = memory_profile
+
+    trace = await close_trace(get_run_id(config))
+
+    if trace is not None:
+        if trace.get("bounded_by"):
+            logger.info(f"✓ Run {get_run_id(config)} took {trace['duration_s']:.2f} seconds, bounded by document {trace['document']}: {trace['bounded_by']}")
+
+        report["trace"] = trace
+
+    return report
\ No newline at end of file
@@ -103,12 +103,32 @@ class OIFile:
             ]),
         ])
 
-    def to_dict(self) -> dict:
-        """Convert OIFile instance to a dictionary."""
+    def to_dict(self, include_content: bool = True) -> dict:
+        """Convert OIFile instance to a dictionary, optionally without its content."""
+        if not include_content:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "type": self.type,
+                "summary": self.summary
+            }
+
         return {
             "id": self.id,
             "name": self.name,
             "type": self.type,
             "content": self.content,
             "summary": self.summary
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OIFile":
+        """Restore an OIFile instance from its dictionary, without cleaning its already cleaned content again."""
+        file = cls.__new__(cls)
+        file.id = data.get("id")
+        file.name = data.get("name")
+        file.type = data.get("type")
+        file.content = data.get("content") or ''
+        file.summary = data.get("summary")
+
+        return file
\ No newline at end of file
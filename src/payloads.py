@@ -0,0 +1,200 @@
+from typing import Any, Dict, Optional
+import asyncio
+import base64
+import binascii
+import io
+import os
+import zlib
+
+from src.config import FILE_STORE_DIR, MAX_COMPRESSION_RATIO, MAX_CONTENT_BYTES
+
+
+CONTENT_ENCODINGS = ("identity", "gzip", "zstd")
+# Decompressed in blocks, so that the size limits are enforced before a block is ever held in memory
+BLOCK_SIZE = 1 << 20
+
+
+class PayloadError(ValueError):
+    """Raised when the content of a file in the run input cannot be resolved within the limits."""
+
+
+def _check_size(size: int, compressed: int, max_bytes: int, max_ratio: float) -> None:
+    if size > max_bytes:
+        raise PayloadError(f"Content exceeds the limit of {max_bytes} bytes")
+    if compressed and size > 1 << 16 and size / compressed > max_ratio:
+        raise PayloadError(f"Content exceeds the compression ratio limit of {max_ratio:g} (decompression bomb)")
+
+def decompress(data: bytes, encoding: str, max_bytes: int = MAX_CONTENT_BYTES, max_ratio: float = MAX_COMPRESSION_RATIO) -> bytes:
+    """
+    Decompress content incrementally, aborting as soon as it exceeds the size or compression ratio limit.
+
+    Args:
+        data (bytes): The compressed content.
+        encoding (str): The compression of the content, one of "identity", "gzip" or "zstd".
+        max_bytes (int): Maximum size of the decompressed content in bytes.
+        max_ratio (float): Maximum ratio of the decompressed to the compressed size, past the first 64 KB.
+
+    Returns:
+        bytes: The decompressed content.
+    """
+    if encoding not in CONTENT_ENCODINGS:
+        raise PayloadError(f"Content encoding must be one of: {', '.join(CONTENT_ENCODINGS)}.")
+
+    if encoding == "identity":
+        _check_size(len(data), 0, max_bytes, max_ratio)
+        return data
+
+    output = io.BytesIO()
+
+    if encoding == "gzip":
+        # Accept both gzip and zlib headers
+        decompressor = zlib.decompressobj(wbits=47)
+        pending = data
+
+        while not decompressor.eof:
+            block = decompressor.decompress(pending, BLOCK_SIZE)
+            pending = decompressor.unconsumed_tail
+
+            if not block and not pending:
+                break
+
+            output.write(block)
+            _check_size(output.tell(), len(data), max_bytes, max_ratio)
+
+        if not decompressor.eof:
+            raise PayloadError("Truncated gzip content")
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raise PayloadError("zstd content requires the zstandard package")
+
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+            while block := reader.read(BLOCK_SIZE):
+                output.write(block)
+                _check_size(output.tell(), len(data), max_bytes, max_ratio)
+
+    return output.getvalue()
+
+def resolve_store_path(path: str, store_dir: str = FILE_STORE_DIR) -> str:
+    """Get the absolute path of a file referenced in the run input, which must be inside the file store."""
+    if not store_dir:
+        raise PayloadError("File references require FILE_STORE_DIR to be set")
+
+    root = os.path.realpath(store_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+
+    # Symbolic links and ".." components are resolved first, so that they cannot escape the store
+    if os.path.commonpath((root, resolved)) != root:
+        raise PayloadError(f"File reference {path} is outside of the file store")
+
+    return resolved
+
+def read_content(data: Dict[str, Any]) -> str:
+    """
+    Resolve the text content of a file in the run input, given its "data" dictionary, which holds either:
+    - "content": the text itself, or the base64 of the compressed text if "content_encoding" is "gzip" or "zstd".
+    - "path": the path of a file in the file store (FILE_STORE_DIR), compressed if "content_encoding" is set
+      or its name ends with ".gz" or ".zst".
+
+    Args:
+        data (Dict[str, Any]): The "data" dictionary of the file.
+
+    Returns:
+        str: The text content of the file, empty if there is none.
+    """
+    encoding = (data.get("content_encoding") or "identity").lower()
+
+    if encoding not in CONTENT_ENCODINGS:
+        raise PayloadError(f"Content encoding must be one of: {', '.join(CONTENT_ENCODINGS)}.")
+
+    if data.get("path"):
+        path = resolve_store_path(data["path"])
+
+        if not data.get("content_encoding"):
+            encoding = "gzip" if path.endswith(".gz") else "zstd" if path.endswith(".zst") else "identity"
+
+        # Compressed files are never larger than their content, so larger files are rejected before being read
+        if os.path.getsize(path) > MAX_CONTENT_BYTES:
+            raise PayloadError(f"File {data['path']} exceeds the limit of {MAX_CONTENT_BYTES} bytes")
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+    elif encoding != "identity":
+        try:
+            raw = base64.b64decode(data.get("content", ''), validate=True)
+        except (binascii.Error, ValueError):
+            raise PayloadError("Compressed content must be base64 encoded")
+    else:
+        return data.get("content", '') or ''
+
+    return decompress(raw, encoding).decode("utf-8", errors="replace")
+
+def _encoded_size(raw: bytes, encoding: str) -> Optional[int]:
+    """Get the decompressed size recorded in compressed content, i.e. the gzip trailer or the zstd frame header, if any."""
+    if encoding == "identity":
+        return len(raw)
+    if encoding == "gzip":
+        # The trailer holds the size modulo 2^32 of the last member only, so it is trusted for single-member content only
+        if raw[:2] == b"\x1f\x8b" and len(raw) >= 18:
+            return int.from_bytes(raw[-4:], "little")
+        return None
+
+    try:
+        import zstandard
+        size = zstandard.frame_content_size(raw)
+    except Exception:
+        return None
+
+    return size if size >= 0 else None
+
+def content_size(data: Optional[Dict[str, Any]]) -> int:
+    """
+    Get the size of the text content of a file in the run input, to plan the run before its content is loaded.
+    The size in the "meta" dictionary of the file is never used, as it is the size of the original file, e.g. a PDF.
+
+    Args:
+        data (Dict[str, Any], optional): The "data" dictionary of the file.
+
+    Returns:
+        int: The size of inline text in characters, else the decompressed size in bytes, read from the compressed
+        content when recorded there and decoded otherwise. 0 if the content cannot be resolved.
+    """
+    data = data or {}
+    encoding = (data.get("content_encoding") or "identity").lower()
+
+    if not data.get("path") and encoding == "identity":
+        return len(data.get("content", '') or '')
+
+    try:
+        if data.get("path"):
+            path = resolve_store_path(data["path"])
+
+            if not data.get("content_encoding"):
+                encoding = "gzip" if path.endswith(".gz") else "zstd" if path.endswith(".zst") else "identity"
+            if encoding == "identity":
+                return os.path.getsize(path)
+            if os.path.getsize(path) > MAX_CONTENT_BYTES:
+                return 0
+
+            with open(path, 'rb') as f:
+                raw = f.read()
+        else:
+            raw = base64.b64decode(data.get("content", ''), validate=True)
+
+        size = _encoded_size(raw, encoding)
+
+        return size if size is not None else len(read_content(data))
+    except (PayloadError, OSError, binascii.Error, ValueError):
+        # Reported when the document is loaded
+        return 0
+
+async def load_content(data: Optional[Dict[str, Any]]) -> str:
+    """Resolve the text content of a file in the run input, reading and decompressing it off the event loop if needed."""
+    data = data or {}
+
+    # Inline plain text needs no work, so it is never handed over to a thread
+    if not data.get("path") and (data.get("content_encoding") or "identity").lower() == "identity":
+        return data.get("content", '') or ''
+
+    return await asyncio.to_thread(read_content, data)
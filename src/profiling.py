@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from langchain_core.runnables import RunnableConfig
+from typing import Any, Callable, Dict, List, Optional
+import inspect
+import json
+import os
+import pickle
+import sys
+import tracemalloc
+
+from src.config import MEMORY_PROFILE_DIR, MEMORY_PROFILE_TOP, MEMORY_PROFILING
+from src.tracing import trace_filename
+from src.utils import get_logger, get_run_id
+
+
+logger = get_logger()
+serializer = None
+run_profiles: "OrderedDict[str, RunMemoryProfile]" = OrderedDict()
+nodes_in_flight = 0
+
+MAX_TRACKED_RUNS = 1024
+# Allocations of the profiler itself and of lazy imports are never reported
+IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def get_peak_rss() -> Optional[int]:
+    """Get the peak resident set size of the process in bytes, if the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def serialized_size(value: Any) -> int:
+    """Get the byte size of a value as written to a checkpoint, falling back to pickle for unsupported types."""
+    global serializer
+
+    if serializer is None:
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+        serializer = JsonPlusSerializer()
+
+    try:
+        return len(serializer.dumps_typed(value)[1])
+    except Exception:
+        try:
+            return len(pickle.dumps(value))
+        except Exception:
+            return sys.getsizeof(value)
+
+
+class RunMemoryProfile:
+    '''
+    This is a class for collecting the memory profile of a run: the
+    memory allocated and retained by every graph node, the allocation
+    sites that grew the most while the node ran, the serialized byte
+    size of every state channel written by the nodes, and the peak
+    resident set size of the process once the run completes, along with
+    how much the run raised it. The peak is a high-water mark over the
+    lifetime of the process, so a run that stays below the peak of an
+    earlier run or import raises it by 0.
+
+    tracemalloc traces the whole process, so while nodes of several
+    documents or runs execute concurrently, their allocations are
+    attributed to each of them. Profile a single request for exact
+    numbers per node.
+    '''
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.channels: Dict[str, Dict[str, int]] = {}
+        # Baseline of the process peak, taken on the first profiled node of the run
+        self.start_peak_rss = get_peak_rss()
+
+    def record_node(self, name: str, retained: int, peak: int, top: List[Dict[str, Any]]) -> None:
+        """Record the memory retained after a node completed, its peak traced memory and its top allocation sites."""
+        node = self.nodes.setdefault(name, {"calls": 0, "retained_bytes": 0, "peak_bytes": 0, "top_allocations": []})
+        node["calls"] += 1
+        node["retained_bytes"] += retained
+        node["peak_bytes"] = max(node["peak_bytes"], peak)
+
+        # Keep the largest allocation sites across the calls of the node
+        sites = {site["site"]: site for site in node["top_allocations"]}
+        for site in top:
+            if site["site"] not in sites or site["size_bytes"] > sites[site["site"]]["size_bytes"]:
+                sites[site["site"]] = site
+        node["top_allocations"] = sorted(sites.values(), key=lambda site: site["size_bytes"], reverse=True)[:MEMORY_PROFILE_TOP]
+
+    def record_update(self, update: Any) -> None:
+        """Record the serialized byte size of every state channel written by a node."""
+        if not isinstance(update, dict):
+            return
+
+        for channel, value in update.items():
+            size = serialized_size(value)
+            stats = self.channels.setdefault(channel, {"writes": 0, "total_bytes": 0, "max_bytes": 0})
+            stats["writes"] += 1
+            stats["total_bytes"] += size
+            stats["max_bytes"] = max(stats["max_bytes"], size)
+
+    def report(self) -> Dict[str, Any]:
+        """Get the memory profile of the run, with stable keys, so that the profiles of two runs can be diffed."""
+        peak_rss = get_peak_rss()
+
+        return {
+            "run_id": self.run_id,
+            "process_peak_rss_bytes": peak_rss,
+            "peak_rss_growth_bytes": peak_rss - self.start_peak_rss if peak_rss is not None and self.start_peak_rss is not None else None,
+            "traced_peak_bytes": tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+            "nodes": dict(sorted(self.nodes.items())),
+            "channels": dict(sorted(self.channels.items())),
+        }
+
+
+def get_run_profile(run_id: str) -> RunMemoryProfile:
+    """Get the memory profile of a run, creating it on its first profiled node."""
+    profile = run_profiles.get(run_id)
+
+    if profile is None:
+        profile = run_profiles[run_id] = RunMemoryProfile(run_id)
+
+        # Profiles of runs that failed before reporting are eventually dropped
+        while len(run_profiles) > MAX_TRACKED_RUNS:
+            run_profiles.popitem(last=False)
+
+    return profile
+
+def top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = MEMORY_PROFILE_TOP) -> List[Dict[str, Any]]:
+    """Get the allocation sites that grew the most between two snapshots."""
+    stats = after.filter_traces(IGNORED_TRACES).compare_to(before.filter_traces(IGNORED_TRACES), "lineno")
+
+    return [
+        {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size_bytes": stat.size_diff, "count": stat.count_diff}
+        for stat in stats[:limit]
+        if stat.size_diff > 0
+    ]
+
+def profile_memory(name: str, node: Callable) -> Callable:
+    """
+    Wrap a graph node, so that a tracemalloc snapshot is taken before and after it runs and its memory
+    profile is recorded for its run. Returns the node unchanged unless MEMORY_PROFILING is enabled.
+
+    Args:
+        name (str): The name of the node in the graph.
+        node (Callable): The asynchronous node function.
+
+    Returns:
+        Callable: The wrapped node function, accepting the run configuration.
+    """
+    if not MEMORY_PROFILING:
+        return node
+
+    accepts_config = "config" in inspect.signature(node).parameters
+
+    async def wrapper(state: Dict[str, Any], config: RunnableConfig) -> Any:
+        global nodes_in_flight
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        # The peak is process-wide, so it is only reset while no other node is being profiled
+        if not nodes_in_flight:
+            tracemalloc.reset_peak()
+
+        nodes_in_flight += 1
+        before = tracemalloc.take_snapshot()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+
+        try:
+            update = await node(state, config) if accepts_config else await node(state)
+        finally:
+            nodes_in_flight -= 1
+
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+
+        profile = get_run_profile(get_run_id(config))
+        profile.record_node(name, current_bytes - start_bytes, max(0, peak_bytes - start_bytes), top_allocations(before, after))
+        profile.record_update(update)
+
+        return update
+
+    wrapper.__name__ = node.__name__
+    wrapper.__qualname__ = node.__qualname__
+    wrapper.__doc__ = node.__doc__
+
+    return wrapper
+
+def close_memory_profile(run_id: str, store: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Stop profiling a run and get its memory profile, also stored as JSON in MEMORY_PROFILE_DIR if set.
+
+    Args:
+        run_id (str): The ID of the run.
+        store (bool): Whether to store the profile in MEMORY_PROFILE_DIR, which an aborted run does not.
+
+    Returns:
+        Optional[Dict[str, Any]]: The memory profile of the run, or None if memory profiling is disabled.
+    """
+    profile = run_profiles.pop(run_id, None)
+
+    if not MEMORY_PROFILING:
+        return None
+
+    report = (profile or RunMemoryProfile(run_id)).report()
+
+    if MEMORY_PROFILE_DIR and store:
+        try:
+            os.makedirs(MEMORY_PROFILE_DIR, exist_ok=True)
+
+            # Run IDs may come from the client, e.g. its thread ID, so they are made safe file names as those of the traces
+            with open(os.path.join(MEMORY_PROFILE_DIR, trace_filename(run_id)), 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"⚠ WARNING: Could not store memory profile of run {run_id}: {str(e)}")
+
+    return report
@@ -1,4 +1,5 @@
-from langchain.prompts import ChatPromptTemplate
+from src.config import CLUSTERING_ENABLED
+
 
 system_prompt = """
 You are a document and literature analysis assistant specialized in identifying important
@@ -27,7 +28,7 @@ reduce_template = """
 The following is a set of partial summaries generated from chunks of text from the same document,
 and contain the most important information of said chunks. Your task is to take these summaries,
 abalyze them and distill them into a final, consolidated summary of the main themes of the document.
-
+{clusters}
 ### Input:
 {docs}
 
@@ -36,18 +37,44 @@ Please provide a concise summary of the input above, focusing on the most releva
 Your summary should be clear and easy to understand, highlighting key points and important details.
 Your summary should have the form of a single paragraph, with no more than 250 words.
 """
+# Only clustered chunks are summarized as "[N similar sections]", so only then are the summaries told how to weigh them
+reduce_template = reduce_template.replace("{clusters}", """A summary starting with "[N similar sections]" stands for N near-duplicate sections of the document,
+so weigh it by the share of the document it covers.
+""" if CLUSTERING_ENABLED else '')
+
+
+map_prompt = None
+reduce_prompt = None
+
+
+def get_map_prompt():
+    """Get the prompt template of the map step, building it on first use."""
+    global map_prompt
+
+    if not map_prompt:
+        from langchain_core.prompts import ChatPromptTemplate
+
+        map_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", system_prompt),
+                ("human", map_template)
+            ]
+        )
+
+    return map_prompt
+
+def get_reduce_prompt():
+    """Get the prompt template of the reduce step, building it on first use."""
+    global reduce_prompt
 
+    if not reduce_prompt:
+        from langchain_core.prompts import ChatPromptTemplate
 
-map_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", system_prompt),
-        ("human", map_template)
-    ]
-)
+        reduce_prompt = ChatPromptTemplate(
+            [
+                ("system", system_prompt),
+                ("human", reduce_template)
+            ]
+        )
 
-reduce_prompt = ChatPromptTemplate(
-    [
-        ("system", system_prompt),
-        ("human", reduce_template)
-    ]
-)
\ No newline at end of file
+    return reduce_prompt
\ No newline at end of file
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.config import OUTPUT_MODE
+from src.oifile import OIFile
+from src.scheduler import estimate_tokens
+
+
+run_output_modes: "OrderedDict[str, str]" = OrderedDict()
+
+OUTPUT_MODES = ("lean", "stats", "full")
+MAX_TRACKED_RUNS = 1024
+
+
+def open_output_mode(run_id: str, mode: Optional[str] = None) -> str:
+    """
+    Set the shape of the documents of the output of a run.
+
+    Args:
+        run_id (str): The ID of the run.
+        mode (str, optional): The output mode of the run, one of "lean", "stats" or "full". Defaults to the configured one.
+
+    Returns:
+        str: The output mode of the run.
+    """
+    mode = (mode or OUTPUT_MODE).lower()
+
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Output mode must be one of: {', '.join(OUTPUT_MODES)}.")
+
+    run_output_modes[run_id] = mode
+
+    # Modes of runs that failed before reporting are eventually dropped
+    while len(run_output_modes) > MAX_TRACKED_RUNS:
+        run_output_modes.popitem(last=False)
+
+    return mode
+
+def get_output_mode(run_id: str) -> str:
+    """Get the output mode of a run, falling back to the configured one."""
+    return run_output_modes.get(run_id, OUTPUT_MODE)
+
+def close_output_mode(run_id: str) -> str:
+    """Stop tracking the output mode of a run, returning it."""
+    return run_output_modes.pop(run_id, OUTPUT_MODE)
+
+def document_result(
+    doc: OIFile,
+    mode: str,
+    chunks: Optional[int] = None,
+    llm_calls: Optional[Dict[str, int]] = None,
+    duration_s: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Get the result of a summarized document in the shape of an output mode.
+
+    Args:
+        doc (OIFile): The summarized document.
+        mode (str): The output mode, one of "lean", "stats" or "full".
+        chunks (int, optional): The number of chunks the document was split into, if known.
+        llm_calls (Dict[str, int], optional): The number of LLM calls made and saved for the document, if known.
+        duration_s (float, optional): The duration of the summarization of the document in seconds, if known.
+
+    Returns:
+        Dict[str, Any]: The ID, name, type and summary of the document, along with its content
+            in the "full" mode, or the statistics of its summarization in the "stats" mode.
+    """
+    if mode == "full":
+        return doc.to_dict()
+
+    result = doc.to_dict(include_content=False)
+
+    if mode == "stats":
+        stats = {
+            "chunks": chunks,
+            "content_tokens": estimate_tokens(doc.get_content()),
+            "summary_tokens": estimate_tokens(doc.get_summary() or ''),
+            "llm_calls": llm_calls,
+            "duration_s": duration_s,
+        }
+        result["stats"] = {key: value for key, value in stats.items() if value is not None}
+
+    return result
@@ -0,0 +1,442 @@
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+
+from src.config import FAIR_SHARING_ENABLED, MAP_WINDOW_SIZE, SCHEDULING_POLICY, SCHEDULING_STARVATION_S, TENANT_WEIGHTS
+from src.utils import get_logger
+
+
+logger = get_logger()
+chunk_scheduler = None
+run_tenants: "OrderedDict[str, str]" = OrderedDict()
+run_queue_waits: "OrderedDict[str, List[float]]" = OrderedDict()
+
+SCHEDULING_POLICIES = ("fifo", "sjf")
+MAX_TRACKED_RUNS = 1024
+# Queue waits of the most recent tasks kept per tenant, for the statistics of the scheduler
+QUEUE_WAIT_SAMPLES = 1024
+DEFAULT_TENANT = "default"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate the number of tokens of a text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def parse_tenant_weights(value: str) -> Dict[str, float]:
+    """Parse the weights of the tenants, e.g. "interactive=4,bulk=1", into a dictionary."""
+    weights = {}
+
+    for item in filter(None, (item.strip() for item in value.split(","))):
+        tenant, _, weight = item.partition("=")
+
+        try:
+            weights[tenant.strip()] = float(weight)
+        except ValueError:
+            raise ValueError(f"Wrong tenant weight: {item}")
+
+        if weights[tenant.strip()] <= 0:
+            raise ValueError(f"Tenant weight must be positive: {item}")
+
+    return weights
+
+def summarize_waits(waits: Sequence[float]) -> Dict[str, float]:
+    """Get the number, mean, median, 95th percentile and maximum of queue waits in seconds."""
+    waits = sorted(waits)
+    count = len(waits)
+
+    return {
+        "waits": count,
+        "mean_s": round(sum(waits) / count, 4),
+        "p50_s": round(waits[(count - 1) // 2], 4),
+        "p95_s": round(waits[min(count - 1, int(count * 0.95))], 4),
+        "max_s": round(waits[-1], 4),
+    }
+
+def _run_id_of(key: Hashable) -> Hashable:
+    """Get the run a scheduler key, i.e. a (run ID, document ID) tuple, belongs to."""
+    return key[0] if isinstance(key, tuple) and key else key
+
+
+class ChunkScheduler:
+    '''
+    This is a class for scheduling the LLM work of the agent, i.e.
+    the chunk summaries of the map step and the collapse and final
+    summaries of the reduce step, within a bounded window. At most
+    `window` tasks are in flight at any time, across all documents
+    and runs served by the process, and every further chunk task is
+    only pulled from its document when a running one completes, so
+    memory is bounded by the window size and not by the input size.
+
+    Tasks waiting for a slot are queued per document, and the policy
+    decides which document gets the next free slot:
+    - "fifo": the document whose oldest task has waited the longest.
+    - "sjf": the document with the least remaining estimated tokens,
+      so that small documents finish first. Documents whose oldest
+      task has waited longer than `starvation_s` seconds are served
+      first, in FIFO order, so large documents never wait forever.
+
+    With fair sharing, the policy only chooses among the documents of
+    the flow whose turn it is, so that a large batch cannot hold the
+    window against the small runs of other users. Flows are the
+    tenants of the runs, given in their input, and the runs without a
+    tenant, and free slots are shared among the flows with waiting
+    tasks in proportion to their weights by start-time fair queuing,
+    then among the runs of the chosen tenant equally.
+    '''
+    def __init__(
+        self,
+        window: int = MAP_WINDOW_SIZE,
+        policy: str = SCHEDULING_POLICY,
+        starvation_s: float = SCHEDULING_STARVATION_S,
+        fair_sharing: bool = FAIR_SHARING_ENABLED,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        if window <= 0:
+            raise ValueError("Scheduler window must be a positive integer.")
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Scheduling policy must be one of: {', '.join(SCHEDULING_POLICIES)}.")
+
+        self.window = window
+        self.policy = policy
+        self.starvation_s = starvation_s
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self._waiters: Dict[Hashable, Deque[Tuple[float, asyncio.Future]]] = {}
+        self._waiting = 0
+        self._remaining: Dict[Hashable, int] = {}
+        self.fair_sharing = fair_sharing
+        self.weights = parse_tenant_weights(TENANT_WEIGHTS) if weights is None else weights
+        # Virtual finish time of the last slot granted to every flow, and virtual time of every level of flows
+        self._finish: Dict[Hashable, Tuple[Hashable, float]] = {}
+        self._clocks: Dict[Hashable, float] = {}
+        self._tenant_waits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of in-flight, queued and completed tasks."""
+        return {
+            "window": self.window,
+            "policy": self.policy,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "documents": len(self._remaining),
+            "tenants": {tenant: summarize_waits(waits) for tenant, waits in self._tenant_waits.items()},
+        }
+
+    def _add_remaining(self, key: Hashable, tokens: int) -> None:
+        """Update the remaining estimated tokens of a document."""
+        remaining = self._remaining.get(key, 0) + tokens
+
+        if remaining > 0:
+            self._remaining[key] = remaining
+        else:
+            self._remaining.pop(key, None)
+
+    def _flows(self, key: Hashable) -> List[Tuple[Hashable, Hashable, float]]:
+        """Get the parent, the flow and the weight of every level of flows a document belongs to, i.e. its tenant, if any, and its run."""
+        run_id = _run_id_of(key)
+        tenant = run_tenants.get(run_id)
+
+        if tenant is None:
+            return [(None, ("run", run_id), 1.0)]
+
+        return [(None, ("tenant", tenant), self.weights.get(tenant, 1.0)), (("tenant", tenant), ("run", run_id), 1.0)]
+
+    def _start_tag(self, parent: Hashable, flow: Hashable) -> float:
+        """Get the virtual start time of the next slot of a flow, which idle flows cannot bank credit for."""
+        return max(self._finish.get(flow, (parent, 0.0))[1], self._clocks.get(parent, 0.0))
+
+    def _charge(self, key: Hashable) -> None:
+        """Charge a granted slot to the flows of a document, advancing their virtual finish times by the inverse of their weights."""
+        for parent, flow, weight in self._flows(key):
+            start = self._start_tag(parent, flow)
+            self._finish[flow] = (parent, start + 1 / weight)
+            self._clocks[parent] = start
+
+        # Flows that fell behind the virtual time start from it anyway, so they are dropped along with their levels
+        for flow in [flow for flow, (parent, finish) in self._finish.items() if finish <= self._clocks.get(parent, 0.0)]:
+            del self._finish[flow]
+        for flow in [flow for flow, (parent, _) in self._finish.items() if parent is not None and parent not in self._finish]:
+            del self._finish[flow]
+        for parent in [parent for parent in self._clocks if parent is not None and parent not in self._finish]:
+            del self._clocks[parent]
+
+    def _fair_heads(self, heads: List[Tuple[float, Hashable]]) -> List[Tuple[float, Hashable]]:
+        """Narrow the oldest waiting tasks of the documents down to those of the flow whose turn it is, level by level."""
+        for level in range(2):
+            groups: Dict[Tuple[Hashable, Hashable, float], List[Tuple[float, Hashable]]] = {}
+
+            for head in heads:
+                flows = self._flows(head[1])
+
+                if len(flows) <= level:
+                    return heads
+
+                groups.setdefault(flows[level], []).append(head)
+
+            heads = min(groups.items(), key=lambda group: (self._start_tag(*group[0][:2]), min(head[0] for head in group[1])))[1]
+
+        return heads
+
+    def _next_key(self) -> Optional[Hashable]:
+        """Select the document whose waiting task gets the next free slot, according to the fair sharing and the policy."""
+        heads = [(queue[0][0], key) for key, queue in self._waiters.items() if queue]
+
+        if not heads:
+            return None
+
+        if self.policy == "sjf":
+            now = time.monotonic()
+            starving = [head for head in heads if now - head[0] >= self.starvation_s]
+
+            if starving:
+                return min(starving, key=lambda head: head[0])[1]
+
+        if self.fair_sharing and len(heads) > 1:
+            heads = self._fair_heads(heads)
+
+        if self.policy == "sjf":
+            return min(heads, key=lambda head: (self._remaining.get(head[1], 0), head[0]))[1]
+
+        return min(heads, key=lambda head: head[0])[1]
+
+    def _record_wait(self, key: Hashable, seconds: float) -> None:
+        """Record the time a task of a document waited for a slot, for its run and its tenant."""
+        run_id = _run_id_of(key)
+        tenant = run_tenants.get(run_id, DEFAULT_TENANT)
+
+        if run_id in run_queue_waits:
+            run_queue_waits[run_id].append(seconds)
+
+        if tenant not in self._tenant_waits:
+            self._tenant_waits[tenant] = collections.deque(maxlen=QUEUE_WAIT_SAMPLES)
+
+            while len(self._tenant_waits) > MAX_TRACKED_RUNS:
+                self._tenant_waits.popitem(last=False)
+
+        self._tenant_waits[tenant].append(seconds)
+
+    async def acquire(self, key: Hashable = None) -> None:
+        """Wait for a free slot of the window and occupy it on behalf of a document."""
+        if self.in_flight < self.window and not self._waiting:
+            self.in_flight += 1
+
+            if self.fair_sharing:
+                self._charge(key)
+
+            self._record_wait(key, 0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._waiters.setdefault(key, collections.deque())
+        entry = (time.monotonic(), waiter)
+        queue.append(entry)
+        self._waiting += 1
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation, so pass it on
+                self.release()
+            elif entry in queue:
+                # Unless a release already dropped the cancelled waiter, e.g. when a whole run is cancelled at once
+                queue.remove(entry)
+                self._waiting -= 1
+                if not queue and self._waiters.get(key) is queue:
+                    self._waiters.pop(key, None)
+            raise
+
+        self._record_wait(key, time.monotonic() - entry[0])
+
+    def release(self) -> None:
+        """Free a slot of the window and hand it over to the next waiting task, if any."""
+        while self._waiting:
+            key = self._next_key()
+            queue = self._waiters[key]
+            _, waiter = queue.popleft()
+            self._waiting -= 1
+
+            if not queue:
+                self._waiters.pop(key, None)
+
+            if not waiter.done():
+                # The slot is handed over directly, so the in-flight count is unchanged
+                waiter.set_result(None)
+
+                if self.fair_sharing:
+                    self._charge(key)
+                return
+
+        self.in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: Hashable = None, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Occupy a slot of the window for a single task of a document, e.g. a collapse or final summary.
+
+        Args:
+            key (Hashable): Key of the document the task belongs to.
+            tokens (int): Estimated tokens of the task, counted as remaining work of the document while it waits.
+        """
+        self._add_remaining(key, tokens)
+        self.queued += 1
+
+        try:
+            await self.acquire(key)
+        except BaseException:
+            self.queued -= 1
+            self._add_remaining(key, -tokens)
+            raise
+
+        self.queued -= 1
+
+        try:
+            yield
+            self.completed += 1
+        finally:
+            self.release()
+            self._add_remaining(key, -tokens)
+
+    async def map(
+        self,
+        func: Callable[[Any], Awaitable[Any]],
+        items: Sequence[Any],
+        key: Hashable = None,
+        costs: Optional[Sequence[int]] = None,
+        label: str = '',
+    ) -> List[Any]:
+        """
+        Apply an asynchronous function to every item within the window, preserving the order of the items.
+
+        Args:
+            func (Callable[[Any], Awaitable[Any]]): The asynchronous function to apply to every item.
+            items (Sequence[Any]): The items to apply the function to, e.g. the chunks of a document.
+            key (Hashable): Key of the document the items belong to, used by the scheduling policy.
+            costs (Sequence[int], optional): Estimated tokens of every item. Defaults to an estimate of the item text.
+            label (str): Label of the items used in log messages, e.g. the document ID.
+
+        Returns:
+            List[Any]: The results of the function, in the order of the items.
+        """
+        if costs is None:
+            costs = [estimate_tokens(item) if isinstance(item, str) else 1 for item in items]
+
+        results = [None] * len(items)
+        pending = iter(range(len(items)))
+        unclaimed = [len(items)]
+        failure: List[Optional[BaseException]] = [None]
+
+        self.queued += len(items)
+        self._add_remaining(key, sum(costs))
+
+        async def _worker() -> None:
+            # An item is claimed before waiting for a slot, so that no slot is waited for once every item is claimed
+            while failure[0] is None and unclaimed[0]:
+                unclaimed[0] -= 1
+                await self.acquire(key)
+
+                try:
+                    # Pull the next item only once a slot of the window is free
+                    idx = next(pending, None)
+
+                    if idx is None or failure[0] is not None:
+                        return
+
+                    self.queued -= 1
+
+                    try:
+                        results[idx] = await func(items[idx])
+                    except Exception as e:
+                        failure[0] = e
+                        return
+                    finally:
+                        self._add_remaining(key, -costs[idx])
+
+                    self.completed += 1
+                finally:
+                    self.release()
+
+        workers = [asyncio.create_task(_worker()) for _ in range(min(self.window, len(items)))]
+
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            # Items never pulled, e.g. after a failure or a cancellation, are no longer queued
+            for idx in pending:
+                self.queued -= 1
+                self._add_remaining(key, -costs[idx])
+
+        if failure[0] is not None:
+            raise failure[0]
+
+        # Logged for every document, so only format the statistics if they are logged
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"✓ Scheduled {len(items)} task(s) {label}: {self.stats()}")
+
+        return results
+
+
+def get_chunk_scheduler() -> ChunkScheduler:
+    """Get the chunk scheduler of the running event loop."""
+    global chunk_scheduler
+
+    loop = asyncio.get_running_loop()
+
+    # Futures are bound to an event loop, so a new loop gets a fresh scheduler
+    if not chunk_scheduler or chunk_scheduler._loop is not loop:
+        chunk_scheduler = ChunkScheduler()
+        chunk_scheduler._loop = loop
+
+    return chunk_scheduler
+
+def open_flow(run_id: str, tenant: Optional[str] = None) -> None:
+    """
+    Start sharing the window of the scheduler with a run, as a flow of its own or of its tenant, and tracking its queue waits.
+
+    Args:
+        run_id (str): The ID of the run.
+        tenant (str, optional): The tenant of the run, e.g. a user or an application, whose runs share its weight.
+    """
+    if tenant:
+        run_tenants[run_id] = str(tenant)
+
+    run_queue_waits[run_id] = []
+
+    # Flows of runs that failed before reporting are eventually dropped
+    while len(run_tenants) > MAX_TRACKED_RUNS:
+        run_tenants.popitem(last=False)
+    while len(run_queue_waits) > MAX_TRACKED_RUNS:
+        run_queue_waits.popitem(last=False)
+
+def get_tenant(run_id: str) -> str:
+    """Get the tenant of a run, or the default tenant if the run has none."""
+    return run_tenants.get(run_id, DEFAULT_TENANT)
+
+def close_flow(run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Stop tracking the queue waits of a run and summarize them.
+
+    Args:
+        run_id (str): The ID of the run.
+
+    Returns:
+        Optional[Dict[str, Any]]: The tenant of the run and the number, mean, median, 95th percentile and
+            maximum of the waits of its tasks for a slot of the window, or None if no task of the run waited.
+    """
+    tenant = run_tenants.pop(run_id, None)
+    waits = run_queue_waits.pop(run_id, None)
+
+    if not waits:
+        return None
+
+    return {"tenant": tenant or DEFAULT_TENANT, **summarize_waits(waits)}
@@ -0,0 +1,130 @@
+from langchain_core.documents import Document
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Send
+from typing import Any, Optional, Tuple
+import ormsgpack
+import zlib
+
+from src.oifile import OIFile
+
+
+SERIALIZATION_TYPE = "state-msgpack"
+COMPRESSED_SERIALIZATION_TYPE = "state-msgpack-zlib"
+# Values holding document contents are large and compress well, the fastest zlib level keeps them cheap to write
+COMPRESSION_MIN_BYTES = 4096
+COMPRESSION_LEVEL = 1
+# Type tags of the extension types, clear of those of the default serializer (0-6)
+EXT_OIFILE = 32
+EXT_DOCUMENT = 33
+EXT_TUPLE = 34
+EXT_SEND = 35
+
+PACK_OPTIONS = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_ENUM
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+    | ormsgpack.OPT_PASSTHROUGH_TUPLE
+)
+
+# Values of other types are packed and unpacked by the default serializer, through its public interface
+default_serializer = JsonPlusSerializer()
+checkpointer = None
+
+
+def _pack(value: Any) -> bytes:
+    return ormsgpack.packb(value, default=_default, option=PACK_OPTIONS)
+
+def _unpack(data: bytes) -> Any:
+    return ormsgpack.unpackb(data, ext_hook=_ext_hook, option=ormsgpack.OPT_NON_STR_KEYS)
+
+def _default(obj: Any) -> ormsgpack.Ext:
+    # Documents and their partial summaries are packed as bare field arrays, without class paths or field names
+    if isinstance(obj, OIFile):
+        return ormsgpack.Ext(EXT_OIFILE, _pack([obj.id, obj.name, obj.type, obj.content, obj.summary]))
+    if isinstance(obj, Document):
+        return ormsgpack.Ext(EXT_DOCUMENT, _pack([obj.page_content, obj.metadata or None, obj.id]))
+    if isinstance(obj, tuple):
+        return ormsgpack.Ext(EXT_TUPLE, _pack(list(obj)))
+    # The default serializer would pack the documents sent to the nodes of the graph without the extension types
+    if isinstance(obj, Send):
+        return ormsgpack.Ext(EXT_SEND, _pack([obj.node, obj.arg]))
+
+    # Its msgpack extension types are embedded as they are, so that checkpoints stay readable by it
+    type_, data = default_serializer.dumps_typed(obj)
+
+    if type_ != "msgpack":
+        raise TypeError(f"Type is not msgpack serializable: {type(obj).__name__}")
+
+    return ormsgpack.unpackb(data, ext_hook=ormsgpack.Ext, option=ormsgpack.OPT_NON_STR_KEYS)
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_OIFILE:
+        return OIFile.from_dict(dict(zip(("id", "name", "type", "content", "summary"), _unpack(data))))
+    if code == EXT_DOCUMENT:
+        page_content, metadata, id = _unpack(data)
+        return Document(page_content, metadata=metadata or {}, id=id)
+    if code == EXT_TUPLE:
+        return tuple(_unpack(data))
+    if code == EXT_SEND:
+        return Send(*_unpack(data))
+
+    return default_serializer.loads_typed(("msgpack", ormsgpack.packb(ormsgpack.Ext(code, data))))
+
+
+class StateSerializer(JsonPlusSerializer):
+    '''
+    This is a class for serializing the graph state to checkpoints as
+    compact msgpack with type tags. OIFile and Document objects are
+    packed as arrays of their fields, and tuples (e.g. the chunks of a
+    document) are kept as tuples instead of turning into lists, also
+    within the Send packets of the graph. Every other type is packed
+    as the default serializer would pack it, and values it cannot pack
+    at all, as well as checkpoints written by the default serializer,
+    are left to the default serializer. Large values, e.g. those
+    holding the contents of documents, are compressed, trading
+    serialization time for checkpoint size, unless disabled.
+    '''
+    def __init__(self, *, compression_min_bytes: Optional[int] = COMPRESSION_MIN_BYTES, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.compression_min_bytes = compression_min_bytes
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if obj is None or isinstance(obj, (bytes, bytearray)):
+            return super().dumps_typed(obj)
+
+        try:
+            packed = _pack(obj)
+        except (ormsgpack.MsgpackEncodeError, TypeError):
+            return super().dumps_typed(obj)
+
+        if self.compression_min_bytes is not None and len(packed) >= self.compression_min_bytes:
+            return COMPRESSED_SERIALIZATION_TYPE, zlib.compress(packed, COMPRESSION_LEVEL)
+
+        return SERIALIZATION_TYPE, packed
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        if data[0] == SERIALIZATION_TYPE:
+            return _unpack(data[1])
+        if data[0] == COMPRESSED_SERIALIZATION_TYPE:
+            return _unpack(zlib.decompress(data[1]))
+
+        return super().loads_typed(data)
+
+
+def get_checkpointer():
+    """
+    Get the in-memory checkpointer of graphs run in-process, i.e. by the batch runner, the job queue and the directory
+    watcher, which writes checkpoints with the state serializer. Every run gets its own thread, deleted once it completes.
+    The LangGraph server persists threads with its own checkpointer, which graphs served by it must not override.
+    """
+    global checkpointer
+
+    if not checkpointer:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        checkpointer = InMemorySaver(serde=StateSerializer(pickle_fallback=True))
+
+    return checkpointer
+
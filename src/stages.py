@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import contextlib
+import time
+
+from src.config import LLM_STAGES, STAGE_MODELS
+from src.tracing import trace_span
+from src.utils import get_logger
+
+
+logger = get_logger()
+stage_limiter = None
+run_latencies: "OrderedDict[str, Dict[str, List[float]]]" = OrderedDict()
+
+MAX_TRACKED_RUNS = 1024
+
+
+class StageLimiter:
+    '''
+    This is a class for limiting the concurrent LLM calls of every
+    stage of the agent ("map", "collapse" and "reduce") independently,
+    e.g. to respect the rate limit of a smaller deployment serving the
+    map stage without slowing down the reduce stage. Stages with a
+    concurrency of 0 are only limited by the window of the scheduler.
+    '''
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None):
+        if concurrency is None:
+            concurrency = {stage: STAGE_MODELS[stage]["concurrency"] for stage in LLM_STAGES}
+
+        self.semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in concurrency.items() if limit > 0}
+        self._loop = None
+
+    @contextlib.asynccontextmanager
+    async def call(self, stage: str, run_id: str, **attributes: Any) -> AsyncIterator[None]:
+        """
+        Make an LLM call of a stage within its concurrency limit, recording its latency for the run and tracing it.
+
+        Args:
+            stage (str): The stage of the call, one of "map", "collapse" or "reduce".
+            run_id (str): The ID of the run making the call.
+            **attributes: The attributes of the span of the call, e.g. the document ID and the chunk index.
+        """
+        semaphore = self.semaphores.get(stage)
+
+        async with semaphore if semaphore else contextlib.nullcontext():
+            start = time.perf_counter()
+
+            try:
+                with trace_span(run_id, f"llm.{stage}", "llm", stage=stage, model=STAGE_MODELS[stage]["deployment"] or STAGE_MODELS[stage]["model"], **attributes):
+                    yield
+            finally:
+                record_latency(run_id, stage, time.perf_counter() - start)
+
+
+def get_stage_limiter() -> StageLimiter:
+    """Get the stage limiter of the running event loop."""
+    global stage_limiter
+
+    loop = asyncio.get_running_loop()
+
+    # Semaphores are bound to an event loop, so a new loop gets a fresh limiter
+    if not stage_limiter or stage_limiter._loop is not loop:
+        stage_limiter = StageLimiter()
+        stage_limiter._loop = loop
+
+    return stage_limiter
+
+def stage_call(stage: str, run_id: str, **attributes: Any):
+    """Make an LLM call of a stage within its concurrency limit, recording its latency for the run and tracing it."""
+    return get_stage_limiter().call(stage, run_id, **attributes)
+
+def record_latency(run_id: str, stage: str, seconds: float) -> None:
+    """Record the latency of an LLM call of a stage made by a run."""
+    run_latencies.setdefault(run_id, {}).setdefault(stage, []).append(seconds)
+
+    # Latencies of runs that failed before reporting are eventually dropped
+    while len(run_latencies) > MAX_TRACKED_RUNS:
+        run_latencies.popitem(last=False)
+
+def close_stage_latencies(run_id: str) -> Dict[str, Dict[str, float]]:
+    """
+    Stop tracking the LLM calls of a run and summarize their latencies per stage.
+
+    Args:
+        run_id (str): The ID of the run.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The number of calls and the mean, median, 95th percentile and
+            maximum latency in seconds of every stage that made LLM calls, along with its model.
+    """
+    report = {}
+
+    for stage, latencies in run_latencies.pop(run_id, {}).items():
+        latencies = sorted(latencies)
+        count = len(latencies)
+
+        report[stage] = {
+            "model": STAGE_MODELS[stage]["deployment"] or STAGE_MODELS[stage]["model"],
+            "calls": count,
+            "mean_s": round(sum(latencies) / count, 4),
+            "p50_s": round(latencies[(count - 1) // 2], 4),
+            "p95_s": round(latencies[min(count - 1, int(count * 0.95))], 4),
+            "max_s": round(latencies[-1], 4),
+        }
+
+    return report
@@ -1,25 +1,96 @@
 from langchain_core.documents import Document
-from typing import Annotated, Any, Dict, List, Tuple, TypedDict
-import operator
+from langgraph.channels.binop import BinaryOperatorAggregate
+from typing import Annotated, Any, Callable, Dict, List, Optional, Sequence, Tuple, TypedDict
 
 from src.oifile import OIFile
 
 
+class StepAggregate(BinaryOperatorAggregate):
+    '''
+    This is a class for a state channel that reduces all the writes of
+    a step at once, with a reducer that takes the current value and the
+    list of the writes, instead of folding a binary operator over them.
+    Fanned-out nodes, e.g. one per document of a run, write to the same
+    channel in the same step, and folding operator.add or operator.or_
+    over n writes copies the growing value n times, i.e. O(n^2), while
+    a step reducer copies the current value once and then merges every
+    write into the copy in place, i.e. amortized O(1) per write item.
+    The value of the previous step is never mutated, since it may still
+    be referenced by a checkpoint or a streamed snapshot of the state.
+    '''
+    def __init__(self, typ: type, reducer: Callable[[Any, Sequence[Any]], Any]):
+        super().__init__(typ, reducer)
+
+    def update(self, values: Sequence[Any]) -> bool:
+        if not values:
+            return False
+
+        self.value = self.operator(self.value, values)
+        return True
+
+def add_documents(left: List[OIFile], updates: Sequence[Optional[List[OIFile]]]) -> List[OIFile]:
+    """Append the loaded documents of a step to the state, or drop all of them once the run no longer needs them (None)."""
+    documents = list(left)
+
+    for right in updates:
+        if right is None:
+            documents = []
+        else:
+            documents.extend(right)
+
+    return documents
+
+def merge_dicts(left: Dict[str, Any], updates: Sequence[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Merge the per-document entries written in a step into the state, later writes taking precedence."""
+    merged = dict(left)
+
+    for right in updates:
+        if right:
+            merged.update(right)
+
+    return merged
+
+
 class InputState(TypedDict):
-    """State for the input node that contains the files to be processed."""
+    """
+    State for the input node that contains the files to be processed, an optional budget ("max_tokens", "deadline_s") of the run,
+    an optional tenant, e.g. a user or an application, whose runs share the LLM capacity with those of other tenants by weight,
+    and an optional output mode ("lean", "stats", "full") overriding the configured shape of the documents of the output.
+    The "data" of every file holds its text "content", its base64 compressed content with a "content_encoding" ("gzip", "zstd"),
+    or the "path" of a file in the file store.
+    """
     files: List[Dict[str, str]]
+    budget: Dict[str, float]
+    tenant: str
+    output_mode: str
 
 class OverallState(TypedDict):
     """State for the overall process, including all documents and their summaries."""
-    documents: Annotated[List[OIFile], operator.add]
-    document_chunks: Annotated[Dict[str, Tuple[str]], operator.or_]
-    document_ids: Annotated[List[str], operator.add]
-    partial_summaries: Annotated[List[str], operator.add]
-    document_partial_summaries: Annotated[Dict[str, List[Document]], operator.or_]
+    documents: Annotated[List[OIFile], StepAggregate(list, add_documents)]
+    coalesced_documents: Annotated[Dict[str, str], StepAggregate(dict, merge_dicts)]
 
 class OutputState(TypedDict):
-    """State for the output node that contains the final documents, including their summaries."""
-    result: Annotated[Dict[str, str], operator.or_]
+    """State for the output node that contains the final documents, including their summaries, in the shape of the output mode of the run."""
+    result: Annotated[Dict[str, str], StepAggregate(dict, merge_dicts)]
+    llm_calls: Annotated[Dict[str, Dict[str, int]], StepAggregate(dict, merge_dicts)]
+    document_timings: Annotated[Dict[str, Dict[str, float]], StepAggregate(dict, merge_dicts)]
+    budget: Dict[str, Any]
+    stage_latency: Dict[str, Dict[str, Any]]
+    queue_wait: Dict[str, Any]
+    memory_profile: Dict[str, Any]
+    trace: Dict[str, Any]
+    clustering: Annotated[Dict[str, Dict[str, Any]], StepAggregate(dict, merge_dicts)]
+
+class DocumentState(TypedDict):
+    """State for the pipeline of a single document, from its chunks to its partial summaries and its final summary."""
+    document: OIFile
+    document_id: str
+    chunks: Tuple[str]
+    chunk_weights: List[int]
+    summaries: List[Document]
+    result: Annotated[Dict[str, str], StepAggregate(dict, merge_dicts)]
+    llm_calls: Annotated[Dict[str, Dict[str, int]], StepAggregate(dict, merge_dicts)]
+    clustering: Annotated[Dict[str, Dict[str, Any]], StepAggregate(dict, merge_dicts)]
 
 
 class LoadState(TypedDict):
@@ -30,10 +101,20 @@ class SplitState(TypedDict):
     """State for the split node that contains an IOFile object whose content will be split into chunks."""
     document: OIFile
 
+class CoalesceState(TypedDict):
+    """State for the coalesce node that contains an OIFile object whose summary is generated by another, concurrent run."""
+    document: OIFile
+
+class ClusterState(TypedDict):
+    """State for the cluster node that contains a document ID and the chunks of text content to be reduced to cluster representatives."""
+    document_id: str
+    chunks: Tuple[str]
+
 class MapSummaryState(TypedDict):
-    """State for the map node that contains a document ID and a chunk of text content to be summarized."""
+    """State for the map node that contains a document ID, the chunks of text content to be summarized and the number of chunks every one stands for."""
     document_id: str
-    content: str
+    chunks: Tuple[str]
+    chunk_weights: List[int]
 
 class CollapseState(TypedDict):
     """State for the collapse node that contains a document ID and a list of partial summaries to be collapsed into a final summary."""
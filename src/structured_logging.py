@@ -0,0 +1,127 @@
+from langchain_core.runnables.config import var_child_runnable_config
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional, TextIO, Tuple
+import atexit
+import json
+import logging
+import queue
+import random
+
+from src.config import LOG_FORMAT, LOG_SAMPLE_RATE
+
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    This is a class for formatting log records as single-line JSON
+    objects, including the run, document and graph node the record
+    was logged from, so that logs can be filtered and aggregated by
+    run and document.
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "document_id": getattr(record, "document_id", None),
+            "node": getattr(record, "node", None),
+        }
+
+        if getattr(record, "sampled", None) is not None:
+            entry["sampled"] = record.sampled
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogContextFilter(logging.Filter):
+    '''
+    This is a class for annotating log records with the run, document
+    and graph node they were logged from, read from the configuration
+    of the running graph node. It runs in the calling thread, before
+    the record is queued, as the configuration is a context variable.
+    '''
+    def __init__(self, run_id_getter: Callable[[Optional[dict]], str]):
+        super().__init__()
+        self.run_id_getter = run_id_getter
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        config = var_child_runnable_config.get()
+
+        if config:
+            metadata = config.get("metadata", {}) or {}
+            record.run_id = self.run_id_getter(config)
+            record.document_id = metadata.get("document_id")
+            record.node = metadata.get("langgraph_node")
+
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    '''
+    This is a class for queueing log records to be formatted and
+    written by a background thread. Unlike the QueueHandler, records
+    are queued as they are, so that the calling thread never formats
+    messages, which is safe as records never leave the process.
+    '''
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def create_handler(log_format: str = LOG_FORMAT, stream: Optional[TextIO] = None, run_id_getter: Optional[Callable[[Optional[dict]], str]] = None) -> Tuple[logging.Handler, QueueListener]:
+    """
+    Create a handler queueing log records to a background thread, which formats and writes them to a stream.
+
+    Args:
+        log_format (str): The format of the log lines, "text" or "json".
+        stream (TextIO, optional): The stream to write the log lines to. Defaults to stderr.
+        run_id_getter (Callable, optional): Function getting the run ID from the configuration of a graph node.
+
+    Returns:
+        Tuple[logging.Handler, QueueListener]: The handler to add to a logger and its started listener, to stop on exit.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Log format must be one of: {', '.join(LOG_FORMATS)}.")
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT))
+
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+
+    if run_id_getter:
+        handler.addFilter(LogContextFilter(run_id_getter))
+
+    listener = QueueListener(handler.queue, stream_handler, respect_handler_level=False)
+    listener.start()
+
+    # Write the queued records before the interpreter exits, unless the listener was already stopped
+    atexit.register(lambda: listener._thread and listener.stop())
+
+    return handler, listener
+
+def log_sampled(logger: logging.Logger, level: int, msg: str, *args, rate: float = LOG_SAMPLE_RATE) -> None:
+    """
+    Log a high-volume event, e.g. one per chunk, only for a random sample of its occurrences.
+
+    The message is formatted lazily from its arguments, and only if the event is sampled
+    and the level is enabled. Sampled records carry the sample rate, to scale counts with.
+
+    Args:
+        logger (logging.Logger): The logger to log the event with.
+        level (int): The level of the event.
+        msg (str): The message of the event, with %-style placeholders.
+        *args: The arguments of the message.
+        rate (float): The fraction of the occurrences of the event to log.
+    """
+    if rate <= 0 or not logger.isEnabledFor(level) or (rate < 1 and random.random() >= rate):
+        return
+
+    logger.log(level, msg, *args, extra={"sampled": rate})
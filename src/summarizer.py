@@ -1,35 +1,175 @@
-from langgraph.graph import END, START, StateGraph
-
-from src.nodes_edges import _load_document, _split_document, _generate_summary, _group_partial_summaries, _collapse_summaries, _generate_final_summary, _map_input, _map_documents, _map_chunks, _should_collapse
-from src.states import InputState, OverallState, OutputState
-
-
-# Define the graph
-builder = StateGraph(OverallState, input_schema=InputState, output_schema=OutputState)
-
-# Add nodes
-builder.add_node("load_document", _load_document)
-builder.add_node("split_document", _split_document)
-builder.add_node("generate_summary", _generate_summary)
-builder.add_node("group_partial_summaries", _group_partial_summaries)
-builder.add_node("collapse_summaries", _collapse_summaries)
-builder.add_node("generate_final_summary", _generate_final_summary)
-
-# Add edges with conditional routing
-builder.add_conditional_edges(START, _map_input, ["load_document"])
-builder.add_conditional_edges("load_document", _map_documents, ["split_document"])
-builder.add_conditional_edges("split_document", _map_chunks, ["generate_summary"])
-builder.add_edge("generate_summary", "group_partial_summaries")
-builder.add_conditional_edges("group_partial_summaries", _should_collapse, ["collapse_summaries", "generate_final_summary"])
-builder.add_conditional_edges("collapse_summaries", _should_collapse, ["collapse_summaries", "generate_final_summary"])
-builder.add_edge("generate_final_summary", END)
-
-# Compile the graph
-graph = builder.compile(
-    interrupt_before=[],  # Add nodes here if you want to update state before execution
-    interrupt_after=[],   # Add nodes here if you want to update state after execution
-)
-graph.name = "DocumentSummarizationGraph"
-
-# Create main agent instance
-app = graph
\ No newline at end of file
+from typing import Dict
+import time
+
+from src.config import WARM_UP_ON_LOAD
+from src.utils import get_logger
+
+
+logger = get_logger()
+compiled_graph = None
+compiled_local_graph = None
+compiled_document_graph = None
+
+
+def build_document_graph():
+    """Build and compile the summarization graph of a single document, from its chunks to its final summary."""
+    from langgraph.graph import END, START, StateGraph
+
+    from src.nodes_edges import _split_document, _cluster_chunks, _generate_summary, _collapse_summaries, _generate_final_summary, _should_summarize, _should_collapse
+    from src.profiling import profile_memory
+    from src.tracing import trace_node
+    from src.states import DocumentState, OutputState
+
+    # Define the graph
+    builder = StateGraph(DocumentState, output_schema=OutputState)
+
+    # Add nodes, tracing them and profiling their memory if enabled
+    builder.add_node("split_document", trace_node("split_document", profile_memory("split_document", _split_document)))
+    builder.add_node("cluster_chunks", trace_node("cluster_chunks", profile_memory("cluster_chunks", _cluster_chunks)))
+    builder.add_node("generate_summary", trace_node("generate_summary", profile_memory("generate_summary", _generate_summary)))
+    builder.add_node("collapse_summaries", trace_node("collapse_summaries", profile_memory("collapse_summaries", _collapse_summaries)))
+    builder.add_node("generate_final_summary", trace_node("generate_final_summary", profile_memory("generate_final_summary", _generate_final_summary)))
+
+    # Add edges with conditional routing
+    builder.add_edge(START, "split_document")
+    builder.add_conditional_edges("split_document", _should_summarize, ["cluster_chunks", "generate_summary", END])
+    builder.add_edge("cluster_chunks", "generate_summary")
+    builder.add_conditional_edges("generate_summary", _should_collapse, ["collapse_summaries", "generate_final_summary"])
+    builder.add_conditional_edges("collapse_summaries", _should_collapse, ["collapse_summaries", "generate_final_summary"])
+    builder.add_edge("generate_final_summary", END)
+
+    # Compile the graph
+    graph = builder.compile()
+    graph.name = "DocumentPipelineGraph"
+
+    return graph
+
+def build_graph(checkpointer=None):
+    """
+    Build and compile the document summarization graph.
+
+    Args:
+        checkpointer (BaseCheckpointSaver, optional): Checkpointer of graphs run in-process, e.g. the one of
+            `src.serialization.get_checkpointer`. Graphs served by the LangGraph server are checkpointed by it.
+    """
+    # Heavy dependencies are imported here, so that importing this module stays cheap
+    from langgraph.graph import END, START, StateGraph
+
+    from src.cancellation import release_run_on_failure
+    from src.nodes_edges import _load_document, _summarize_document, _await_coalesced_summary, _report_run, _map_input, _map_documents
+    from src.profiling import profile_memory
+    from src.tracing import trace_node
+    from src.states import InputState, OverallState, OutputState
+
+    # Define the graph
+    builder = StateGraph(OverallState, input_schema=InputState, output_schema=OutputState)
+
+    # Add nodes, releasing a run (its coalesced summarizations, partial summaries and scheduling) if it is aborted or fails, tracing them and profiling their memory if enabled
+    builder.add_node("load_document", trace_node("load_document", profile_memory("load_document", release_run_on_failure(_load_document))))
+    builder.add_node("summarize_document", trace_node("summarize_document", profile_memory("summarize_document", release_run_on_failure(_summarize_document))))
+    builder.add_node("await_coalesced_summary", trace_node("await_coalesced_summary", profile_memory("await_coalesced_summary", release_run_on_failure(_await_coalesced_summary))))
+    builder.add_node("report_run", _report_run)
+
+    # Add edges with conditional routing, every document is summarized by its own pipeline
+    # and completes as soon as its own chunks are summarized, without waiting for the others
+    builder.add_conditional_edges(START, _map_input, ["load_document"])
+    builder.add_conditional_edges("load_document", _map_documents, ["summarize_document", "await_coalesced_summary"])
+    builder.add_edge("summarize_document", "report_run")
+    builder.add_edge("await_coalesced_summary", "report_run")
+    builder.add_edge("report_run", END)
+
+    # Compile the graph
+    graph = builder.compile(
+        interrupt_before=[],  # Add nodes here if you want to update state before execution
+        interrupt_after=[],   # Add nodes here if you want to update state after execution
+        checkpointer=checkpointer,
+    )
+    graph.name = "DocumentSummarizationGraph"
+
+    return graph
+
+def get_document_graph():
+    """Get the compiled graph of the pipeline of a single document, compiling it on first use."""
+    global compiled_document_graph
+
+    if not compiled_document_graph:
+        compiled_document_graph = build_document_graph()
+
+    return compiled_document_graph
+
+def get_graph():
+    """Get the compiled graph for the langgraph agent, compiling it on first use."""
+    global compiled_graph
+
+    if not compiled_graph:
+        compiled_graph = build_graph()
+
+    return compiled_graph
+
+def get_local_graph():
+    """Get the compiled graph run in-process by the batch runner, the job queue and the directory watcher, checkpointed with the state serializer."""
+    global compiled_local_graph
+
+    if not compiled_local_graph:
+        from src.serialization import get_checkpointer
+
+        compiled_local_graph = build_graph(checkpointer=get_checkpointer())
+
+    return compiled_local_graph
+
+def warm_up() -> Dict[str, float]:
+    """
+    Pre-build everything the first request would otherwise pay for: the compiled graph,
+    the LLM client, the tokenizer encoding, the prompt chains and the lazily imported
+    chunking and collapsing dependencies. Failures are logged and never raised, so that
+    a warm-up problem (e.g. no network access for the tokenizer encoding) does not
+    prevent the agent from starting.
+
+    Returns:
+        Dict[str, float]: Duration of every warm-up step in seconds.
+    """
+    from src.utils import count_tokens_sync, get_collapse_chain, get_llm, get_map_chain, get_reduce_chain
+
+    def _import_dependencies():
+        import langchain.chains.combine_documents.reduce  # noqa: F401
+        import langchain_text_splitters  # noqa: F401
+
+    def _load_tokenizer():
+        from langchain_core.documents import Document
+        count_tokens_sync([Document("warm-up")])
+
+    steps = (
+        ("graph", get_graph),
+        ("document_graph", get_document_graph),
+        ("llm", get_llm),
+        ("tokenizer", _load_tokenizer),
+        ("map_chain", get_map_chain),
+        ("collapse_chain", get_collapse_chain),
+        ("reduce_chain", get_reduce_chain),
+        ("dependencies", _import_dependencies),
+    )
+
+    timings = {}
+
+    for name, step in steps:
+        start_time = time.perf_counter()
+
+        try:
+            step()
+            timings[name] = time.perf_counter() - start_time
+        except Exception as e:
+            logger.warning(f"⚠ WARNING: Warm-up step '{name}' failed: {str(e)}")
+
+    logger.info(f"✓ Warm-up completed in {sum(timings.values()):.3f} seconds: " + ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()))
+
+    return timings
+
+def __getattr__(name: str):
+    # Keep `graph` and `app` importable from this module, while deferring the compilation until first use
+    if name in ("graph", "app"):
+        return get_graph()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if WARM_UP_ON_LOAD:
+    warm_up()
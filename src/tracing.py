@@ -0,0 +1,426 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from langchain_core.runnables import RunnableConfig
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+import urllib.request
+import uuid
+
+from src.config import TRACE_DIR, TRACE_EXPORT, TRACE_OTLP_ENDPOINT
+from src.utils import get_logger, get_run_id
+
+
+logger = get_logger()
+run_traces: "OrderedDict[str, RunTrace]" = OrderedDict()
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+TRACE_EXPORTS = ("json", "otlp")
+MAX_TRACKED_RUNS = 1024
+# Kinds of spans that do work themselves, rather than waiting for their children
+WORK_KINDS = ("llm", "http", "retry")
+
+
+class Span:
+    '''
+    This is a class for representing a timed operation of a run, e.g.
+    a node invocation, an LLM call, an HTTP attempt of an LLM call or
+    a collapse round, linked to its parent operation and annotated
+    with the document, chunk and round it belongs to.
+    '''
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "end", "status")
+
+    def __init__(self, trace_id: str, name: str, kind: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+
+    def finish(self, status: Optional[str] = None) -> None:
+        """End the span, unless already ended."""
+        if self.end is None:
+            self.end = time.time()
+            self.status = status or self.status
+
+    def to_dict(self, end: Optional[float] = None) -> Dict[str, Any]:
+        """Get the span as a dictionary, ending spans left open, e.g. HTTP attempts that never got a response, at the given time."""
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end if self.end is not None else (end or time.time()),
+            "status": self.status if self.end is not None else "error",
+            "attributes": self.attributes,
+        }
+
+
+class RunTrace:
+    '''
+    This is a class for collecting the spans of a run, all of them
+    descendants of the root span of the run, which starts with the
+    first traced operation and ends when the run reports.
+    '''
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(self.trace_id, "run", "run", attributes={"run_id": run_id})
+        self.spans: List[Span] = [self.root]
+        self.collapse_rounds: Dict[str, int] = {}
+        self.attempts: Dict[str, int] = {}
+
+    def start_span(self, name: str, kind: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        """Start a span under a parent span of the run, or under its root span."""
+        parent = parent if parent is not None and parent.trace_id == self.trace_id else self.root
+        span = Span(self.trace_id, name, kind, parent.span_id, attributes)
+        self.spans.append(span)
+
+        return span
+
+    def next_collapse_round(self, document_id: str) -> int:
+        """Get the number of the next collapse round of a document."""
+        self.collapse_rounds[document_id] = self.collapse_rounds.get(document_id, 0) + 1
+        return self.collapse_rounds[document_id]
+
+    def next_attempt(self, span: Span) -> int:
+        """Get the number of the next HTTP attempt of an LLM call."""
+        self.attempts[span.span_id] = self.attempts.get(span.span_id, 0) + 1
+        return self.attempts[span.span_id]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the trace as a dictionary, with every span in start order."""
+        end = self.root.end or time.time()
+
+        return {
+            "trace_id": self.trace_id,
+            "run_id": self.run_id,
+            "spans": [span.to_dict(end) for span in sorted(self.spans, key=lambda span: span.start)],
+        }
+
+
+def get_run_trace(run_id: str) -> RunTrace:
+    """Get the trace of a run, starting it on its first traced operation."""
+    trace = run_traces.get(run_id)
+
+    if trace is None:
+        trace = run_traces[run_id] = RunTrace(run_id)
+
+        # Traces of runs that failed before reporting are eventually dropped
+        while len(run_traces) > MAX_TRACKED_RUNS:
+            run_traces.popitem(last=False)
+
+    return trace
+
+@contextlib.contextmanager
+def trace_span(run_id: str, name: str, kind: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Trace an operation of a run as a span, a child of the span of the operation it runs in, if tracing is enabled.
+
+    Args:
+        run_id (str): The ID of the run.
+        name (str): The name of the operation, e.g. "node.split_document" or "llm.map".
+        kind (str): The kind of the operation, e.g. "node", "llm" or "collapse_round".
+        **attributes: The attributes of the span, e.g. the document ID and the chunk index.
+
+    Yields:
+        Optional[Span]: The span, or None if tracing is disabled.
+    """
+    if not TRACE_EXPORT:
+        yield None
+        return
+
+    span = get_run_trace(run_id).start_span(name, kind, current_span.get(), {"run_id": run_id, **attributes})
+    token = current_span.set(span)
+
+    try:
+        yield span
+    except asyncio.CancelledError:
+        span.finish("cancelled")
+        raise
+    except BaseException:
+        span.finish("error")
+        raise
+    finally:
+        span.finish()
+        current_span.reset(token)
+
+def trace_node(name: str, node: Callable) -> Callable:
+    """
+    Wrap a graph node, so that every invocation is traced as a span of its run, linked to the document it processes.
+    Invocations of the collapse node are traced as numbered collapse rounds. Returns the node unchanged unless tracing is enabled.
+
+    Args:
+        name (str): The name of the node in the graph.
+        node (Callable): The asynchronous node function.
+
+    Returns:
+        Callable: The wrapped node function, accepting the run configuration.
+    """
+    if not TRACE_EXPORT:
+        return node
+
+    accepts_config = "config" in inspect.signature(node).parameters
+
+    async def wrapper(state: Dict[str, Any], config: RunnableConfig) -> Any:
+        run_id = get_run_id(config)
+        document = state.get("document")
+        document_id = state.get("document_id") or (document.get_id() if document is not None else None)
+        attributes = {"node": name, "document_id": document_id}
+
+        if name == "collapse_summaries":
+            span_name, kind = "collapse_round", "collapse_round"
+            attributes["round"] = get_run_trace(run_id).next_collapse_round(document_id or '')
+            attributes["summaries"] = len(state.get("summaries", []))
+        else:
+            span_name, kind = f"node.{name}", "node"
+
+        with trace_span(run_id, span_name, kind, **attributes):
+            return await node(state, config) if accepts_config else await node(state)
+
+    wrapper.__name__ = node.__name__
+    wrapper.__qualname__ = node.__qualname__
+    wrapper.__doc__ = node.__doc__
+
+    return wrapper
+
+def get_http_event_hooks() -> Dict[str, List[Callable]]:
+    """
+    Get the httpx event hooks tracing every HTTP attempt of an LLM call as a child span of the call,
+    so that the retries of the OpenAI client, invisible to the agent otherwise, show up in the trace.
+
+    Returns:
+        Dict[str, List[Callable]]: The request and response event hooks of an httpx client.
+    """
+    async def _on_request(request: Any) -> None:
+        parent = current_span.get()
+
+        if parent is None or parent.kind != "llm":
+            return
+
+        trace = run_traces.get(parent.attributes.get("run_id", ''))
+
+        if trace is None:
+            return
+
+        attempt = trace.next_attempt(parent)
+        kind = "retry" if attempt > 1 else "http"
+        request.extensions["trace_span"] = trace.start_span(f"{kind}.{parent.attributes.get('stage', 'llm')}", kind, parent, {
+            **{key: value for key, value in parent.attributes.items() if key in ("run_id", "document_id", "chunk", "stage")},
+            "attempt": attempt,
+        })
+
+    async def _on_response(response: Any) -> None:
+        span = response.request.extensions.get("trace_span")
+
+        if span is not None:
+            span.attributes["status_code"] = response.status_code
+            span.finish("ok" if response.status_code < 400 else "error")
+
+    return {"request": [_on_request], "response": [_on_response]}
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], float, float]]:
+    """
+    Compute the critical path of a trace: the chain of operations that bounded its latency.
+
+    Starting from the end of the root span, the child that ended last is followed, then the child
+    that ended last before that child started, and so on, recursively. Time not covered by any child
+    is attributed to the span itself, e.g. time spent waiting for a slot of the scheduler.
+
+    Args:
+        spans (List[Dict[str, Any]]): The spans of the trace, as exported.
+
+    Returns:
+        List[Tuple[Dict[str, Any], float, float]]: The segments of the critical path in chronological order,
+            as the span the time is attributed to and the start and end of the segment.
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    children: Dict[str, List[Dict[str, Any]]] = {}
+
+    for span in spans:
+        if span.get("parent_id") in by_id:
+            children.setdefault(span["parent_id"], []).append(span)
+
+    roots = [span for span in spans if span.get("parent_id") not in by_id]
+
+    if not roots:
+        return []
+
+    path = []
+
+    def _walk(span: Dict[str, Any], end: float) -> None:
+        cursor = end
+
+        for child in sorted(children.get(span["span_id"], []), key=lambda child: child["end"], reverse=True):
+            if child["start"] >= cursor:
+                continue
+
+            child_end = min(child["end"], cursor)
+
+            if cursor > child_end:
+                path.append((span, child_end, cursor))
+
+            _walk(child, child_end)
+            cursor = child["start"]
+
+        if cursor > span["start"]:
+            path.append((span, span["start"], cursor))
+
+    root = max(roots, key=lambda span: span["end"] - span["start"])
+    _walk(root, root["end"])
+
+    return sorted(path, key=lambda segment: segment[1])
+
+def analyze_trace(spans: List[Dict[str, Any]], top: int = 5) -> Dict[str, Any]:
+    """
+    Analyze the critical path of a trace and name the document, chunk or collapse round that bounded its latency.
+
+    Args:
+        spans (List[Dict[str, Any]]): The spans of the trace, as exported.
+        top (int): Number of operations of the critical path to report, by time spent on the path.
+
+    Returns:
+        Dict[str, Any]: The duration of the trace, the time every document spent on the critical path,
+            the operations that spent the most time on it and the one that bounded the latency.
+    """
+    path = critical_path(spans)
+
+    if not path:
+        return {}
+
+    by_id = {span["span_id"]: span for span in spans}
+    on_path: Dict[str, float] = {}
+    by_document: Dict[str, float] = {}
+
+    for span, start, end in path:
+        on_path[span["span_id"]] = on_path.get(span["span_id"], 0.0) + end - start
+
+        document_id = span["attributes"].get("document_id")
+        if document_id:
+            by_document[document_id] = by_document.get(document_id, 0.0) + end - start
+
+    def _describe(span_id: str) -> Dict[str, Any]:
+        span = by_id[span_id]
+        return {
+            "name": span["name"],
+            "kind": span["kind"],
+            "critical_s": round(on_path[span_id], 4),
+            "duration_s": round(span["end"] - span["start"], 4),
+            **{key: span["attributes"][key] for key in ("document_id", "chunk", "round", "stage", "attempt") if key in span["attributes"]},
+        }
+
+    root_ids = {span["span_id"] for span in spans if span.get("parent_id") not in by_id}
+    operations = [span_id for span_id in sorted(on_path, key=on_path.get, reverse=True) if span_id not in root_ids]
+    # The bounding operation is the one doing the most work on the path, rather than waiting for it
+    work = [span_id for span_id in operations if by_id[span_id]["kind"] in WORK_KINDS + ("collapse_round",)]
+
+    return {
+        "duration_s": round(max(end for _, _, end in path) - min(start for _, start, _ in path), 4),
+        "bounded_by": _describe((work or operations)[0]) if operations else None,
+        "document": max(by_document, key=by_document.get) if by_document else None,
+        "by_document_s": {document_id: round(seconds, 4) for document_id, seconds in sorted(by_document.items(), key=lambda item: -item[1])},
+        "top": [_describe(span_id) for span_id in operations[:top]],
+    }
+
+def to_otlp(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode a trace as an OTLP/HTTP JSON export request."""
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    spans = [
+        {
+            "traceId": trace["trace_id"],
+            "spanId": span["span_id"],
+            **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+            "name": span["name"],
+            # Client spans for the calls to the LLM, internal spans otherwise
+            "kind": 3 if span["kind"] in WORK_KINDS else 1,
+            "startTimeUnixNano": str(int(span["start"] * 1e9)),
+            "endTimeUnixNano": str(int(span["end"] * 1e9)),
+            "attributes": [{"key": key, "value": _value(value)} for key, value in {"span.kind": span["kind"], **span["attributes"]}.items()],
+            "status": {"code": 1 if span["status"] == "ok" else 2, **({"message": span["status"]} if span["status"] != "ok" else {})},
+        }
+        for span in trace["spans"]
+    ]
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "document-summarization-agent"}}]},
+            "scopeSpans": [{"scope": {"name": "src.tracing"}, "spans": spans}],
+        }]
+    }
+
+def trace_filename(run_id: str) -> str:
+    """Get the name of the JSON file of the trace or memory profile of a run, which is the run ID if it is a safe file name, e.g. a UUID."""
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(run_id))[:100].lstrip(".")
+
+    # Run IDs changed to be safe, e.g. with "/" or "..", are told apart by a hash of the original ID
+    if not name or name != str(run_id):
+        digest = hashlib.sha256(str(run_id).encode('utf-8')).hexdigest()[:16]
+        name = f"{name}-{digest}" if name else digest
+
+    return f"{name}.json"
+
+def export_trace(trace: Dict[str, Any], export: str = TRACE_EXPORT) -> None:
+    """Export a trace as a JSON file in TRACE_DIR ("json") or to the OTLP/HTTP collector at TRACE_OTLP_ENDPOINT ("otlp")."""
+    if export == "json":
+        os.makedirs(TRACE_DIR, exist_ok=True)
+
+        with open(os.path.join(TRACE_DIR, trace_filename(trace['run_id'])), 'w', encoding='utf-8') as f:
+            json.dump(trace, f, indent=2)
+    elif export == "otlp":
+        request = urllib.request.Request(
+            TRACE_OTLP_ENDPOINT,
+            data=json.dumps(to_otlp(trace)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+    else:
+        raise ValueError(f"Trace export must be one of: {', '.join(TRACE_EXPORTS)}.")
+
+async def close_trace(run_id: str, export: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    End the trace of a run, export it and analyze its critical path.
+
+    Args:
+        run_id (str): The ID of the run.
+        export (bool): Whether to export and analyze the trace, or only discard it, e.g. for an aborted run.
+
+    Returns:
+        Optional[Dict[str, Any]]: The analysis of the critical path of the run, or None if tracing is disabled
+            or the trace is discarded.
+    """
+    trace = run_traces.pop(run_id, None)
+
+    if not TRACE_EXPORT or trace is None or not export:
+        return None
+
+    trace.root.finish()
+    exported = trace.to_dict()
+
+    try:
+        await asyncio.to_thread(export_trace, exported)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠ WARNING: Could not export trace of run {run_id}: {str(e)}")
+
+    return {"trace_id": trace.trace_id, "spans": len(exported["spans"]), **analyze_trace(exported["spans"])}
@@ -1,21 +1,21 @@
-from langchain_openai import AzureChatOpenAI
 from langchain_core.documents import Document
-from langchain_core.output_parsers import StrOutputParser
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from langchain_core.runnables import RunnableConfig
+from typing import Callable, List, Optional
 import asyncio
 import logging
 
 # from src.azure_services import OpenAIService
-from src.config import AZURE_OPENAI_MODEL_NAME, AZURE_OPENAI_API_VERSION, CHUNK_OVERLAP, CHUNK_SIZE
+from src.config import AZURE_OPENAI_MODEL_NAME, AZURE_OPENAI_API_VERSION, CHUNK_OVERLAP, CHUNK_SIZE, CHUNKING_STRATEGY, LOG_FORMAT, LOG_LEVEL, STAGE_MODELS, TRACE_EXPORT
 from src.oifile import OIFile
-from src.prompts import map_prompt, reduce_prompt
+from src.prompts import get_map_prompt, get_reduce_prompt
 from src.states import OverallState
 
 
 logger = None
 llm = None
+stage_llms = {}
 map_chain = None
+collapse_chain = None
 reduce_chain = None
 
 # Setup the OpenAIService LLM
@@ -35,42 +35,102 @@ reduce_chain = None
 #     return llm
 
 # Setup the AzureChatOpenAI LLM
-def get_llm():
-    """Get the LLM for the langgraph agent."""
+def get_llm(stage: Optional[str] = None):
+    """
+    Get the LLM for the langgraph agent, or the LLM of a stage ("map", "collapse" or "reduce").
+
+    Args:
+        stage (str, optional): The stage to get the LLM of, configured by its STAGE_MODELS settings.
+
+    Returns:
+        AzureChatOpenAI: The LLM, created once and shared by every caller.
+    """
     global llm
 
-    if not llm:
-        llm = AzureChatOpenAI(
-            model=AZURE_OPENAI_MODEL_NAME,
+    # Imported lazily, as langchain_openai is by far the most expensive import of the agent
+    if stage is None:
+        if not llm:
+            from langchain_openai import AzureChatOpenAI
+
+            llm = AzureChatOpenAI(
+                model=AZURE_OPENAI_MODEL_NAME,
+                api_version=AZURE_OPENAI_API_VERSION,
+                temperature=0,
+            )
+
+        return llm
+
+    if stage not in stage_llms:
+        from langchain_openai import AzureChatOpenAI
+
+        settings = STAGE_MODELS[stage]
+        http_async_client = None
+
+        if TRACE_EXPORT:
+            # Trace every HTTP attempt of the calls, to show the retries of the OpenAI client
+            from openai import DefaultAsyncHttpxClient
+            from src.tracing import get_http_event_hooks
+
+            http_async_client = DefaultAsyncHttpxClient(event_hooks=get_http_event_hooks())
+
+        stage_llms[stage] = AzureChatOpenAI(
+            model=settings["model"],
+            azure_deployment=settings["deployment"] or None,
             api_version=AZURE_OPENAI_API_VERSION,
-            temperature=0,
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            http_async_client=http_async_client,
         )
 
-    return llm
+    return stage_llms[stage]
+
+def get_stage_signature(stage: str) -> str:
+    """Get the settings of the model of a stage that determine its output, e.g. to key cached summaries with."""
+    settings = STAGE_MODELS[stage]
+
+    return f"{stage}:{settings['model']}:{settings['deployment']}:{settings['max_tokens']}:{settings['temperature']}"
 
 def get_map_chain():
     """Get the map chain for the langgraph agent."""
     global map_chain
 
     if not map_chain:
-        llm = get_llm()
-        map_chain = map_prompt | llm | StrOutputParser()
+        from langchain_core.output_parsers import StrOutputParser
+
+        llm = get_llm("map")
+        map_chain = get_map_prompt() | llm | StrOutputParser()
 
     return map_chain
 
+def get_collapse_chain():
+    """Get the collapse chain for the langgraph agent."""
+    global collapse_chain
+
+    if not collapse_chain:
+        from langchain_core.output_parsers import StrOutputParser
+
+        llm = get_llm("collapse")
+        collapse_chain = get_reduce_prompt() | llm | StrOutputParser()
+
+    return collapse_chain
+
 def get_reduce_chain():
     """Get the reduce chain for the langgraph agent."""
     global reduce_chain
 
     if not reduce_chain:
-        llm = get_llm()
-        reduce_chain = reduce_prompt | llm | StrOutputParser()
+        from langchain_core.output_parsers import StrOutputParser
+
+        llm = get_llm("reduce")
+        reduce_chain = get_reduce_prompt() | llm | StrOutputParser()
 
     return reduce_chain
 
 def get_logger(name: str="summarizer-map-reduce") -> logging.Logger:
     """
-    Get a logger with the specified name. If no handlers are set, it will create a default StreamHandler.
+    Get a logger with the specified name. If no handlers are set, it will create a handler queueing the
+    records to a background thread, which writes them to stderr as text or JSON lines (LOG_FORMAT), so that
+    logging never blocks the event loop. The level is configured by LOG_LEVEL.
 
     Args:
         name (str): The name of the logger. Defaults to "summarizer-map-reduce".
@@ -90,32 +150,64 @@ def get_logger(name: str="summarizer-map-reduce") -> logging.Logger:
 
         # Ensure the logger is not already configured
         if not logger.hasHandlers():
-            # If the logger does not have handlers, we will set it up
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                fmt="%(asctime)s %(levelname)s %(name)s: %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S"
-            )
-            handler.setFormatter(formatter)
+            # If the logger does not have handlers, we will set it up, annotating records with their run and document
+            from src.structured_logging import create_handler
+
+            handler, _ = create_handler(LOG_FORMAT, run_id_getter=get_run_id)
             logger.addHandler(handler)
 
-        logger.setLevel(logging.DEBUG)
+        logger.setLevel(LOG_LEVEL)
 
     return logger
 
+def get_run_id(config: Optional[RunnableConfig]) -> str:
+    """
+    Get the ID of the graph run a node is executed in, falling back to the thread ID.
+
+    Args:
+        config (RunnableConfig, optional): The configuration the node was invoked with.
+
+    Returns:
+        str: The ID of the run, or "local" if the run could not be identified.
+    """
+    config = config or {}
+    configurable = config.get("configurable", {}) or {}
+    metadata = config.get("metadata", {}) or {}
+
+    for value in (configurable.get("run_id"), metadata.get("run_id"), configurable.get("thread_id"), metadata.get("thread_id")):
+        if value:
+            return str(value)
+
+    return "local"
+
 async def chunk_document(
     document: OIFile,
     chunk_size: int = CHUNK_SIZE,
     chunk_overlap: int = CHUNK_OVERLAP,
+    strategy: str = CHUNKING_STRATEGY,
 ) -> tuple:
-    """Asynchronously chunk documents in parallel with limited concurrency"""
+    """
+    Asynchronously split the content of a document into chunks.
+
+    With the "cdc" strategy, chunk boundaries are content-defined, so that the unchanged regions of
+    a new version of a document produce identical chunks whose summaries can be reused, and chunks
+    do not overlap. With the "recursive" strategy, the text is split recursively on separators into
+    overlapping chunks.
+    """
     logger = get_logger()
 
     # Create text splitter in a thread to avoid blocking
     def create_splitter_and_split_text(text: str) -> tuple:
+        if strategy == "cdc":
+            from src.incremental import content_defined_split
+
+            return content_defined_split(text, chunk_size)
+
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         return tuple(RecursiveCharacterTextSplitter(
-            chunk_size=1024,
-            chunk_overlap=128,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", ". ", "! ", "? ", "; ", ": ", ", ", "... ", " ", ""],
             is_separator_regex=False
         ).split_text(text))
@@ -126,6 +218,8 @@ async def chunk_document(
         raise ValueError(
             "Chunk size must be positive, overlap must be non-negative, and overlap must be less than chunk size."
         )
+    if strategy not in ("cdc", "recursive"):
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
 
     if not document:
         logger.warning("No documents provided for chunking.")
@@ -134,9 +228,13 @@ async def chunk_document(
     name = document.get_name()
     text = document.get_content()
 
+    if not text.strip():
+        logger.warning(f"Document '{name}' has no text content. No chunking applied.")
+        return ()
+
     if len(text) < chunk_size:
         logger.warning(f"Document '{name}' is shorter than chunk size. No chunking applied.")
-        return tuple(text)
+        return (text,)
 
     # Initialize the return value
     split_docs = []
@@ -165,40 +263,73 @@ async def length_function(documents: List[Document]) -> int:
     """Get number of tokens for input contents asynchronously."""
     return await asyncio.to_thread(count_tokens_sync, documents)
 
+class SummaryGrouper:
+    '''
+    This is a class for grouping partial summaries into token-bounded
+    groups to collapse, fed one summary at a time in document order,
+    so that groups can be collapsed as soon as they are complete. A
+    group ends before the summary that would exceed the token limit
+    and, if `is_boundary` is provided, after every summary it holds
+    true for once the group holds at least `min_tokens`, so that groups
+    mostly depend on their own summaries and not on the summaries before
+    them, while still collapsing enough summaries at once to converge.
+    '''
+    def __init__(self, token_max: int, is_boundary: Optional[Callable[[Document], bool]] = None, min_tokens: Optional[int] = None):
+        self.token_max = token_max
+        self.is_boundary = is_boundary
+        self.min_tokens = token_max // 2 if min_tokens is None else min_tokens
+        self.total_tokens = 0
+        self._current: List[Document] = []
+        self._current_tokens = 0
+
+    def add(self, doc: Document, doc_tokens: int) -> List[List[Document]]:
+        """Add the next summary with its number of tokens, returning the groups it completed, if any."""
+        completed = []
+        self.total_tokens += doc_tokens
+
+        # If adding this doc would exceed token limit,
+        # save the current group and start a new one
+        if self._current and self._current_tokens + doc_tokens > self.token_max:
+            completed.append(self._current)
+            self._current = [doc]
+            self._current_tokens = doc_tokens
+        else:
+            self._current.append(doc)
+            self._current_tokens += doc_tokens
+
+        if self.is_boundary and self._current_tokens >= self.min_tokens and self.is_boundary(doc):
+            completed.append(self._current)
+            self._current = []
+            self._current_tokens = 0
+
+        return completed
+
+    def flush(self) -> List[List[Document]]:
+        """Get the last, incomplete group, if any."""
+        current, self._current, self._current_tokens = self._current, [], 0
+        return [current] if current else []
+
 # Add this async version of split_list_of_docs
 async def split_list_of_docs_async(
     docs: List[Document],
     length_func,
-    token_max: int
+    token_max: int,
+    is_boundary: Optional[Callable[[Document], bool]] = None,
 ) -> List[List[Document]]:
-    """Async version of split_list_of_docs that works with async length functions."""
-    if not docs:
-        return []
+    """
+    Async version of split_list_of_docs that works with async length functions.
 
-    docs_queue = list(docs)
+    If `is_boundary` is provided, a group of at least half the token limit also ends after every document
+    it holds true for, so that groups mostly depend on their own documents and not on the documents before them.
+    """
+    grouper = SummaryGrouper(token_max, is_boundary)
     result = []
-    _current = []
-    _current_tokens = 0
 
-    while docs_queue:
-        doc = docs_queue.pop(0)
+    for doc in docs:
         # Get tokens for this document asynchronously
-        doc_tokens = await length_func([doc])
+        result.extend(grouper.add(doc, await length_func([doc])))
 
-        # If adding this doc would exceed token limit,
-        # save the current group and start a new one
-        if _current and _current_tokens + doc_tokens > token_max:
-            result.append(_current)
-            _current = [doc]
-            _current_tokens = doc_tokens
-        else:
-            _current.append(doc)
-            _current_tokens += doc_tokens
-
-    if _current:
-        result.append(_current)
-
-    return result
+    return result + grouper.flush()
 
 def log_state_detailed(state: OverallState):
     """
@@ -210,6 +341,10 @@ def log_state_detailed(state: OverallState):
     """
     logger = get_logger()
 
+    # Walking the whole state is expensive, so skip it unless its output is logged
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
     if not state:
         logger.debug("OverallState is empty or None")
         return
@@ -0,0 +1,601 @@
+"""
+Watch mode for the continuous incremental ingestion of a directory of documents.
+
+Instead of scanning a drop folder in full on every run, the watcher summarizes every
+document dropped into it or changed in it as soon as it settles, by invoking the compiled
+`graph` of `src/summarizer.py` in-process, and drops deleted documents. Changes are
+detected with inotify on Linux, falling back to polling the modification times of the
+documents elsewhere or when inotify is unavailable or out of watches. Bursts of events of
+a document, e.g. while it is being copied, are debounced until it has been quiet for a
+while. A local SQLite index maps every document to the hash of its content and its
+summary: documents whose content did not change are never extracted or summarized again,
+and documents with the same content as an already summarized one reuse its summary, so
+the watcher can be restarted at any time and only catches up on what changed meanwhile.
+The backlog of the watcher and the latency from the drop of every document to its summary
+are logged periodically and, optionally, written to a JSON status file.
+
+Usage:
+    python -m src.watch -i documents/ -x watch.db -R -c 4 -s watch-status.json
+
+    Options:
+    -i, --input: Path to the directory of documents to watch
+    -x, --index: Path to the SQLite index of the summarized documents (default: .watch.db)
+    -c, --concurrency: Number of documents summarized concurrently (default: 4)
+    -R, --recursive: Watch subdirectories of the input directory recursively (default: False)
+    -e, --extensions: List of file extensions to include from the input directory (default: all supported)
+    -d, --debounce: Time in seconds a document must be quiet for before it is summarized (default: 2)
+    -p, --poll: Interval in seconds of polling the directory, when inotify is unavailable (default: 5)
+    -P, --polling: Poll the directory even if inotify is available, e.g. on network file systems (default: False)
+    -r, --report: Interval of the metric reports in seconds (default: 30)
+    -s, --status: Path to a JSON file to write the metrics to on every report (optional)
+    -1, --once: Catch up on the changes since the last run, then exit (default: False)
+"""
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+
+from src.batch import RICH_EXTENSIONS, TEXT_EXTENSIONS, iter_directory_paths, load_directory_record, summarize_record
+from src.scheduler import summarize_waits
+from src.utils import get_logger
+
+
+logger = get_logger()
+
+LATENCY_SAMPLES = 1024
+HASH_BLOCK_BYTES = 1 << 20
+
+# Events of inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER,
+    status TEXT NOT NULL,
+    summary TEXT,
+    error TEXT,
+    dropped_at REAL,
+    summarized_at REAL,
+    duration_s REAL
+);
+CREATE INDEX IF NOT EXISTS documents_hash ON documents (hash, status);
+"""
+
+
+def file_hash(path: str) -> str:
+    """Get the SHA-256 hash of the content of a file, read in blocks."""
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class WatchIndex:
+    '''
+    This is a class for the local index of the watcher, a SQLite file
+    mapping the path of every document of the watched directory, relative
+    to it, to the hash, modification time and size of its content when it
+    was last summarized, along with its summary or the error that prevented
+    it. The index is only accessed from the event loop of the watcher.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Get the entry of a document, if it is indexed."""
+        row = self.conn.execute("SELECT * FROM documents WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def paths(self) -> Set[str]:
+        """Get the paths of every indexed document."""
+        return {row[0] for row in self.conn.execute("SELECT path FROM documents")}
+
+    def find_summary(self, digest: str) -> Optional[str]:
+        """Get the summary of any document summarized successfully with the given hash of its content."""
+        row = self.conn.execute("SELECT summary FROM documents WHERE hash = ? AND status = 'ok' LIMIT 1", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, path: str, digest: str, mtime_ns: int, size: int, outcome: Dict[str, Any], dropped_at: float) -> None:
+        """Store the outcome of the summarization of a document, replacing its previous entry."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (path, hash, mtime_ns, size, status, summary, error, dropped_at, summarized_at, duration_s) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, digest, mtime_ns, size, outcome["status"], outcome.get("summary"), outcome.get("error"), dropped_at, time.time(), outcome.get("duration_s")),
+        )
+
+    def touch(self, path: str, mtime_ns: int, size: int) -> None:
+        """Update the modification time and size of a document whose content did not change."""
+        self.conn.execute("UPDATE documents SET mtime_ns = ?, size = ? WHERE path = ?", (mtime_ns, size, path))
+
+    def remove(self, path: str) -> bool:
+        """Drop the entry of a deleted document, returning whether it was indexed."""
+        return self.conn.execute("DELETE FROM documents WHERE path = ?", (path,)).rowcount > 0
+
+    def count(self) -> Dict[str, int]:
+        """Get the number of indexed documents per status."""
+        return {row[0]: row[1] for row in self.conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status")}
+
+
+class InotifyWatcher:
+    '''
+    This is a class for detecting the changes of the documents of a
+    directory with inotify, through the C library, without any further
+    dependency. Every created, written, moved or deleted path is reported
+    to a callback from the event loop, and subdirectories are watched
+    as soon as they are created if the directory is watched recursively.
+    '''
+    def __init__(self, path: str, recursive: bool, on_change: Callable[[str], None], on_rescan: Callable[[str], None]):
+        self.path = path
+        self.recursive = recursive
+        self.on_change = on_change
+        self.on_rescan = on_rescan
+        self.watches: Dict[int, str] = {}
+        self.buffer = b''
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+        try:
+            self.watch_tree(path)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def watch_tree(self, path: str) -> None:
+        """Watch a directory, along with its subdirectories if watching recursively."""
+        self.watch(path)
+
+        if self.recursive:
+            for root, dirs, _ in os.walk(path):
+                for name in dirs:
+                    self.watch(os.path.join(root, name))
+
+    def watch(self, path: str) -> None:
+        """Watch a single directory, raising OSError e.g. when running out of watches (ENOSPC)."""
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"Could not watch {path}: {os.strerror(code)}")
+
+        self.watches[wd] = path
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        loop.add_reader(self.fd, self.read)
+
+    def close(self, loop: asyncio.AbstractEventLoop) -> None:
+        loop.remove_reader(self.fd)
+        os.close(self.fd)
+
+    def read(self) -> None:
+        """Read and dispatch the pending events, called by the event loop when the inotify descriptor is readable."""
+        try:
+            self.buffer += os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+
+        while offset + EVENT_HEADER.size <= len(self.buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(self.buffer, offset)
+
+            if offset + EVENT_HEADER.size + length > len(self.buffer):
+                break
+
+            name = os.fsdecode(self.buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += EVENT_HEADER.size + length
+            self.dispatch(wd, mask, name)
+
+        self.buffer = self.buffer[offset:]
+
+    def dispatch(self, wd: int, mask: int, name: str) -> None:
+        """Report the path of a single event to the callbacks."""
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped by the kernel, so only a full scan can tell what changed
+            logger.warning(f"⚠ WARNING: The inotify queue of {self.path} overflowed, rescanning it")
+            self.on_rescan(self.path)
+            return
+
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+
+        directory = self.watches.get(wd)
+
+        if directory is None:
+            return
+
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # The documents of a deleted or moved away directory are dropped by rescanning it
+            self.on_rescan(directory)
+            return
+
+        path = os.path.join(directory, name)
+
+        if not mask & IN_ISDIR:
+            self.on_change(path)
+        elif mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+            # Documents may be created in a new directory before it is watched, so it is scanned as well
+            try:
+                self.watch_tree(path)
+            except OSError as e:
+                logger.warning(f"⚠ WARNING: {str(e)}")
+            self.on_rescan(path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.on_rescan(path)
+
+
+class DirectoryWatcher:
+    '''
+    This is a class for watching a directory of documents and summarizing
+    every document that is dropped into it or changed in it, once the
+    events of the document have settled, while dropping the index entries
+    of deleted documents. Changes are detected with inotify if available,
+    or else by polling the modification time and size of every document.
+    Every changed path is summarized only if the hash of its content is
+    not the indexed one, and reuses the summary of an identical document.
+    '''
+    def __init__(
+        self,
+        path: str,
+        index: WatchIndex,
+        concurrency: int = 4,
+        recursive: bool = False,
+        extensions: Optional[List[str]] = None,
+        debounce_s: float = 2.0,
+        poll_s: float = 5.0,
+        polling: bool = False,
+    ):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive integer.")
+
+        self.path = path
+        self.index = index
+        self.concurrency = concurrency
+        self.recursive = recursive
+        self.extensions = extensions
+        self.allowed = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in extensions} if extensions else TEXT_EXTENSIONS | RICH_EXTENSIONS
+        self.debounce_s = debounce_s
+        self.poll_s = poll_s
+        self.polling = polling
+        self.mode = "polling"
+
+        # Paths waiting to settle, mapped to the time of their first and latest event
+        self.pending: Dict[str, Tuple[float, float]] = {}
+        # Paths settled and waiting for a worker, or being summarized, mapped to the time of their first event
+        self.queued: Dict[str, float] = {}
+        self.running: Dict[str, float] = {}
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self.snapshot: Dict[str, Tuple[int, int]] = {}
+        self.latencies: "deque[float]" = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"summarized": 0, "reused": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+        self.started_at = time.time()
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(path, self.path)
+
+    def _is_document(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not name.startswith('.') and os.path.splitext(name)[1].lower() in self.allowed
+
+    def _is_watched(self, path: str) -> bool:
+        return self.recursive or os.path.dirname(self._relpath(path)) == ''
+
+    def mark(self, path: str, dropped_at: Optional[float] = None) -> None:
+        """Mark a path as changed, restarting its debounce while keeping the time of its first event."""
+        if not self._is_document(path) or not self._is_watched(path):
+            return
+
+        now = time.time()
+        first, _ = self.pending.get(path, (dropped_at or now, now))
+        self.pending[path] = (min(first, dropped_at or first), now)
+
+    def rescan(self, directory: str) -> None:
+        """Mark every document found in a directory or indexed under it as changed, e.g. after a move or an overflow."""
+        prefix = self._relpath(directory)
+        prefix = '' if prefix == '.' else prefix + os.sep
+
+        for rel_path in self.index.paths():
+            if rel_path.startswith(prefix):
+                self.mark(os.path.join(self.path, rel_path))
+
+        if os.path.isdir(directory):
+            for path in iter_directory_paths(directory, self.recursive, self.extensions):
+                self.mark(path)
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """Get the modification time and size of every document of the directory."""
+        snapshot = {}
+
+        for path in iter_directory_paths(self.path, self.recursive, self.extensions):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    async def poll(self) -> None:
+        """Mark the documents created, modified or deleted since the previous scan as changed, forever."""
+        while True:
+            await asyncio.sleep(self.poll_s)
+            snapshot = await asyncio.to_thread(self.scan)
+
+            for path, stat in snapshot.items():
+                if self.snapshot.get(path) != stat:
+                    # The modification time tells when a document was dropped more precisely than the poll
+                    self.mark(path, dropped_at=max(stat[0] / 1e9, time.time() - self.poll_s))
+
+            for path in self.snapshot.keys() - snapshot.keys():
+                self.mark(path)
+
+            self.snapshot = snapshot
+
+    async def settle(self) -> None:
+        """Queue the paths that have been quiet for the debounce time, forever."""
+        while True:
+            await asyncio.sleep(min(self.debounce_s / 4, 0.25) or 0.05)
+            now = time.time()
+
+            for path, (first, last) in list(self.pending.items()):
+                # A path changed again while it is summarized is queued once the running summarization completes
+                if now - last < self.debounce_s or path in self.running:
+                    continue
+
+                del self.pending[path]
+
+                if path not in self.queued:
+                    self.queued[path] = first
+                    self.queue.put_nowait(path)
+
+    async def work(self) -> None:
+        """Summarize the queued paths, forever."""
+        while True:
+            path = await self.queue.get()
+            dropped_at = self.running[path] = self.queued.pop(path)
+
+            try:
+                await self.process(path, dropped_at)
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"✕ ERROR: Could not process document {path}: {type(e).__name__}: {str(e)}")
+            finally:
+                del self.running[path]
+
+    async def process(self, path: str, dropped_at: float) -> None:
+        """Drop a deleted document from the index, or summarize a created or changed one unless its content did not change."""
+        rel_path = self._relpath(path)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if self.index.remove(rel_path):
+                self.counters["deleted"] += 1
+                logger.info(f"✓ Dropped deleted document {rel_path}")
+            return
+
+        entry = self.index.get(rel_path)
+
+        # Unchanged modification time and size are trusted, so a restart does not read every document again
+        if entry and entry["status"] == "ok" and (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+            self.counters["unchanged"] += 1
+            return
+
+        digest = await asyncio.to_thread(file_hash, path)
+
+        if entry and entry["status"] == "ok" and entry["hash"] == digest:
+            self.index.touch(rel_path, stat.st_mtime_ns, stat.st_size)
+            self.counters["unchanged"] += 1
+            return
+
+        summary = self.index.find_summary(digest)
+
+        if summary is not None:
+            outcome = {"status": "ok", "summary": summary, "duration_s": 0.0}
+            self.counters["reused"] += 1
+        else:
+            start_time = time.monotonic()
+
+            try:
+                record = await load_directory_record(path, self.path)
+            except Exception as e:
+                outcome = {"status": "error", "error": f"Could not load document: {type(e).__name__}: {str(e)}", "duration_s": round(time.monotonic() - start_time, 3)}
+            else:
+                # Every version of a document gets its own run, whose unchanged chunks reuse the summaries of the previous one if incremental summarization is enabled
+                outcome = await summarize_record(record, config={"configurable": {"run_id": f"watch-{rel_path}-{digest[:12]}"}})
+
+            self.counters["summarized" if outcome["status"] == "ok" else "failed"] += 1
+
+        self.index.put(rel_path, digest, stat.st_mtime_ns, stat.st_size, outcome, dropped_at)
+
+        if outcome["status"] == "ok":
+            latency = time.time() - dropped_at
+            self.latencies.append(latency)
+            logger.info(f"✓ Summarized document {rel_path} {'with the summary of an identical document ' if summary is not None else ''}"
+                        f"{latency:.2f} seconds after it was dropped")
+        else:
+            logger.error(f"✕ ERROR: Could not summarize document {rel_path}: {outcome['error']}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the backlog, counters and drop-to-summary latencies of the watcher."""
+        return {
+            "mode": self.mode,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "backlog": len(self.pending) + len(self.queued) + len(self.running),
+            "settling": len(self.pending),
+            "queued": len(self.queued),
+            "running": len(self.running),
+            "oldest_backlog_s": round(time.time() - min([*(first for first, _ in self.pending.values()), *self.queued.values(), *self.running.values()]), 3)
+                if self.pending or self.queued or self.running else 0.0,
+            **self.counters,
+            "indexed": self.index.count(),
+            "latency": summarize_waits(self.latencies) if self.latencies else None,
+        }
+
+    def is_idle(self) -> bool:
+        return not (self.pending or self.queued or self.running)
+
+    async def run(self, once: bool = False, report_s: float = 30, status_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Catch up on the changes since the last run, then watch the directory until cancelled.
+
+        Args:
+            once (bool): Whether to exit once caught up instead of watching the directory.
+            report_s (float): Interval of the metric reports in seconds.
+            status_path (str, optional): Path to a JSON file to write the metrics to on every report.
+
+        Returns:
+            Dict[str, Any]: The final metrics of the watcher.
+        """
+        loop = asyncio.get_running_loop()
+        inotify = None
+        self.mode = "once" if once else "polling"
+
+        # Changes are watched before catching up, so that none is missed in between
+        if not once and not self.polling:
+            try:
+                inotify = InotifyWatcher(self.path, self.recursive, self.mark, self.rescan)
+                inotify.start(loop)
+                self.mode = "inotify"
+            except (OSError, AttributeError) as e:
+                # AttributeError: the C library has no inotify, e.g. on macOS
+                logger.warning(f"⚠ WARNING: inotify is unavailable ({str(e)}), polling {self.path} every {self.poll_s} seconds instead")
+
+        self.snapshot = await asyncio.to_thread(self.scan)
+
+        for path in self.snapshot:
+            self.mark(path, dropped_at=self.started_at)
+
+        for rel_path in self.index.paths():
+            if os.path.join(self.path, rel_path) not in self.snapshot:
+                self.mark(os.path.join(self.path, rel_path), dropped_at=self.started_at)
+
+        # Caught-up paths need not settle
+        for path, (first, _) in self.pending.items():
+            self.pending[path] = (first, 0.0)
+
+        tasks = [asyncio.create_task(self.settle())] + [asyncio.create_task(self.work()) for _ in range(self.concurrency)]
+
+        if not once and inotify is None:
+            tasks.append(asyncio.create_task(self.poll()))
+
+        logger.info(f"→ Watching {self.path} ({self.mode}), catching up on {len(self.pending)} document(s)")
+
+        def _report() -> Dict[str, Any]:
+            stats = self.stats()
+            latency = stats["latency"] or {}
+            logger.info(f"Watcher backlog {stats['backlog']} ({stats['settling']} settling, {stats['queued']} queued, {stats['running']} running), "
+                        f"{stats['summarized']} summarized, {stats['reused']} reused, {stats['unchanged']} unchanged, {stats['deleted']} deleted, {stats['failed']} failed, "
+                        f"drop-to-summary p50 {latency.get('p50_s', 0):.2f}s, p95 {latency.get('p95_s', 0):.2f}s")
+
+            if status_path:
+                with open(f"{status_path}.tmp", 'w', encoding='utf-8') as f:
+                    json.dump(stats, f, indent=2)
+                os.replace(f"{status_path}.tmp", status_path)
+
+            return stats
+
+        try:
+            reported_at = time.monotonic()
+
+            while not (once and self.is_idle()):
+                await asyncio.sleep(0.1 if once else min(report_s, 1.0))
+
+                if time.monotonic() - reported_at >= report_s:
+                    _report()
+                    reported_at = time.monotonic()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            if inotify is not None:
+                inotify.close(loop)
+
+        return _report()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point of the watch mode."""
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Watch Mode')
+    parser.add_argument("-i", "--input", help="Path to the directory of documents to watch", type=str, required=True)
+    parser.add_argument("-x", "--index", help="Path to the SQLite index of the summarized documents", type=str, default=".watch.db")
+    parser.add_argument("-c", "--concurrency", help="Number of documents summarized concurrently", type=int, default=4)
+    parser.add_argument("-R", "--recursive", help="Watch subdirectories of the input directory recursively", action="store_true")
+    parser.add_argument("-e", "--extensions", help="List of file extensions to include from the input directory", type=str, nargs='+', default=None)
+    parser.add_argument("-d", "--debounce", help="Time in seconds a document must be quiet for before it is summarized", type=float, default=2)
+    parser.add_argument("-p", "--poll", help="Interval in seconds of polling the directory, when inotify is unavailable", type=float, default=5)
+    parser.add_argument("-P", "--polling", help="Poll the directory even if inotify is available", action="store_true")
+    parser.add_argument("-r", "--report", help="Interval of the metric reports in seconds", type=float, default=30)
+    parser.add_argument("-s", "--status", help="Path to a JSON file to write the metrics to on every report", type=str, required=False)
+    parser.add_argument("-1", "--once", help="Catch up on the changes since the last run, then exit", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        sys.exit(f"Wrong path to input directory: {args.input}")
+    if args.concurrency < 1:
+        sys.exit(f"Wrong concurrency: {args.concurrency}")
+    if args.debounce < 0 or args.poll <= 0 or args.report <= 0:
+        sys.exit(f"Wrong debounce, poll or report interval: {args.debounce}, {args.poll}, {args.report}")
+
+    index = WatchIndex(args.index)
+
+    async def _run() -> Dict[str, Any]:
+        watcher = DirectoryWatcher(args.input, index, args.concurrency, args.recursive, args.extensions, args.debounce, args.poll, args.polling)
+        return await watcher.run(once=args.once, report_s=args.report, status_path=args.status)
+
+    try:
+        stats = asyncio.run(_run())
+    except KeyboardInterrupt:
+        logger.info("Watcher stopped")
+        return 0
+    finally:
+        index.close()
+
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
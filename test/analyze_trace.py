@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Trace Analyzer.
+
+This script analyzes the trace of a run, as exported with TRACE_EXPORT=json, and reports
+its critical path: the chain of node invocations, LLM calls, retries and collapse rounds
+that bounded the latency of the run, the time every document spent on it, and the
+document, chunk or collapse round that bounded the run.
+
+Usage:
+    python analyze_trace.py [OPTIONS] TRACE
+
+    Options:
+    -t, --top: Number of operations of the critical path to report (default: 10)
+    -p, --path: Print every segment of the critical path in chronological order
+
+    Example:
+    python analyze_trace.py -p ../.traces/<run_id>.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import get_logger
+from src.tracing import analyze_trace, critical_path
+
+
+logger = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Trace Analyzer')
+    parser.add_argument("trace", help="Path of the JSON trace of a run", type=str)
+    parser.add_argument("-t", "--top", help="Number of operations of the critical path to report", type=int, default=10)
+    parser.add_argument("-p", "--path", help="Print every segment of the critical path in chronological order", action="store_true")
+    args = parser.parse_args()
+
+    logger = get_logger("analyze_trace")
+
+    with open(args.trace, "r", encoding="utf-8") as f:
+        trace = json.load(f)
+
+    spans = trace["spans"]
+    analysis = analyze_trace(spans, top=args.top)
+
+    if not analysis:
+        sys.exit(f"No spans in trace {args.trace}")
+
+    logger.info(f"Run {trace['run_id']} ({len(spans)} spans) took {analysis['duration_s']:.3f} seconds")
+    logger.info(f"Bounded by document {analysis['document']}: {analysis['bounded_by']}")
+
+    for document_id, seconds in analysis["by_document_s"].items():
+        logger.info(f"[document] {document_id}: {seconds:.3f}s on the critical path")
+
+    for operation in analysis["top"]:
+        logger.info(f"[top] {operation}")
+
+    if args.path:
+        origin = min(span["start"] for span in spans)
+
+        for span, start, end in critical_path(spans):
+            details = ", ".join(f"{key}={value}" for key, value in span["attributes"].items() if key in ("document_id", "chunk", "round", "attempt"))
+            logger.info(f"[path] +{start - origin:8.3f}s {end - start:8.3f}s {span['name']} {details}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Cancellation Benchmark.
+
+This script measures how promptly a cancelled run stops consuming LLM capacity, as when
+an Open WebUI user closes the tab of a run served with on_disconnect="cancel". A batch
+of synthetic documents is summarized in-process and the run is cancelled while its chunk
+summaries are in flight. The script reports how long the cancellation takes, how long
+until every slot of the scheduler window held or queued by the run is freed, and how many
+LLM requests the run still sent after its cancellation returned, which must be none. The
+LLM calls are served by the bundled fake_openai_server.py, started in-process on an
+ephemeral port. The batch is then summarized again, to report how many of its chunk
+summaries were reused from the partial results stored by the cancelled run.
+
+Usage:
+    python benchmark_cancellation.py [OPTIONS]
+
+    Options:
+    -n, --documents: Number of documents in the batch (default: 4)
+    -z, --size: Size of every synthetic document in KB (default: 256)
+    -l, --latency: Latency of every fake LLM call in milliseconds (default: 200)
+    -c, --cancel-after: Time in seconds after which the run is cancelled (default: 2)
+    -b, --bound: Maximum time in seconds for the slots of the cancelled run to be freed (default: 1)
+
+    Example:
+    python benchmark_cancellation.py -n 8 -z 512 -l 500 -b 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import FakeOpenAIState, serve
+from load_generator import synthetic_document
+from logger import get_logger
+
+
+logger = None
+
+
+async def run(records, state: FakeOpenAIState, cancel_after: float) -> dict:
+    """Summarize the batch, cancel the run while its LLM calls are in flight, then summarize the batch again."""
+    from src.scheduler import get_chunk_scheduler
+    from src.summarizer import build_graph
+
+    graph = build_graph()
+    scheduler = get_chunk_scheduler()
+
+    task = asyncio.create_task(graph.ainvoke({"files": records, "output_mode": "stats"}, config={"configurable": {"run_id": "cancelled"}}))
+    await asyncio.sleep(cancel_after)
+
+    if task.done():
+        raise RuntimeError("The run completed before its cancellation, use more or larger documents")
+
+    sent_before = state.to_dict()["requests"]
+    in_flight_before = scheduler.stats()["in_flight"]
+    cancelled_at = time.perf_counter()
+    task.cancel()
+
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    cancel_s = time.perf_counter() - cancelled_at
+    sent_at_cancel = state.to_dict()["requests"]
+
+    # Slots are freed by the cancelled tasks themselves, so poll until none is held or queued
+    while scheduler.stats()["in_flight"] or scheduler.stats()["queued"]:
+        await asyncio.sleep(0.001)
+
+    slots_s = time.perf_counter() - cancelled_at
+
+    # Requests already sent are answered by the fake model regardless, new ones must never arrive
+    await asyncio.sleep(1)
+    sent_after = state.to_dict()["requests"] - sent_at_cancel
+    abandoned = state.to_dict()["abandoned"]
+
+    rerun = await graph.ainvoke({"files": records}, config={"configurable": {"run_id": "rerun"}})
+    saved = sum(calls["saved"] for calls in rerun.get("llm_calls", {}).values())
+    made = sum(calls["made"] for calls in rerun.get("llm_calls", {}).values())
+
+    return {
+        "requests_before_cancel": sent_before,
+        "slots_before_cancel": in_flight_before,
+        "cancel_s": cancel_s,
+        "slots_s": slots_s,
+        "requests_after_cancel": sent_after,
+        "abandoned": abandoned,
+        "rerun_saved": saved,
+        "rerun_made": made,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Cancellation Benchmark')
+    parser.add_argument("-n", "--documents", help="Number of documents in the batch", type=int, default=4)
+    parser.add_argument("-z", "--size", help="Size of every synthetic document in KB", type=float, default=256)
+    parser.add_argument("-l", "--latency", help="Latency of every fake LLM call in milliseconds", type=float, default=200)
+    parser.add_argument("-c", "--cancel-after", help="Time in seconds after which the run is cancelled", type=float, default=2)
+    parser.add_argument("-b", "--bound", help="Maximum time in seconds for the slots of the cancelled run to be freed", type=float, default=1)
+    args = parser.parse_args()
+
+    if args.documents < 1 or args.cancel_after <= 0 or args.bound <= 0:
+        sys.exit(f"Wrong number of documents, cancellation time or bound: {args.documents}, {args.cancel_after}, {args.bound}")
+
+    state = FakeOpenAIState(latency_ms=args.latency, jitter_ms=0, per_token_ms=0, seed=0)
+    server = serve("127.0.0.1", 0, state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # The agent reads its configuration on import, so it is only imported once the environment is set
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{server.server_address[1]}",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": os.environ.get("AZURE_OPENAI_API_VERSION") or "2024-06-01",
+        "AZURE_OPENAI_MODEL_NAME": os.environ.get("AZURE_OPENAI_MODEL_NAME") or "gpt-4o",
+        "INCREMENTAL_ENABLED": "true",
+        "MANIFEST_DIR": tempfile.mkdtemp(prefix="manifests-"),
+        "PERSIST_PARTIAL_RESULTS": os.environ.get("PERSIST_PARTIAL_RESULTS") or "true",
+        "COALESCING_ENABLED": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+    logger = get_logger("benchmark_cancellation")
+
+    rng = random.Random(0)
+    records = [synthetic_document(idx, args.size, rng) for idx in range(args.documents)]
+
+    try:
+        report = asyncio.run(run(records, state, args.cancel_after))
+    except RuntimeError as e:
+        sys.exit(str(e))
+    finally:
+        server.shutdown()
+
+    logger.info(f"Cancelled the run after {report['requests_before_cancel']} LLM request(s), with {report['slots_before_cancel']} slot(s) in flight")
+    logger.info(f"Cancellation returned in {report['cancel_s'] * 1000:.1f} ms, every slot freed in {report['slots_s'] * 1000:.1f} ms, "
+                f"{report['requests_after_cancel']} LLM request(s) sent afterwards, {report['abandoned']} in-flight request(s) abandoned")
+    logger.info(f"Summarizing the batch again reused {report['rerun_saved']} summaries of the cancelled run and made {report['rerun_made']} LLM call(s)")
+
+    if report["requests_after_cancel"] or report["slots_s"] > args.bound:
+        sys.exit(f"The cancelled run kept consuming LLM capacity beyond {args.bound} seconds")
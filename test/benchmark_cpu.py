@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent CPU Microbenchmarks.
+
+This script benchmarks the pure-Python hot paths of the agent, which run on the event
+loop or its thread pool for every document regardless of the LLM, over a deterministic
+synthetic corpus (synthetic_corpus.py) of English, Greek, mixed and HTML-laden documents:
+- content: the cleaning of the extracted content of a document by OIFile._build_content
+- chunk_cdc / chunk_recursive: the chunking of a document by chunk_document
+- count_tokens / length_function: the token counting of the chunks of a document
+- split_list_of_docs: the grouping of the partial summaries of a document to collapse
+- summary_grouper: the incremental grouping by SummaryGrouper, as used while folding
+For every benchmark, kind and size, the best and median wall time, the throughput in
+MB/s of input text and the peak and retained traced memory are stored as JSON. Given the
+results of a previous version as a baseline, the script reports the difference of every
+metric, and fails if any throughput dropped or allocation grew by more than a threshold
+(allocations only when they grew by more than 64 KB as well).
+Token counting needs the tokenizer encoding of the model; if it cannot be loaded, e.g.
+without network access, the token counting benchmarks are reported as skipped.
+
+Usage:
+    python benchmark_cpu.py [OPTIONS]
+
+    Options:
+    -b, --benchmarks: Benchmarks to run (default: all)
+    -k, --kinds: Kinds of synthetic documents (default: english greek html)
+    -z, --sizes: Sizes of the synthetic documents in KB, up to 51200 (default: 1 64 1024)
+    -m, --min-time: Minimum time in seconds spent repeating every benchmark (default: 0.5)
+    -o, --output: Path of a JSON file to store the results in (optional)
+    -B, --baseline: Path of the results of a previous version to diff against (optional)
+    -t, --threshold: Maximum allowed throughput drop or allocation growth over the baseline in percent (default: 10)
+
+    Example:
+    python benchmark_cpu.py -z 1 64 1024 51200 -o cpu.json
+    python benchmark_cpu.py -B cpu.json -t 5
+"""
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, REPO_DIR)
+
+from logger import get_logger
+from synthetic_corpus import generate_text
+
+
+BENCHMARKS = ("content", "chunk_cdc", "chunk_recursive", "count_tokens", "length_function", "split_list_of_docs", "summary_grouper")
+# Throughput metrics regress when they drop, allocation metrics when they grow
+HIGHER_IS_BETTER = ("mb_per_s",)
+# Allocations of small documents vary by a few interned objects, which are not regressions
+ALLOCATION_SLACK_BYTES = 64 * 1024
+
+logger = None
+
+
+def prepare(benchmark: str, text: str) -> Callable[[], Any]:
+    """Get a callable running a benchmark once over the text of a synthetic document, with its inputs prepared beforehand."""
+    from langchain_core.documents import Document
+
+    from src.config import TOKEN_MAX
+    from src.incremental import content_defined_split, is_group_boundary
+    from src.oifile import OIFile
+    from src.utils import SummaryGrouper, chunk_document, count_tokens_sync, length_function, split_list_of_docs_async
+
+    loop = asyncio.get_event_loop()
+
+    if benchmark == "content":
+        return lambda: OIFile("benchmark", "benchmark.txt", "text/plain", text)
+
+    document = OIFile.from_dict({"id": "benchmark", "name": "benchmark.txt", "type": "text/plain", "content": text})
+
+    if benchmark in ("chunk_cdc", "chunk_recursive"):
+        strategy = benchmark.split("_")[1]
+        return lambda: loop.run_until_complete(chunk_document(document, strategy=strategy))
+
+    # Chunks stand for the partial summaries of the document, so that the groups grow with its size
+    chunks = [Document(chunk) for chunk in content_defined_split(document.get_content(), 1024)]
+
+    if benchmark == "count_tokens":
+        return lambda: count_tokens_sync(chunks)
+    if benchmark == "length_function":
+        return lambda: loop.run_until_complete(asyncio.gather(*(length_function([chunk]) for chunk in chunks)))
+    if benchmark == "split_list_of_docs":
+        return lambda: loop.run_until_complete(split_list_of_docs_async(chunks, length_function, TOKEN_MAX, is_boundary=lambda doc: is_group_boundary(doc.page_content)))
+
+    tokens = [max(1, len(chunk.page_content) // 4) for chunk in chunks]
+
+    def _group():
+        grouper = SummaryGrouper(TOKEN_MAX, is_boundary=lambda doc: is_group_boundary(doc.page_content))
+        groups = [group for chunk, count in zip(chunks, tokens) for group in grouper.add(chunk, count)]
+        return groups + grouper.flush()
+
+    return _group
+
+def measure(run: Callable[[], Any], size_bytes: int, min_time: float) -> Dict[str, float]:
+    """Repeat a benchmark for at least a minimum time and measure its wall time, throughput and traced memory."""
+    # The first run warms up lazy imports and caches, e.g. of the tokenizer, so that the second one traces the allocations of the benchmark alone
+    run()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    timings = []
+    started_at = time.perf_counter()
+
+    while not timings or time.perf_counter() - started_at < min_time:
+        start_time = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start_time)
+
+    best = min(timings)
+
+    return {
+        "runs": len(timings),
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(timings), 6),
+        "mb_per_s": round(size_bytes / (1 << 20) / best, 3) if best else 0,
+        "peak_bytes": peak - before,
+        "retained_bytes": current - before,
+    }
+
+def run_benchmarks(benchmarks: List[str], kinds: List[str], sizes_kb: List[float], min_time: float) -> Dict[str, Any]:
+    """Run every benchmark over a synthetic document of every kind and size."""
+    results = {}
+
+    for kind in kinds:
+        for size_kb in sizes_kb:
+            text = generate_text(kind, int(size_kb * 1024))
+            size_bytes = len(text.encode("utf-8"))
+
+            for benchmark in benchmarks:
+                key = f"{benchmark}/{kind}/{size_kb:g}KB"
+
+                try:
+                    results[key] = measure(prepare(benchmark, text), size_bytes, min_time)
+                except Exception as e:
+                    logger.warning(f"⚠ WARNING: Skipped benchmark {key}: {type(e).__name__}: {str(e)}")
+                    results[key] = {"skipped": f"{type(e).__name__}: {str(e)}"}
+                    continue
+
+                result = results[key]
+                logger.info(f"[{key}] {result['runs']} run(s), best {result['best_s'] * 1000:.3f} ms, median {result['median_s'] * 1000:.3f} ms, "
+                            f"{result['mb_per_s']:.2f} MB/s, peak {result['peak_bytes']} bytes, retained {result['retained_bytes']} bytes")
+
+    return results
+
+def diff(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Tuple[str, float, float, float]]:
+    """Get the baseline value, current value and relative change of every comparable metric of two results."""
+    rows = []
+
+    for key in sorted(set(baseline) & set(current)):
+        if "skipped" in baseline[key] or "skipped" in current[key]:
+            continue
+
+        for metric in ("mb_per_s", "peak_bytes", "retained_bytes"):
+            old, new = baseline[key][metric], current[key][metric]
+            change = (new - old) / abs(old) if old else (0.0 if new <= 0 else float("inf"))
+            rows.append((f"{key}.{metric}", old, new, change))
+
+    return rows
+
+def get_version() -> str:
+    """Get the git revision of the benchmarked agent, if any."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent CPU Microbenchmarks')
+    parser.add_argument("-b", "--benchmarks", help="Benchmarks to run", type=str, nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("-k", "--kinds", help="Kinds of synthetic documents", type=str, nargs='+', choices=("english", "greek", "mixed", "html"), default=["english", "greek", "html"])
+    parser.add_argument("-z", "--sizes", help="Sizes of the synthetic documents in KB", type=float, nargs='+', default=[1, 64, 1024])
+    parser.add_argument("-m", "--min-time", help="Minimum time in seconds spent repeating every benchmark", type=float, default=0.5)
+    parser.add_argument("-o", "--output", help="Path of a JSON file to store the results in", type=str, required=False)
+    parser.add_argument("-B", "--baseline", help="Path of the results of a previous version to diff against", type=str, required=False)
+    parser.add_argument("-t", "--threshold", help="Maximum allowed throughput drop or allocation growth over the baseline in percent", type=float, default=10)
+    args = parser.parse_args()
+
+    if any(size <= 0 or size > 51200 for size in args.sizes):
+        sys.exit(f"Wrong document sizes: {args.sizes}")
+
+    # The agent reads its configuration on import, so it is only imported once the environment is set,
+    # the LLM client is built for token counting only and never called
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:1")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-06-01")
+    os.environ.setdefault("AZURE_OPENAI_MODEL_NAME", "gpt-4o")
+    os.environ["LOG_LEVEL"] = "ERROR"
+    os.environ["LANGSMITH_TRACING"] = "false"
+
+    logger = get_logger("benchmark_cpu")
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    results = run_benchmarks(args.benchmarks, args.kinds, args.sizes, args.min_time)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"version": get_version(), "python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2, sort_keys=True)
+
+        logger.info(f"Results stored in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        regressions = []
+
+        for key, old, new, change in diff(baseline["results"], results):
+            logger.info(f"[diff] {key:>56}: {old:>14} -> {new:>14} ({change:+.1%})")
+
+            if key.rsplit(".", 1)[1] in HIGHER_IS_BETTER:
+                regressed = -change * 100 > args.threshold
+            else:
+                regressed = change * 100 > args.threshold and new - old > ALLOCATION_SLACK_BYTES
+
+            if regressed:
+                regressions.append(key)
+
+        if regressions:
+            sys.exit(f"Regressed by more than {args.threshold}% over the baseline {baseline.get('version') or args.baseline}: {', '.join(regressions)}")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Extractor Benchmark.
+
+This script compares the extractors of the plain text of DOCX and ODT documents used by
+src/extractors.py: the fast path streaming the document XML out of the zip container
+("fast"), the full layout pipeline of DoclingLoader ("docling", DOCX only) and pandoc through
+pypandoc ("pandoc"). Every extractor runs in a fresh process over the same corpus, either the
+DOCX and ODT files of a directory or synthetic documents generated out of the deterministic
+synthetic corpus (synthetic_corpus.py), with headings, paragraphs and tables. For every
+extractor and format, the script reports the time to import it, the time of the first file,
+which includes e.g. the loading of models, the files/sec and MB/s over the rest of the
+files, the traced peak memory of the Python heap and the peak resident memory of the process
+along with its subprocesses, and the characters extracted. Extractors whose dependencies are
+not installed are reported as skipped.
+
+Usage:
+    python benchmark_extractors.py [OPTIONS]
+
+    Options:
+    -d, --directory: Path to a directory of DOCX and ODT documents (default: synthetic documents)
+    -n, --documents: Number of synthetic documents per format (default: 20)
+    -z, --size: Size of the text of every synthetic document in KB (default: 64)
+    -x, --extractors: Extractors to compare (default: fast docling pandoc)
+    -f, --formats: Formats of the documents to extract (default: docx odt)
+
+    Example:
+    python benchmark_extractors.py -n 50 -z 256
+    python benchmark_extractors.py -d ../documents -x fast docling
+"""
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import get_logger
+from synthetic_corpus import generate_text
+
+
+EXTRACTORS = ("fast", "docling", "pandoc")
+FORMATS = ("docx", "odt")
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+ODT_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+    '<manifest:file-entry manifest:full-path="/" manifest:media-type="application/vnd.oasis.opendocument.text"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+
+logger = None
+
+
+def _blocks(text: str) -> List[List[str]]:
+    """Split a synthetic text into blocks: a heading every eight paragraphs and a two-column table row every five."""
+    blocks = []
+
+    for idx, paragraph in enumerate(part.strip() for part in text.split("\n\n") if part.strip()):
+        if idx % 8 == 0:
+            blocks.append(["heading", paragraph.split(".")[0][:60]])
+        if idx % 5 == 4:
+            half = len(paragraph) // 2
+            blocks.append(["row", paragraph[:half], paragraph[half:]])
+        else:
+            blocks.append(["paragraph", paragraph])
+
+    return blocks
+
+def write_docx(path: str, text: str) -> None:
+    """Write a synthetic text as a minimal DOCX document."""
+    body = []
+
+    for kind, *parts in _blocks(text):
+        if kind == "heading":
+            body.append(f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>{escape(parts[0])}</w:t></w:r></w:p>')
+        elif kind == "row":
+            cells = ''.join(f'<w:tc><w:p><w:r><w:t xml:space="preserve">{escape(part)}</w:t></w:r></w:p></w:tc>' for part in parts)
+            body.append(f'<w:tbl><w:tr>{cells}</w:tr></w:tbl>')
+        else:
+            body.append(f'<w:p><w:r><w:t xml:space="preserve">{escape(parts[0])}</w:t></w:r></w:p>')
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{"".join(body)}</w:body></w:document>'
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", DOCX_RELS)
+        archive.writestr("word/document.xml", document)
+
+def write_odt(path: str, text: str) -> None:
+    """Write a synthetic text as a minimal ODT document."""
+    body = []
+
+    for kind, *parts in _blocks(text):
+        if kind == "heading":
+            body.append(f'<text:h text:outline-level="1">{escape(parts[0])}</text:h>')
+        elif kind == "row":
+            cells = ''.join(f'<table:table-cell><text:p>{escape(part)}</text:p></table:table-cell>' for part in parts)
+            body.append(f'<table:table><table:table-column table:number-columns-repeated="2"/><table:table-row>{cells}</table:table-row></table:table>')
+        else:
+            body.append(f'<text:p>{escape(parts[0])}</text:p>')
+
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" office:version="1.2">'
+        f'<office:body><office:text>{"".join(body)}</office:text></office:body></office:document-content>'
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        # The mimetype must be the first entry of an OpenDocument container, stored uncompressed
+        archive.writestr("mimetype", "application/vnd.oasis.opendocument.text", compress_type=zipfile.ZIP_STORED)
+        archive.writestr("META-INF/manifest.xml", ODT_MANIFEST)
+        archive.writestr("content.xml", content)
+
+def generate_documents(directory: str, count: int, size_kb: float) -> None:
+    """Write synthetic DOCX and ODT documents of mixed English and Greek text to a directory."""
+    for idx in range(count):
+        text = generate_text("mixed", int(size_kb * 1024), seed=idx)
+        write_docx(os.path.join(directory, f"synthetic-{idx}.docx"), text)
+        write_odt(os.path.join(directory, f"synthetic-{idx}.odt"), text)
+
+def _peak_rss_mb() -> float:
+    """Get the peak resident memory of the process and of its waited-for subprocesses, e.g. pandoc, in MB."""
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+def run_extractor(extractor: str, paths: List[str]) -> Dict[str, Any]:
+    """Extract the text of every document with an extractor, in a fresh process, and measure it."""
+    start_time = time.perf_counter()
+
+    try:
+        from src import extractors
+
+        if extractor == "docling":
+            import langchain_docling  # noqa: F401
+            extract = extractors.read_docx_with_docling
+        elif extractor == "pandoc":
+            import pypandoc
+            pypandoc.get_pandoc_version()
+            extract = extractors.read_with_pandoc
+        else:
+            extract = lambda path: (extractors.extract_docx_text if path.endswith(".docx") else extractors.extract_odt_text)(path)
+    except (ImportError, OSError) as e:
+        return {"skipped": f"{type(e).__name__}: {str(e)}"}
+
+    import_s = time.perf_counter() - start_time
+    rss_before = _peak_rss_mb()
+    tracemalloc.start()
+    timings = []
+    characters = 0
+
+    for path in paths:
+        file_start = time.perf_counter()
+        characters += len(extract(path))
+        timings.append(time.perf_counter() - file_start)
+
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rest = timings[1:] or timings
+
+    return {
+        "files": len(paths),
+        "import_s": import_s,
+        "first_file_s": timings[0],
+        "files_per_s": len(rest) / sum(rest) if sum(rest) else float("inf"),
+        "mb_per_s": sum(os.path.getsize(path) for path in paths[-len(rest):]) / (1 << 20) / sum(rest) if sum(rest) else float("inf"),
+        "peak_heap_mb": peak / (1 << 20),
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - rss_before,
+        "characters": characters,
+    }
+
+def _run_in_process(extractor: str, paths: List[str], results: "multiprocessing.Queue") -> None:
+    try:
+        results.put(run_extractor(extractor, paths))
+    except Exception as e:
+        results.put({"skipped": f"{type(e).__name__}: {str(e)}"})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Extractor Benchmark')
+    parser.add_argument("-d", "--directory", help="Path to a directory of DOCX and ODT documents", type=str, required=False)
+    parser.add_argument("-n", "--documents", help="Number of synthetic documents per format", type=int, default=20)
+    parser.add_argument("-z", "--size", help="Size of the text of every synthetic document in KB", type=float, default=64)
+    parser.add_argument("-x", "--extractors", help="Extractors to compare", type=str, nargs='+', choices=EXTRACTORS, default=list(EXTRACTORS))
+    parser.add_argument("-f", "--formats", help="Formats of the documents to extract", type=str, nargs='+', choices=FORMATS, default=list(FORMATS))
+    args = parser.parse_args()
+
+    if args.directory and not os.path.isdir(args.directory):
+        sys.exit(f"Wrong path to documents directory: {args.directory}")
+    if args.documents < 1 or args.size <= 0:
+        sys.exit(f"Wrong number or size of documents: {args.documents}, {args.size}")
+
+    logger = get_logger("benchmark_extractors")
+
+    directory = args.directory or tempfile.mkdtemp(prefix="extractors-")
+
+    if not args.directory:
+        generate_documents(directory, args.documents, args.size)
+
+    # Every extractor runs in a fresh process, so that its imports and peak memory are measured alone
+    context = multiprocessing.get_context("spawn")
+
+    for file_format in args.formats:
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(f".{file_format}"))
+
+        if not paths:
+            logger.warning(f"No {file_format.upper()} documents found in {directory}")
+            continue
+
+        for extractor in args.extractors:
+            if extractor == "docling" and file_format != "docx":
+                continue
+
+            results = context.Queue()
+            process = context.Process(target=_run_in_process, args=(extractor, paths, results))
+            process.start()
+            result = results.get()
+            process.join()
+
+            if "skipped" in result:
+                logger.warning(f"[{file_format}/{extractor}] Skipped: {result['skipped']}")
+                continue
+
+            logger.info(f"[{file_format}/{extractor}] {result['files']} file(s), import {result['import_s'] * 1000:.0f} ms, first file {result['first_file_s'] * 1000:.1f} ms, "
+                        f"{result['files_per_s']:.1f} files/s ({result['mb_per_s']:.2f} MB/s), peak heap {result['peak_heap_mb']:.1f} MB, "
+                        f"peak RSS {result['peak_rss_mb']:.0f} MB (+{result['rss_growth_mb']:.0f} MB), {result['characters']} characters")
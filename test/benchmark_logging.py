@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Logging Overhead Benchmark.
+
+This script measures the overhead of logging on the hot path of the agent, i.e. the
+per-chunk events of the map step, for every thousand chunks. Every scenario logs the
+events of a thousand chunks from inside a graph node configuration, as the agent does,
+and reports the time spent by the logging (caller) thread, which delays the event loop,
+and the total time until every record was written to a temporary log file. Scenarios:
+- sync-debug: the previous setup, a synchronous StreamHandler at DEBUG level with eager f-strings.
+- queue-text: records queued to a background thread and written as text.
+- queue-json: records queued to a background thread and written as JSON lines with run and document IDs.
+- queue-json-sampled: as queue-json, with per-chunk events sampled at the given rate.
+- info-level: per-chunk events below the INFO level, i.e. disabled.
+
+Usage:
+    python benchmark_logging.py [OPTIONS]
+
+    Options:
+    -n, --repeat: Number of repetitions of every scenario (default: 20)
+    -c, --chunks: Number of chunk events per repetition (default: 1000)
+    -s, --sample-rate: Sample rate of the per-chunk events of the sampled scenario (default: 0.01)
+    -o, --output: Path of a JSON file to store the results in (optional)
+
+    Example:
+    python benchmark_logging.py -n 50 -o logging.json
+"""
+from typing import Callable, Dict, List
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.runnables.config import var_child_runnable_config
+
+from logger import get_logger
+from src.structured_logging import DATE_FORMAT, TEXT_FORMAT, create_handler, log_sampled
+from src.utils import get_run_id
+
+
+CHUNK = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 18
+CONFIG = {"configurable": {"run_id": "benchmark-run"}, "metadata": {"document_id": "benchmark-document", "langgraph_node": "generate_summary"}}
+
+
+def log_chunks_eagerly(target: logging.Logger, chunks: int) -> None:
+    """Log the chunk events as the previous setup did, formatting every message up front."""
+    for idx in range(chunks):
+        target.debug(f"✓ Summarized chunk {idx} of {chunks} ({len(CHUNK)} characters) of document with ID {CONFIG['metadata']['document_id']}")
+
+def log_chunks_lazily(target: logging.Logger, chunks: int, rate: float) -> None:
+    """Log the chunk events as the agent does, sampled and formatted lazily."""
+    for idx in range(chunks):
+        log_sampled(target, logging.DEBUG, "✓ Summarized chunk %d of %d (%d characters) of document with ID %s", idx, chunks, len(CHUNK), "benchmark-document", rate=rate)
+
+def run_scenario(name: str, build: Callable[[str], Callable[[], None]], repeat: int) -> Dict[str, float]:
+    """Run a scenario and get the median caller and total time per repetition in milliseconds."""
+    caller_times: List[float] = []
+    total_times: List[float] = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rep in range(repeat):
+            path = os.path.join(directory, f"{name}-{rep}.log")
+            log_chunks, drain = build(path)
+
+            token = var_child_runnable_config.set(CONFIG)
+            start_time = time.perf_counter()
+
+            try:
+                log_chunks()
+            finally:
+                var_child_runnable_config.reset(token)
+
+            caller_times.append((time.perf_counter() - start_time) * 1000)
+            drain()
+            total_times.append((time.perf_counter() - start_time) * 1000)
+
+    return {"caller_ms": statistics.median(caller_times), "total_ms": statistics.median(total_times)}
+
+def build_scenarios(chunks: int, rate: float) -> Dict[str, Callable[[str], tuple]]:
+    """Get the setup of every scenario, returning the function logging the chunks and the function draining the handler."""
+    def _logger(name: str, level: int, handler: logging.Handler) -> logging.Logger:
+        target = logging.getLogger(f"benchmark-logging-{name}-{time.perf_counter_ns()}")
+        target.propagate = False
+        target.setLevel(level)
+        target.addHandler(handler)
+        return target
+
+    def _sync_debug(path: str):
+        stream = open(path, "w", encoding="utf-8")
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT))
+        target = _logger("sync", logging.DEBUG, handler)
+        return (lambda: log_chunks_eagerly(target, chunks)), stream.close
+
+    def _queued(log_format: str, level: int, sample_rate: float):
+        def _build(path: str):
+            stream = open(path, "w", encoding="utf-8")
+            handler, listener = create_handler(log_format, stream=stream, run_id_getter=get_run_id)
+            target = _logger(log_format, level, handler)
+
+            def _drain() -> None:
+                listener.stop()
+                stream.close()
+
+            return (lambda: log_chunks_lazily(target, chunks, sample_rate)), _drain
+
+        return _build
+
+    return {
+        "sync-debug": _sync_debug,
+        "queue-text": _queued("text", logging.DEBUG, 1.0),
+        "queue-json": _queued("json", logging.DEBUG, 1.0),
+        "queue-json-sampled": _queued("json", logging.DEBUG, rate),
+        "info-level": _queued("json", logging.INFO, 1.0),
+    }
+
+logger = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Logging Overhead Benchmark')
+    parser.add_argument("-n", "--repeat", help="Number of repetitions of every scenario", type=int, default=20)
+    parser.add_argument("-c", "--chunks", help="Number of chunk events per repetition", type=int, default=1000)
+    parser.add_argument("-s", "--sample-rate", help="Sample rate of the per-chunk events of the sampled scenario", type=float, default=0.01)
+    parser.add_argument("-o", "--output", help="Path of a JSON file to store the results in", type=str, required=False)
+    args = parser.parse_args()
+
+    logger = get_logger("benchmark_logging")
+
+    if args.repeat < 1 or args.chunks < 1:
+        sys.exit(f"Wrong number of repetitions or chunks: {args.repeat}, {args.chunks}")
+
+    results = {}
+
+    for name, build in build_scenarios(args.chunks, args.sample_rate).items():
+        stats = run_scenario(name, build, args.repeat)
+        # Normalize to the overhead of a thousand chunks
+        results[name] = {key: value * 1000 / args.chunks for key, value in stats.items()}
+
+        logger.info(f"{name:>20}: caller={results[name]['caller_ms']:.3f}ms total={results[name]['total_ms']:.3f}ms per 1000 chunks")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"repeat": args.repeat, "chunks": args.chunks, "sample_rate": args.sample_rate, "results": results}, f, indent=2)
+
+        logger.info(f"Results stored in {args.output}")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Memory Benchmark.
+
+This script profiles the memory of the agent while it summarizes a batch of synthetic
+documents. The batch runs in a fresh Python interpreter with MEMORY_PROFILING enabled,
+so that tracemalloc snapshots are taken around every graph node, and the resulting
+memory profile (growth of the process peak RSS during the run, memory retained and peak
+traced memory per node, top allocation sites and serialized byte size of every state
+channel) is stored as JSON.
+Given the profile of a previous run as a baseline, the script reports the difference of
+every node and channel, and fails if any of them grew by more than a threshold. The LLM
+calls are served by the bundled fake_openai_server.py, started in-process on an
+ephemeral port, so that the numbers only reflect the agent itself.
+
+Usage:
+    python benchmark_memory.py [OPTIONS]
+
+    Options:
+    -n, --documents: Number of documents in the batch (default: 4)
+    -z, --size: Size of every synthetic document in KB (default: 64)
+    -o, --output: Path of a JSON file to store the memory profile in (optional)
+    -b, --baseline: Path of the memory profile of a previous run to diff against (optional)
+    -t, --threshold: Maximum allowed growth over the baseline in percent (default: 10)
+
+    Example:
+    python benchmark_memory.py -n 8 -z 256 -o memory.json
+    python benchmark_memory.py -n 8 -z 256 -b memory.json -t 5
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+
+from fake_openai_server import FakeOpenAIState, serve
+from load_generator import synthetic_document
+from logger import get_logger
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import asyncio, json, sys
+import src.summarizer as summarizer
+records = json.loads(sys.stdin.read())
+output = asyncio.run(summarizer.get_graph().ainvoke({"files": records}))
+print("PROFILE " + json.dumps(output["memory_profile"]))
+'''
+
+
+def run_probe(records: List[Dict[str, Any]], env: Dict[str, str]) -> Dict[str, Any]:
+    """Summarize the batch in a fresh interpreter and return its memory profile."""
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        input=json.dumps(records),
+        capture_output=True,
+        text=True,
+        cwd=REPO_DIR,
+        env=env,
+        timeout=1800,
+    )
+
+    for line in completed.stdout.splitlines():
+        if line.startswith("PROFILE "):
+            return json.loads(line[len("PROFILE "):])
+
+    raise RuntimeError(f"Probe failed with exit code {completed.returncode}: {completed.stderr[-2000:]}")
+
+def flatten(profile: Dict[str, Any]) -> Dict[str, int]:
+    """Get the comparable metrics of a memory profile as a flat mapping."""
+    metrics = {"peak_rss_growth_bytes": profile.get("peak_rss_growth_bytes") or 0, "traced_peak_bytes": profile.get("traced_peak_bytes") or 0}
+
+    for name, node in profile.get("nodes", {}).items():
+        metrics[f"node.{name}.peak_bytes"] = node["peak_bytes"]
+        metrics[f"node.{name}.retained_bytes"] = node["retained_bytes"]
+
+    for name, channel in profile.get("channels", {}).items():
+        metrics[f"channel.{name}.total_bytes"] = channel["total_bytes"]
+        metrics[f"channel.{name}.max_bytes"] = channel["max_bytes"]
+
+    return metrics
+
+def diff(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Tuple[str, int, int, float]]:
+    """Get the baseline value, current value and relative growth of every metric of two memory profiles."""
+    before = flatten(baseline)
+    after = flatten(current)
+
+    rows = []
+
+    for key in sorted(set(before) | set(after)):
+        old = before.get(key, 0)
+        new = after.get(key, 0)
+        growth = (new - old) / abs(old) if old else (0.0 if new <= 0 else float("inf"))
+        rows.append((key, old, new, growth))
+
+    return rows
+
+logger = get_logger("benchmark_memory")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Memory Benchmark')
+    parser.add_argument("-n", "--documents", help="Number of documents in the batch", type=int, default=4)
+    parser.add_argument("-z", "--size", help="Size of every synthetic document in KB", type=float, default=64)
+    parser.add_argument("-o", "--output", help="Path of a JSON file to store the memory profile in", type=str, required=False)
+    parser.add_argument("-b", "--baseline", help="Path of the memory profile of a previous run to diff against", type=str, required=False)
+    parser.add_argument("-t", "--threshold", help="Maximum allowed growth over the baseline in percent", type=float, default=10)
+    args = parser.parse_args()
+
+    if args.documents < 1:
+        sys.exit(f"Wrong number of documents: {args.documents}")
+
+    server = serve("127.0.0.1", 0, FakeOpenAIState(latency_ms=10, jitter_ms=0, per_token_ms=0, seed=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = dict(os.environ)
+    env.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{server.server_address[1]}",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": env.get("AZURE_OPENAI_API_VERSION") or "2024-06-01",
+        "AZURE_OPENAI_MODEL_NAME": env.get("AZURE_OPENAI_MODEL_NAME") or "gpt-4o",
+        "MEMORY_PROFILING": "true",
+        "MEMORY_PROFILE_DIR": "",
+        "INCREMENTAL_ENABLED": "false",
+        "WARM_UP_ON_LOAD": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+    rng = random.Random(0)
+    records = [synthetic_document(idx, args.size, rng) for idx in range(args.documents)]
+
+    profile = run_probe(records, env)
+    server.shutdown()
+
+    logger.info(f"Process peak RSS: {profile['process_peak_rss_bytes']} bytes (+{profile['peak_rss_growth_bytes']} bytes during the run), traced peak: {profile['traced_peak_bytes']} bytes")
+
+    for name, node in profile["nodes"].items():
+        logger.info(f"[node] {name:>24}: calls={node['calls']} peak={node['peak_bytes']} retained={node['retained_bytes']}")
+        for site in node["top_allocations"][:3]:
+            logger.info(f"{'':>33}{site['size_bytes']:>12} bytes in {site['count']} block(s) at {site['site']}")
+
+    for name, channel in profile["channels"].items():
+        logger.info(f"[channel] {name:>21}: writes={channel['writes']} total={channel['total_bytes']} max={channel['max_bytes']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"documents": args.documents, "size_kb": args.size, "profile": profile}, f, indent=2, sort_keys=True)
+
+        logger.info(f"Memory profile stored in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["profile"]
+
+        regressions = []
+
+        for key, old, new, growth in diff(baseline, profile):
+            logger.info(f"[diff] {key:>48}: {old:>12} -> {new:>12} ({growth:+.1%})")
+
+            if growth * 100 > args.threshold:
+                regressions.append(key)
+
+        if regressions:
+            sys.exit(f"Memory grew by more than {args.threshold}% over the baseline: {', '.join(regressions)}")
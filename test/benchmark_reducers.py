@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent State Reducer Benchmark.
+
+This script benchmarks the fan-in of the state channels of the agent, which every fanned-out
+node, e.g. one per document of a run, writes to in the same step: the documents, merged as a
+list, and the per-document results, LLM calls, timings and clustering statistics, merged as
+dicts. For every number of writes per step, it measures the time and traced peak memory of
+reducing the writes with the step reducers of src/states.py (StepAggregate) and with the
+binary operators they replace (operator.add and operator.or_), both on the channels alone and
+through a minimal LangGraph graph fanning out to one node per write, and checks that both
+reduce to the same value in the same order.
+
+Usage:
+    python benchmark_reducers.py [OPTIONS]
+
+    Options:
+    -n, --writes: Numbers of writes per step (default: 1000 10000 20000)
+    -g, --graph-writes: Numbers of writes per step through a graph, slower to fan out (default: 1000 10000)
+    -r, --repeat: Number of repetitions of every channel measurement, keeping the best (default: 3)
+
+    Example:
+    python benchmark_reducers.py -n 10000 50000 -g 10000
+"""
+from typing import Annotated, Any, Callable, Dict, List, Sequence, Tuple, TypedDict
+import argparse
+import asyncio
+import operator
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import get_logger
+
+
+logger = None
+
+
+def channel_writes(kind: str, count: int) -> List[Any]:
+    """Get the writes of a step to a list or dict channel, one per fanned-out node."""
+    if kind == "list":
+        return [[f"document-{idx}"] for idx in range(count)]
+
+    return [{f"document-{idx}": {"made": idx, "saved": 0}} for idx in range(count)]
+
+def get_channels(kind: str) -> Dict[str, Any]:
+    """Get the binary operator and step reducer channels of a kind of state channel."""
+    from langgraph.channels.binop import BinaryOperatorAggregate
+
+    from src.states import StepAggregate, add_documents, merge_dicts
+
+    if kind == "list":
+        return {"binop": BinaryOperatorAggregate(list, operator.add), "step": StepAggregate(list, add_documents)}
+
+    return {"binop": BinaryOperatorAggregate(dict, operator.or_), "step": StepAggregate(dict, merge_dicts)}
+
+def measure(run: Callable[[], Any], repeat: int) -> Tuple[Any, float, int]:
+    """Run a measurement repeatedly, returning its value, its best wall time and the traced peak memory of its first run."""
+    tracemalloc.start()
+    value = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = []
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start_time)
+
+    return value, min(timings), peak
+
+def bench_channels(counts: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Measure the reduction of the writes of a step on the channels alone."""
+    rows = []
+
+    for kind in ("list", "dict"):
+        for count in counts:
+            writes = channel_writes(kind, count)
+            values = {}
+
+            for name, channel in get_channels(kind).items():
+                def _run():
+                    fresh = channel.copy()
+                    fresh.update(writes)
+                    return fresh.get()
+
+                values[name], best_s, peak = measure(_run, repeat)
+                rows.append({"target": f"channel/{kind}", "reducer": name, "writes": count, "best_s": best_s, "peak_bytes": peak})
+
+            if values["binop"] != values["step"]:
+                raise RuntimeError(f"The step reducer of the {kind} channel reduced {count} writes differently")
+
+    return rows
+
+def bench_graph(counts: List[int]) -> List[Dict[str, Any]]:
+    """Measure a run of a graph fanning out to one node per write, which writes to a list and a dict channel."""
+    from langgraph.graph import START, StateGraph
+    from langgraph.types import Send
+
+    from src.states import StepAggregate, add_documents, merge_dicts
+
+    class BinopState(TypedDict):
+        count: int
+        documents: Annotated[List[str], operator.add]
+        result: Annotated[Dict[str, Any], operator.or_]
+
+    class StepState(TypedDict):
+        count: int
+        documents: Annotated[List[str], StepAggregate(list, add_documents)]
+        result: Annotated[Dict[str, Any], StepAggregate(dict, merge_dicts)]
+
+    def _write(state: Dict[str, Any]) -> Dict[str, Any]:
+        return {"documents": [f"document-{state['idx']}"], "result": {f"document-{state['idx']}": {"made": state["idx"], "saved": 0}}}
+
+    def _fan_out(state: Dict[str, Any]) -> List[Send]:
+        return [Send("write", {"idx": idx}) for idx in range(state["count"])]
+
+    rows = []
+
+    for count in counts:
+        values = {}
+
+        for name, state_schema in (("binop", BinopState), ("step", StepState)):
+            builder = StateGraph(state_schema)
+            builder.add_node("write", _write)
+            builder.add_conditional_edges(START, _fan_out, ["write"])
+            graph = builder.compile()
+
+            start_time = time.perf_counter()
+            values[name] = asyncio.run(graph.ainvoke({"count": count}))
+            rows.append({"target": "graph", "reducer": name, "writes": count, "best_s": time.perf_counter() - start_time, "peak_bytes": None})
+
+        if values["binop"] != values["step"]:
+            raise RuntimeError(f"The step reducers reduced {count} writes of a graph differently")
+
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent State Reducer Benchmark')
+    parser.add_argument("-n", "--writes", help="Numbers of writes per step", type=int, nargs='+', default=[1000, 10000, 20000])
+    parser.add_argument("-g", "--graph-writes", help="Numbers of writes per step through a graph, slower to fan out", type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument("-r", "--repeat", help="Number of repetitions of every channel measurement, keeping the best", type=int, default=3)
+    args = parser.parse_args()
+
+    if any(count < 1 for count in args.writes + args.graph_writes) or args.repeat < 1:
+        sys.exit(f"Wrong numbers of writes or repetitions: {args.writes}, {args.graph_writes}, {args.repeat}")
+
+    # The agent reads its configuration on import, so it is only imported once the environment is set
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:1")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-06-01")
+    os.environ.setdefault("AZURE_OPENAI_MODEL_NAME", "gpt-4o")
+    os.environ["LANGSMITH_TRACING"] = "false"
+
+    logger = get_logger("benchmark_reducers")
+
+    try:
+        rows = bench_channels(args.writes, args.repeat) + bench_graph(args.graph_writes)
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+    best = {(row["target"], row["writes"], row["reducer"]): row["best_s"] for row in rows}
+
+    for row in rows:
+        peak = f", peak {row['peak_bytes']} bytes" if row["peak_bytes"] is not None else ''
+        speedup = f" ({best[(row['target'], row['writes'], 'binop')] / row['best_s']:.1f}x)" if row["reducer"] == "step" and row["best_s"] else ''
+        logger.info(f"[{row['target']}] {row['writes']:>6} writes, {row['reducer']:>5}: {row['best_s'] * 1000:10.2f} ms{speedup}{peak}")
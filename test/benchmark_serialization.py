@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Serialization Benchmark.
+
+This script compares the state serializer of the agent (src/serialization.py), with and
+without the compression of large values, with the default serializer of the LangGraph
+server on the actual checkpoints of a run. A batch of synthetic documents is summarized
+in-process with an in-memory checkpointer, whose every serialized value (channel values,
+pending writes and Send packets, including those of the per-document pipelines) is
+serialized and deserialized with every serializer. The total serialize and deserialize
+time and the bytes per checkpoint of each are reported. The LLM calls are served by the
+bundled fake_openai_server.py, started in-process on an ephemeral port, so that the run
+itself is cheap.
+
+Usage:
+    python benchmark_serialization.py [OPTIONS]
+
+    Options:
+    -n, --documents: Number of documents in the batch (default: 8)
+    -z, --size: Size of every synthetic document in KB (default: 64)
+    -r, --repeat: Number of times every value is serialized and deserialized when timing (default: 3)
+
+    Example:
+    python benchmark_serialization.py -n 16 -z 256
+"""
+from typing import Any, Dict, Tuple
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import FakeOpenAIState, serve
+from load_generator import synthetic_document
+from logger import get_logger
+
+
+logger = None
+
+
+def get_default_serializer():
+    """Get the serializer of the checkpoints of the LangGraph server, which pickles the values msgpack cannot pack."""
+    try:
+        from langgraph_api.serde import Serializer
+        return Serializer()
+    except ImportError:
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+        return JsonPlusSerializer(pickle_fallback=True)
+
+
+class ComparingSerializer:
+    '''
+    This is a class for a checkpointer serializer that serializes and
+    deserializes every value with several serializers, recording the
+    time and bytes of each, and hands the checkpointer the output of
+    the first one.
+    '''
+    def __init__(self, serializers: Dict[str, Any], repeat: int = 3):
+        self.serializers = serializers
+        self.repeat = repeat
+        self.stats = {name: {"values": 0, "bytes": 0, "dumps_s": 0.0, "loads_s": 0.0, "types": {}} for name in serializers}
+
+    def _measure(self, name: str, serializer: Any, obj: Any) -> Tuple[str, bytes]:
+        stats = self.stats[name]
+
+        start_time = time.perf_counter()
+        for _ in range(self.repeat):
+            data = serializer.dumps_typed(obj)
+        stats["dumps_s"] += (time.perf_counter() - start_time) / self.repeat
+
+        start_time = time.perf_counter()
+        for _ in range(self.repeat):
+            serializer.loads_typed(data)
+        stats["loads_s"] += (time.perf_counter() - start_time) / self.repeat
+
+        stats["values"] += 1
+        stats["bytes"] += len(data[1])
+        stats["types"][data[0]] = stats["types"].get(data[0], 0) + 1
+
+        return data
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        outputs = [self._measure(name, serializer, obj) for name, serializer in self.serializers.items()]
+        return outputs[0]
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return next(iter(self.serializers.values())).loads_typed(data)
+
+
+async def run(records, repeat: int) -> Tuple[Dict[str, Any], int]:
+    """Summarize the batch with a comparing checkpointer and get the statistics of every serializer and the number of checkpoints."""
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from src.serialization import StateSerializer
+    from src.summarizer import build_graph
+
+    serde = ComparingSerializer({
+        "state": StateSerializer(pickle_fallback=True),
+        "state-uncompressed": StateSerializer(pickle_fallback=True, compression_min_bytes=None),
+        "default": get_default_serializer(),
+    }, repeat=repeat)
+    checkpointer = InMemorySaver(serde=serde)
+    graph = build_graph(checkpointer=checkpointer)
+
+    await graph.ainvoke({"files": records}, config={"configurable": {"thread_id": "benchmark"}})
+
+    checkpoints = sum(len(checkpoints) for namespaces in checkpointer.storage.values() for checkpoints in namespaces.values())
+
+    return serde.stats, checkpoints
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Serialization Benchmark')
+    parser.add_argument("-n", "--documents", help="Number of documents in the batch", type=int, default=8)
+    parser.add_argument("-z", "--size", help="Size of every synthetic document in KB", type=float, default=64)
+    parser.add_argument("-r", "--repeat", help="Number of times every value is serialized and deserialized when timing", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.documents < 1 or args.repeat < 1:
+        sys.exit(f"Wrong number of documents or repetitions: {args.documents}, {args.repeat}")
+
+    server = serve("127.0.0.1", 0, FakeOpenAIState(latency_ms=10, jitter_ms=0, per_token_ms=0, seed=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # The agent reads its configuration on import, so it is only imported once the environment is set
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{server.server_address[1]}",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": os.environ.get("AZURE_OPENAI_API_VERSION") or "2024-06-01",
+        "AZURE_OPENAI_MODEL_NAME": os.environ.get("AZURE_OPENAI_MODEL_NAME") or "gpt-4o",
+        "INCREMENTAL_ENABLED": "false",
+        "COALESCING_ENABLED": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+    logger = get_logger("benchmark_serialization")
+
+    rng = random.Random(0)
+    records = [synthetic_document(idx, args.size, rng) for idx in range(args.documents)]
+
+    stats, checkpoints = asyncio.run(run(records, args.repeat))
+    server.shutdown()
+
+    logger.info(f"Summarized {args.documents} document(s) of {args.size:g} KB with {checkpoints} checkpoint(s)")
+
+    for name, serializer in stats.items():
+        logger.info(f"[{name}] {serializer['values']} values, {serializer['bytes']} bytes ({serializer['bytes'] // max(1, checkpoints)} per checkpoint), "
+                    f"serialize {serializer['dumps_s'] * 1000:.1f} ms, deserialize {serializer['loads_s'] * 1000:.1f} ms, types {serializer['types']}")
+
+    default = stats.pop("default")
+
+    for name, serializer in stats.items():
+        logger.info(f"[{name}] {serializer['bytes'] / max(1, default['bytes']):.1%} of the bytes, {default['dumps_s'] / max(1e-9, serializer['dumps_s']):.2f}x "
+                    f"serialize and {default['loads_s'] / max(1e-9, serializer['loads_s']):.2f}x deserialize speed of the default")
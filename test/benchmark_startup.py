@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Startup Benchmark.
+
+This script tracks the cold start cost of the agent, as paid by a freshly autoscaled
+worker. Every repetition runs in a fresh Python interpreter and measures the import
+time of src/summarizer.py, the optional warm-up step, and the latency of the first and
+second requests sent directly to the compiled graph. The LLM calls are served by the
+bundled fake_openai_server.py, started in-process on an ephemeral port, so that the
+numbers only reflect the agent itself.
+
+Usage:
+    python benchmark_startup.py [OPTIONS]
+
+    Options:
+    -n, --repeat: Number of fresh interpreters per scenario (default: 5)
+    -z, --size: Size of the synthetic document of every request in KB (default: 4)
+    -l, --latency-ms: Latency of the fake LLM completions in milliseconds (default: 50)
+    -o, --output: Path of a JSON file to store the results in (optional)
+
+    Example:
+    python benchmark_startup.py -n 10 -o startup.json
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from fake_openai_server import FakeOpenAIState, serve
+from load_generator import synthetic_document
+from logger import get_logger
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import asyncio, json, sys, time
+start_time = time.perf_counter()
+import src.summarizer as summarizer
+timings = {"import": time.perf_counter() - start_time}
+if sys.argv[1] == "warm":
+    start_time = time.perf_counter()
+    summarizer.warm_up()
+    timings["warm_up"] = time.perf_counter() - start_time
+record = json.loads(sys.stdin.read())
+async def _requests():
+    for name in ("first_request", "second_request"):
+        start_time = time.perf_counter()
+        await summarizer.get_graph().ainvoke({"files": [record]})
+        timings[name] = time.perf_counter() - start_time
+asyncio.run(_requests())
+print("TIMINGS " + json.dumps(timings))
+'''
+
+
+def run_probe(scenario: str, record: Dict[str, Any], env: Dict[str, str]) -> Dict[str, float]:
+    """Run a single probe in a fresh interpreter and return its timings."""
+    start_time = time.perf_counter()
+
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, scenario],
+        input=json.dumps(record),
+        capture_output=True,
+        text=True,
+        cwd=REPO_DIR,
+        env=env,
+        timeout=600,
+    )
+
+    wall_time = time.perf_counter() - start_time
+
+    for line in completed.stdout.splitlines():
+        if line.startswith("TIMINGS "):
+            timings = json.loads(line[len("TIMINGS "):])
+            timings["process"] = wall_time
+            return timings
+
+    raise RuntimeError(f"Probe failed with exit code {completed.returncode}: {completed.stderr[-2000:]}")
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Get the median, minimum and maximum of every measured timing."""
+    keys = sorted({key for sample in samples for key in sample})
+
+    return {
+        key: {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+        for key in keys
+        for values in [[sample[key] for sample in samples if key in sample]]
+    }
+
+logger = get_logger("benchmark_startup")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Startup Benchmark')
+    parser.add_argument("-n", "--repeat", help="Number of fresh interpreters per scenario", type=int, default=5)
+    parser.add_argument("-z", "--size", help="Size of the synthetic document of every request in KB", type=float, default=4)
+    parser.add_argument("-l", "--latency-ms", help="Latency of the fake LLM completions in milliseconds", type=float, default=50)
+    parser.add_argument("-o", "--output", help="Path of a JSON file to store the results in", type=str, required=False)
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        sys.exit(f"Wrong number of repetitions: {args.repeat}")
+
+    server = serve("127.0.0.1", 0, FakeOpenAIState(latency_ms=args.latency_ms, jitter_ms=0, per_token_ms=0, seed=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = dict(os.environ)
+    env.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{server.server_address[1]}",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": env.get("AZURE_OPENAI_API_VERSION") or "2024-06-01",
+        "AZURE_OPENAI_MODEL_NAME": env.get("AZURE_OPENAI_MODEL_NAME") or "gpt-4o",
+        "WARM_UP_ON_LOAD": "false",
+        "LANGSMITH_TRACING": "false",
+    })
+
+    record = synthetic_document(0, args.size, random.Random(0))
+    results = {}
+
+    for scenario in ("cold", "warm"):
+        samples = [run_probe(scenario, record, env) for _ in range(args.repeat)]
+        results[scenario] = summarize(samples)
+
+        for key, stats in results[scenario].items():
+            logger.info(f"[{scenario}] {key:>15}: median={stats['median']:.3f}s min={stats['min']:.3f}s max={stats['max']:.3f}s")
+
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"repeat": args.repeat, "size_kb": args.size, "results": results}, f, indent=2)
+
+        logger.info(f"Results stored in {args.output}")
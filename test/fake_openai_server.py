@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in server for load testing the summarization agent.
+
+This script serves a minimal imitation of the Azure OpenAI (and plain OpenAI) chat
+completions API, so that the LangGraph server can be load tested without consuming
+real deployment quota. Response latency and rate-limiting (HTTP 429) behaviour are
+tunable, which makes it possible to reproduce throttling scenarios locally.
+
+Usage:
+1. Start the stand-in server:
+    python fake_openai_server.py [OPTIONS]
+
+    Options:
+    -a, --address: Address to bind to (default: 127.0.0.1)
+    -p, --port: Port to listen on (default: 8089)
+    -l, --latency-ms: Base latency of every completion in milliseconds (default: 500)
+    -j, --jitter-ms: Maximum random latency added to every completion in milliseconds (default: 250)
+    -t, --per-token-ms: Additional latency per generated token in milliseconds (default: 5)
+    -w, --words: Number of words in every generated completion (default: 20)
+    -c, --max-concurrency: Concurrent requests above which a 429 is returned (default: 0, unlimited)
+    -r, --rpm: Requests per minute above which a 429 is returned (default: 0, unlimited)
+    -e, --error-rate: Probability of a random 429 response (default: 0.0)
+    -R, --retry-after: Value of the Retry-After header on 429 responses in seconds (default: 1)
+    -s, --seed: Random seed for reproducible latencies and errors (optional)
+    -L, --deployment-latency-ms: Base latency of the completions of specific deployments in milliseconds,
+        e.g. "gpt-4o-mini=150,gpt-4o=600" (optional)
+
+2. Point the agent at the stand-in server in the .env file and start the LangGraph server:
+    AZURE_OPENAI_ENDPOINT="http://127.0.0.1:8089"
+    AZURE_OPENAI_API_KEY="fake"
+    AZURE_OPENAI_API_VERSION="2024-06-01"
+
+3. Counters of the stand-in server can be inspected with:
+    curl http://127.0.0.1:8089/stats
+
+    Example:
+    python fake_openai_server.py -p 8089 -l 800 -j 400 -c 32 -r 600
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+import argparse
+import collections
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from logger import get_logger
+
+
+COMPLETION_PATHS = (
+    re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions$"),
+    re.compile(r"^(/v1)?/chat/completions$"),
+)
+
+
+class FakeOpenAIState:
+    '''
+    This is a class for holding the behaviour settings and the
+    counters of the stand-in server. It is shared by all request
+    handler threads, so every mutation happens under a lock.
+    '''
+    def __init__(
+        self,
+        latency_ms: float = 500,
+        jitter_ms: float = 250,
+        per_token_ms: float = 5,
+        words: int = 20,
+        max_concurrency: int = 0,
+        rpm: int = 0,
+        error_rate: float = 0.0,
+        retry_after: float = 1,
+        seed: Optional[int] = None,
+        deployment_latency_ms: Optional[Dict[str, float]] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_token_ms = per_token_ms
+        self.words = words
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.deployment_latency_ms = deployment_latency_ms or {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = collections.deque()
+
+        self.requests = 0
+        self.completed = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.abandoned = 0
+
+    def admit(self) -> Optional[str]:
+        """Register an incoming request and return the reason for throttling it, if any."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+
+            # Slide the one-minute window used for the requests per minute limit
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+
+            reason = None
+
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                reason = "concurrency"
+            elif self.rpm and len(self._window) >= self.rpm:
+                reason = "rpm"
+            elif self.error_rate and self._random.random() < self.error_rate:
+                reason = "random"
+
+            if reason:
+                self.rate_limited += 1
+            else:
+                self._window.append(now)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            return reason
+
+    def release(self, prompt_tokens: int, completion_tokens: int, abandoned: bool = False) -> None:
+        """Register the completion of an admitted request, abandoned if the client went away before its response."""
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.abandoned += abandoned
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def latency(self, completion_tokens: int, deployment: Optional[str] = None) -> float:
+        """Get the simulated latency of a completion of a deployment in seconds."""
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0
+
+        latency_ms = self.deployment_latency_ms.get(deployment, self.latency_ms)
+
+        return (latency_ms + jitter + self.per_token_ms * completion_tokens) / 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the counters of the stand-in server."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "completed": self.completed,
+                "rate_limited": self.rate_limited,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "abandoned": self.abandoned,
+            }
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens of a text (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+def build_completion(messages: list, words: int) -> str:
+    """Build a deterministic completion out of the words of the last user message."""
+    prompt = ''
+
+    for message in reversed(messages or []):
+        if isinstance(message, dict) and message.get("role") == "user":
+            content = message.get("content", "")
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            prompt = str(content)
+            break
+
+    # Prefer the input section of the summarization prompts over their instructions
+    match = re.search(r"### Input:(.*?)(### Response:|$)", prompt, flags=re.DOTALL)
+    if match and match.group(1).strip():
+        prompt = match.group(1)
+
+    tokens = [token for token in re.findall(r"\w+", prompt) if len(token) > 3]
+
+    if not tokens:
+        tokens = ["summary"]
+
+    return " ".join(tokens[i % len(tokens)] for i in range(words)) + "."
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler imitating the chat completions endpoint of (Azure) OpenAI."""
+    protocol_version = "HTTP/1.1"
+    state: FakeOpenAIState = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if logger:
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] in ("/stats", "/health"):
+            self._send_json(200, self.state.to_dict())
+        else:
+            self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+
+    def do_POST(self) -> None:
+        path = self.path.split("?")[0]
+        match = next((m for m in (p.match(path) for p in COMPLETION_PATHS) if m), None)
+
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        raw_body = self.rfile.read(length) if length else b""
+
+        if not match:
+            self._send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+            return
+
+        try:
+            body = json.loads(raw_body or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"code": "400", "message": "Invalid JSON body"}})
+            return
+
+        reason = self.state.admit()
+
+        if reason:
+            self._send_json(
+                429,
+                {"error": {"code": "429", "message": f"Rate limit exceeded ({reason}). Please retry later."}},
+                headers={"Retry-After": str(self.state.retry_after), "retry-after-ms": str(int(self.state.retry_after * 1000))},
+            )
+            return
+
+        messages = body.get("messages", [])
+        prompt_tokens = estimate_tokens(json.dumps(messages, ensure_ascii=False))
+        words = min(self.state.words, int(body.get("max_tokens") or body.get("max_completion_tokens") or self.state.words))
+        content = build_completion(messages, max(1, words))
+        completion_tokens = estimate_tokens(content)
+        abandoned = False
+
+        try:
+            time.sleep(self.state.latency(completion_tokens, match.groupdict().get("deployment") or body.get("model")))
+
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model") or (match.groupdict().get("deployment") or "fake-model"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the call, e.g. because its run was cancelled, the quota is spent anyway
+            abandoned = True
+        finally:
+            self.state.release(prompt_tokens, completion_tokens, abandoned)
+
+
+def serve(address: str, port: int, state: FakeOpenAIState) -> ThreadingHTTPServer:
+    """Create the stand-in HTTP server with the provided behaviour settings."""
+    handler = type("BoundFakeOpenAIHandler", (FakeOpenAIHandler,), {"state": state})
+    server = ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+logger = None
+
+if __name__ == "__main__":
+    logger = get_logger("fake_openai_server")
+
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible stand-in server')
+    parser.add_argument("-a", "--address", help="Address to bind to", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="Port to listen on", type=int, default=8089)
+    parser.add_argument("-l", "--latency-ms", help="Base latency of every completion in milliseconds", type=float, default=500)
+    parser.add_argument("-j", "--jitter-ms", help="Maximum random latency added to every completion in milliseconds", type=float, default=250)
+    parser.add_argument("-t", "--per-token-ms", help="Additional latency per generated token in milliseconds", type=float, default=5)
+    parser.add_argument("-w", "--words", help="Number of words in every generated completion", type=int, default=20)
+    parser.add_argument("-c", "--max-concurrency", help="Concurrent requests above which a 429 is returned", type=int, default=0)
+    parser.add_argument("-r", "--rpm", help="Requests per minute above which a 429 is returned", type=int, default=0)
+    parser.add_argument("-e", "--error-rate", help="Probability of a random 429 response", type=float, default=0.0)
+    parser.add_argument("-R", "--retry-after", help="Value of the Retry-After header on 429 responses in seconds", type=float, default=1)
+    parser.add_argument("-s", "--seed", help="Random seed for reproducible latencies and errors", type=int, required=False)
+    parser.add_argument("-L", "--deployment-latency-ms", help="Base latency of the completions of specific deployments in milliseconds", type=str, required=False)
+    args = parser.parse_args()
+
+    if args.port < 0 or args.port > 65535:
+        sys.exit(f"Wrong serving port: {args.port}")
+    if not 0 <= args.error_rate <= 1:
+        sys.exit(f"Wrong error rate: {args.error_rate}")
+
+    deployment_latency_ms = {}
+
+    for item in (args.deployment_latency_ms or '').split(','):
+        if item.strip():
+            name, _, value = item.partition('=')
+            try:
+                deployment_latency_ms[name.strip()] = float(value)
+            except ValueError:
+                sys.exit(f"Wrong deployment latency: {item}")
+
+    state = FakeOpenAIState(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        per_token_ms=args.per_token_ms,
+        words=args.words,
+        max_concurrency=args.max_concurrency,
+        rpm=args.rpm,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        deployment_latency_ms=deployment_latency_ms,
+    )
+
+    server = serve(args.address, args.port, state)
+
+    logger.info(f"Serving fake OpenAI API on http://{args.address}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Shutting down. Final counters: {json.dumps(state.to_dict())}")
+    finally:
+        server.server_close()
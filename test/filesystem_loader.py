@@ -1,12 +1,15 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_docling import DoclingLoader
 from typing import Any, Dict, List, Optional
 import asyncio
-import mimetypes
+import base64
+import gzip
 import os
-import pypandoc
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from logger import get_logger
+# The extractors are shared with the batch runner, the job queue and the directory watcher
+from src.extractors import extract_docx_text, extract_file_content, extract_odt_text, get_document_data, read_docx_with_docling, read_with_pandoc  # noqa: F401
 
 
 def load_local_documents(
@@ -142,165 +145,29 @@ async def load_local_documents_async(
     logger.info(f"Successfully processed {len(results)}/{len(file_paths)} files from {dir_path}")
     return results
 
-async def get_document_data(file_path: str, file_id: Optional[str] = None) -> Dict[str, Any]:
+def compress_document_data(document: Dict[str, Any], encoding: str = "gzip") -> Dict[str, Any]:
     """
-    Get both metadata and content for a document file.
+    Compress the content of a document, as returned by get_document_data, for the run input.
 
     Args:
-        file_path (str): Path to the file
-        file_id (str, optional): ID to assign to the file
+        document (Dict[str, Any]): Dictionary containing file metadata and content
+        encoding (str): Compression of the content, either "gzip" or "zstd"
 
     Returns:
-        Dict[str, Any]: Dictionary containing file metadata and content
-    """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-
-    # Extract content
-    content = await extract_file_content(file_path)
-
-    # Get metadata
-    filename = os.path.basename(file_path)
-    mime_type = await get_file_mime_type(file_path)
-    file_size = os.path.getsize(file_path)
-
-    # Simulate the information structure of the files in Open WebUI
-    return {
-        "file": {
-            "id": file_id or os.path.splitext(filename)[0],
-            "filename": filename,
-            "meta": {
-                "content_type": mime_type,
-                "size": file_size
-            },
-            "data": {
-                "content": content
-            }
-        }
-    }
-
-# Main function to extract file content based on type
-async def extract_file_content(file_path: str) -> str:
+        Dict[str, Any]: The document, with its content base64 encoded after compression
     """
-    Extract content from a file based on its extension.
-
-    Args:
-        file_path (str): Path to the file
-
-    Returns:
-        str: Extracted text content
-    """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-
-    # Get file extension in lowercase
-    extension = os.path.splitext(file_path)[1].lower()
-
-    # Map extensions to handler functions
-    handlers = {
-        '.txt': read_text_file,
-        '.md': read_markdown_file,
-        '.docx': read_docx_file,
-        '.pdf': read_pdf_file,
-        '.rtf': read_rtf_file,
-        '.odt': read_odt_file
-    }
-
-    if extension in handlers:
-        return await handlers[extension](file_path)
+    data = document["file"]["data"]
+    content = data.get("content", '').encode("utf-8")
+
+    if encoding == "gzip":
+        compressed = gzip.compress(content)
+    elif encoding == "zstd":
+        import zstandard
+        compressed = zstandard.ZstdCompressor().compress(content)
     else:
-        raise ValueError(f"Unsupported file format: {extension}")
-
-# File MIME type detection
-async def get_file_mime_type(file_path: str) -> str:
-    """
-    Get the MIME type of a file.
-
-    Args:
-        file_path (str): Path to the file
-
-    Returns:
-        str: MIME type of the file
-    """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-
-    if not mimetypes.inited:
-        # Configure acceptable mimetypes
-        mimetypes.init()
-        mimetypes.add_type('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx')
-        mimetypes.add_type('application/pdf', '.pdf')
-        mimetypes.add_type('text/plain', '.txt')
-        mimetypes.add_type('text/markdown', '.md')
-        mimetypes.add_type('application/rtf', '.rtf')
-        mimetypes.add_type('application/vnd.oasis.opendocument.text', '.odt')
-
-    # Get mime type based on file extension
-    mime_type, _ = mimetypes.guess_type(file_path)
-
-    # Fallback if mime type couldn't be determined
-    if not mime_type:
-        # Check file signature
-        file_start = await read_file_start(file_path)
-
-        if file_start.startswith(b'%PDF'):
-            return 'application/pdf'
-        elif file_start.startswith(b'\x50\x4B\x03\x04'):  # ZIP signature (docx, xlsx)
-            if file_path.endswith('.docx'):
-                return 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-
-        return 'application/octet-stream'
-
-    return mime_type
-
-async def read_file_start(file_path: str, bytes_to_read: int = 512) -> bytes:
-    """Read the first bytes of a file to determine its type."""
-    def _read(path: str, size: int) -> bytes:
-        with open(path, 'rb') as f:
-            return f.read(size)
-
-    return await asyncio.to_thread(_read, file_path, bytes_to_read)
+        raise ValueError(f"Unsupported content encoding: {encoding}")
 
-# Content readers for different file types
-async def read_text_file(file_path: str) -> str:
-    """Read content from a plain text file."""
-    def _read(path: str) -> str:
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+    data["content"] = base64.b64encode(compressed).decode("ascii")
+    data["content_encoding"] = encoding
 
-    return await asyncio.to_thread(_read, file_path)
-
-async def read_markdown_file(file_path: str) -> str:
-    """Read content from a markdown file."""
-    # For basic markdown files, we can treat them as text
-    return await read_text_file(file_path)
-
-async def read_docx_file(file_path: str) -> str:
-    """Extract text from DOCX file using DoclingLoader."""
-    def _read_with_docling(path: str) -> str:
-        documents = DoclingLoader(file_path=path).load()
-        return '\n'.join([d.page_content for d in documents])
-
-    return await asyncio.to_thread(_read_with_docling, file_path)
-
-async def read_pdf_file(file_path: str) -> str:
-    """Extract text from PDF file using PyPDFLoader."""
-    def _read_with_pypdf(path: str) -> str:
-        documents = PyPDFLoader(path).load()
-        return '\n'.join([d.page_content for d in documents])
-
-    return await asyncio.to_thread(_read_with_pypdf, file_path)
-
-async def read_rtf_file(file_path: str) -> str:
-    """Extract text from RTF file using pypandoc."""
-    try:
-        return await asyncio.to_thread(pypandoc.convert_file, file_path, "plain")
-    except ImportError:
-        raise ImportError("pypandoc is required for reading RTF files. Install it with 'pip install pypandoc'.")
-
-async def read_odt_file(file_path: str) -> str:
-    """Extract text from ODT file using pypandoc."""
-    try:
-        return await asyncio.to_thread(pypandoc.convert_file, file_path, "plain")
-    except ImportError:
-        raise ImportError("pypandoc is required for reading ODT files. Install it with 'pip install pypandoc'.")
\ No newline at end of file
+    return document
\ No newline at end of file
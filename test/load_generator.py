@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Load Generator.
+
+This script load tests a running LangGraph server hosting the document summarization
+agent, using the asynchronous client of the LangGraph SDK. It supports closed-loop
+arrivals (a fixed number of concurrent users, each sending a new request as soon as
+the previous one completes) and open-loop arrivals (requests sent as a Poisson process
+at a fixed rate, regardless of how fast the server responds). Requests are built out of
+a configurable mix of synthetic document sizes, or out of the documents of a directory.
+At the end of the run, latency percentiles, a latency histogram and error rates are reported,
+along with the time the LLM calls of the runs waited for the shared LLM capacity per tenant.
+Running a bulk load test and an interactive one with different tenants side by side shows
+whether the interactive requests keep a low latency during bulk jobs.
+
+Combined with fake_openai_server.py, it allows capacity planning of the server without
+consuming real Azure OpenAI quota.
+
+Usage:
+1. Install required packages:
+   pip install asyncio langchain-community langchain-docling langgraph-sdk pypandoc
+
+2. Start the LangGraph server (optionally pointing it at fake_openai_server.py).
+
+3. Run the script using the command:
+    python load_generator.py [OPTIONS]
+
+    Options:
+    -a, --address: LangGraph server's IP address (default: 127.0.0.1)
+    -p, --port: LangGraph server's serving port (default: 2024)
+    -k, --key: LangSmith API access key (optional)
+    -m, --mode: Arrival mode, "closed" or "open" (default: closed)
+    -c, --concurrency: Number of concurrent users in closed-loop mode (default: 4)
+    -r, --rate: Arrival rate in requests per second in open-loop mode (default: 1.0)
+    -n, --requests: Total number of requests to send (default: 20)
+    -D, --duration: Maximum duration of the test in seconds (optional)
+    -x, --mix: Mix of document size classes and their weights (default: small=0.6,medium=0.3,large=0.1)
+    -z, --sizes: Size of every document size class in KB (default: small=2,medium=32,large=256)
+    -F, --files-per-request: Number of documents in every request (default: 1)
+    -t, --threadless: Use threadless client execution (default: False)
+    -T, --timeout: Timeout of every request in seconds (default: 600)
+    -d, --directory: Documents directory path to sample documents from instead of synthetic ones (optional)
+    -o, --output: Path of a JSON file to store the report in (optional)
+    -s, --seed: Random seed for reproducible request mixes and arrivals (default: 42)
+    -N, --tenant: Tenant of the requests, sharing the LLM capacity with other tenants by weight (optional)
+
+    Example:
+    python load_generator.py -m open -r 2 -n 100 -x small=0.8,large=0.2 -z small=4,large=512 -o report.json
+    python load_generator.py -c 8 -n 500 -x large=1 -N bulk & python load_generator.py -m open -r 0.5 -x small=1 -N interactive
+"""
+from langgraph_sdk import get_client
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+
+from logger import get_logger
+
+
+SYNTHETIC_WORDS = (
+    "bank", "account", "customer", "transaction", "policy", "agreement", "payment", "balance",
+    "interest", "credit", "loan", "report", "quarter", "revenue", "risk", "compliance",
+    "τράπεζα", "λογαριασμός", "πελάτης", "συναλλαγή", "πολιτική", "σύμβαση", "πληρωμή", "υπόλοιπο",
+)
+
+HISTOGRAM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parse a comma separated list of name=value pairs."""
+    weights = {}
+
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = item.partition("=")
+
+        if not name or not number:
+            raise ValueError(f"Invalid name=value pair: {item}")
+
+        weights[name.strip()] = float(number)
+
+    return weights
+
+def synthetic_document(idx: int, size_kb: float, rng: random.Random) -> Dict[str, Any]:
+    """Build a synthetic document with the information structure of the files in Open WebUI."""
+    target = int(size_kb * 1024)
+    paragraphs = []
+    length = 0
+
+    while length < target:
+        sentence = " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(rng.randint(8, 24))).capitalize() + ". "
+        paragraph = "".join(sentence for _ in range(rng.randint(2, 6)))
+        paragraphs.append(paragraph.strip())
+        length += len(paragraph.encode("utf-8")) + 2
+
+    content = "\n\n".join(paragraphs)
+
+    return {
+        "file": {
+            "id": f"synthetic-{idx}-{uuid.uuid4().hex[:8]}",
+            "filename": f"synthetic-{idx}.txt",
+            "meta": {
+                "content_type": "text/plain",
+                "size": len(content.encode("utf-8")),
+            },
+            "data": {
+                "content": content,
+            },
+        }
+    }
+
+
+class RequestFactory:
+    '''
+    This is a class for building the files of every request of the
+    load test, either out of synthetic documents of the configured
+    size classes or out of the documents of a local directory.
+    '''
+    def __init__(
+        self,
+        mix: Dict[str, float],
+        sizes: Dict[str, float],
+        files_per_request: int,
+        seed: int,
+        documents: Optional[List[Dict[str, Any]]] = None,
+        tenant: Optional[str] = None,
+    ):
+        unknown = set(mix) - set(sizes)
+        if not documents and unknown:
+            raise ValueError(f"No size configured for document class(es): {', '.join(sorted(unknown))}")
+
+        self.mix = mix
+        self.sizes = sizes
+        self.files_per_request = files_per_request
+        self.documents = documents or []
+        self.tenant = tenant
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    def _document(self, size_class: str) -> Dict[str, Any]:
+        # Synthetic content is generated once per size class and re-identified for every request
+        if size_class not in self._cache:
+            self._cache[size_class] = synthetic_document(len(self._cache), self.sizes[size_class], self.rng)
+
+        self.counter += 1
+        document = json.loads(json.dumps(self._cache[size_class]))
+        document["file"]["id"] = f"{size_class}-{self.counter}"
+        document["file"]["filename"] = f"{size_class}-{self.counter}.txt"
+
+        return document
+
+    def build(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the files of the next request and the label of its size class."""
+        if self.documents:
+            files = [self.rng.choice(self.documents) for _ in range(self.files_per_request)]
+            return "directory", files
+
+        classes = self.rng.choices(list(self.mix), weights=list(self.mix.values()), k=self.files_per_request)
+        label = classes[0] if len(set(classes)) == 1 else "mixed"
+
+        return label, [self._document(size_class) for size_class in classes]
+
+
+class LoadStatistics:
+    '''
+    This is a class for collecting the outcome of every request of
+    the load test and reporting latency percentiles, histograms and
+    error rates, both overall and per document size class.
+    '''
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_labels: Dict[str, int] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.queue_waits: Dict[str, Dict[str, float]] = {}
+        self.sent = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, label: str, latency: float, error: Optional[str] = None) -> None:
+        """Record the outcome of a request."""
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            self.error_labels[label] = self.error_labels.get(label, 0) + 1
+        else:
+            self.latencies.setdefault(label, []).append(latency)
+
+    def record_stages(self, stage_latency: Dict[str, Dict[str, Any]]) -> None:
+        """Record the LLM latency of every stage reported by a completed run."""
+        for stage, stats in (stage_latency or {}).items():
+            totals = self.stages.setdefault(stage, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+            totals["calls"] += stats["calls"]
+            totals["total_s"] += stats["mean_s"] * stats["calls"]
+            totals["max_s"] = max(totals["max_s"], stats["max_s"])
+
+    def record_queue_wait(self, queue_wait: Optional[Dict[str, Any]]) -> None:
+        """Record the time the LLM calls of a completed run waited for the shared LLM capacity, per tenant."""
+        if not queue_wait:
+            return
+
+        totals = self.queue_waits.setdefault(queue_wait["tenant"], {"runs": 0, "waits": 0, "total_s": 0.0, "max_p95_s": 0.0, "max_s": 0.0})
+        totals["runs"] += 1
+        totals["waits"] += queue_wait["waits"]
+        totals["total_s"] += queue_wait["mean_s"] * queue_wait["waits"]
+        totals["max_p95_s"] = max(totals["max_p95_s"], queue_wait["p95_s"])
+        totals["max_s"] = max(totals["max_s"], queue_wait["max_s"])
+
+    @staticmethod
+    def percentile(values: List[float], pct: float) -> float:
+        """Get the percentile of a list of values using the nearest-rank method."""
+        if not values:
+            return float("nan")
+
+        ordered = sorted(values)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+
+        return ordered[rank - 1]
+
+    @staticmethod
+    def histogram(values: List[float]) -> List[Tuple[str, int]]:
+        """Get the number of latencies falling into every histogram bucket."""
+        counts = []
+        lower = 0
+
+        for upper in HISTOGRAM_BUCKETS + (math.inf,):
+            name = f"<= {upper:g}s" if upper != math.inf else f"> {lower:g}s"
+            counts.append((name, sum(1 for v in values if lower < v <= upper or (lower == 0 and v == 0))))
+            lower = upper
+
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the report of the load test as a dictionary."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        latencies = [v for values in self.latencies.values() for v in values]
+        completed = len(latencies)
+        failed = sum(self.errors.values())
+
+        def _stats(values: List[float]) -> Dict[str, float]:
+            return {
+                "count": len(values),
+                "mean": sum(values) / len(values) if values else float("nan"),
+                "p50": self.percentile(values, 50),
+                "p90": self.percentile(values, 90),
+                "p95": self.percentile(values, 95),
+                "p99": self.percentile(values, 99),
+                "max": max(values) if values else float("nan"),
+            }
+
+        return {
+            "elapsed_s": elapsed,
+            "sent": self.sent,
+            "completed": completed,
+            "failed": failed,
+            "error_rate": failed / (completed + failed) if completed + failed else 0.0,
+            "throughput_rps": completed / elapsed if elapsed > 0 else 0.0,
+            "latency_s": _stats(latencies),
+            "latency_by_class_s": {label: _stats(values) for label, values in sorted(self.latencies.items())},
+            "errors_by_type": dict(sorted(self.errors.items())),
+            "errors_by_class": dict(sorted(self.error_labels.items())),
+            "histogram": self.histogram(latencies),
+            "stage_latency_s": {
+                stage: {"calls": totals["calls"], "mean": totals["total_s"] / totals["calls"] if totals["calls"] else float("nan"), "max": totals["max_s"]}
+                for stage, totals in sorted(self.stages.items())
+            },
+            "queue_wait_s": {
+                tenant: {"runs": totals["runs"], "waits": totals["waits"], "mean": totals["total_s"] / totals["waits"] if totals["waits"] else float("nan"),
+                         "max_p95": totals["max_p95_s"], "max": totals["max_s"]}
+                for tenant, totals in sorted(self.queue_waits.items())
+            },
+        }
+
+    def log(self) -> None:
+        """Log a human readable report of the load test."""
+        report = self.summary()
+
+        logger.info(100*"=")
+        logger.info(f"Requests sent: {report['sent']}, completed: {report['completed']}, failed: {report['failed']} "
+                    f"(error rate {report['error_rate']:.2%}) in {report['elapsed_s']:.1f} seconds")
+        logger.info(f"Throughput: {report['throughput_rps']:.3f} requests/second")
+
+        for label, stats in [("all", report["latency_s"])] + list(report["latency_by_class_s"].items()):
+            logger.info(f"Latency [{label}] n={stats['count']} mean={stats['mean']:.2f}s p50={stats['p50']:.2f}s "
+                        f"p90={stats['p90']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s max={stats['max']:.2f}s")
+
+        for stage, stats in report["stage_latency_s"].items():
+            logger.info(f"LLM latency [{stage}] calls={stats['calls']} mean={stats['mean']:.2f}s max={stats['max']:.2f}s")
+
+        for tenant, stats in report["queue_wait_s"].items():
+            logger.info(f"LLM queue wait [{tenant}] runs={stats['runs']} waits={stats['waits']} mean={stats['mean']:.2f}s "
+                        f"max p95={stats['max_p95']:.2f}s max={stats['max']:.2f}s")
+
+        peak = max((count for _, count in report["histogram"]), default=0)
+        logger.info("Latency histogram:")
+        for name, count in report["histogram"]:
+            bar = "#" * (round(50 * count / peak) if peak else 0)
+            logger.info(f"  {name:>10} | {count:6d} {bar}")
+
+        for error, count in report["errors_by_type"].items():
+            logger.info(f"Error [{error}]: {count}")
+
+        logger.info(100*"=")
+
+
+async def send_request(client: Any, factory: RequestFactory, stats: LoadStatistics, threadless: bool, timeout: float) -> None:
+    """Send a single summarization request and record its outcome."""
+    label, files = factory.build()
+    stats.sent += 1
+    start_time = time.monotonic()
+
+    try:
+        thread_id = None
+
+        if not threadless:
+            thread = await client.threads.create(thread_id=str(uuid.uuid4()))
+            thread_id = thread["thread_id"]
+
+        async with asyncio.timeout(timeout):
+            response = await client.runs.wait(
+                thread_id,
+                "agent",    # Name of assistant (defined in langgraph.json)
+                on_disconnect="cancel",     # Cancel the run, and its LLM calls, if the client goes away
+                input={
+                    'files': files,
+                    **({'tenant': factory.tenant} if factory.tenant else {}),
+                },
+            )
+
+        duration = time.monotonic() - start_time
+
+        if isinstance(response, dict) and "__error__" in response:
+            stats.record(label, duration, error=str(response["__error__"].get("error", "RunError")))
+        elif not isinstance(response, dict) or len(response.get("result", {}) or {}) < len({f["file"]["id"] for f in files}):
+            stats.record(label, duration, error="IncompleteResult")
+        else:
+            stats.record(label, duration)
+            stats.record_stages(response.get("stage_latency", {}))
+            stats.record_queue_wait(response.get("queue_wait"))
+    except asyncio.TimeoutError:
+        stats.record(label, time.monotonic() - start_time, error="Timeout")
+    except Exception as e:
+        stats.record(label, time.monotonic() - start_time, error=type(e).__name__)
+        logger.debug(f"Request failed: {e}")
+
+async def closed_loop(client: Any, factory: RequestFactory, stats: LoadStatistics, concurrency: int, requests: int, deadline: float, threadless: bool, timeout: float) -> None:
+    """Run the load test with a fixed number of concurrent users."""
+    remaining = [requests]
+
+    async def _user() -> None:
+        while remaining[0] > 0 and time.monotonic() < deadline:
+            remaining[0] -= 1
+            await send_request(client, factory, stats, threadless, timeout)
+
+    await asyncio.gather(*[_user() for _ in range(concurrency)])
+
+async def open_loop(client: Any, factory: RequestFactory, stats: LoadStatistics, rate: float, requests: int, deadline: float, threadless: bool, timeout: float, seed: int) -> None:
+    """Run the load test with Poisson arrivals at a fixed rate."""
+    rng = random.Random(seed)
+    tasks = []
+
+    for _ in range(requests):
+        if time.monotonic() >= deadline:
+            break
+
+        tasks.append(asyncio.create_task(send_request(client, factory, stats, threadless, timeout)))
+        await asyncio.sleep(rng.expovariate(rate))
+
+    await asyncio.gather(*tasks)
+
+async def run_load_test(args: argparse.Namespace, documents: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Run the load test against the LangGraph deployment and return its report."""
+    deployment_url = f"http://{args.address}:{args.port}"
+    client = get_client(url=deployment_url, api_key=args.key)
+
+    factory = RequestFactory(
+        mix=parse_weights(args.mix),
+        sizes=parse_weights(args.sizes),
+        files_per_request=args.files_per_request,
+        seed=args.seed,
+        documents=documents,
+        tenant=args.tenant,
+    )
+    stats = LoadStatistics()
+    deadline = time.monotonic() + args.duration if args.duration else math.inf
+
+    logger.info(f"Starting {args.mode}-loop load test against {deployment_url} with {args.requests} requests")
+
+    if args.mode == "closed":
+        await closed_loop(client, factory, stats, args.concurrency, args.requests, deadline, args.threadless, args.timeout)
+    else:
+        await open_loop(client, factory, stats, args.rate, args.requests, deadline, args.threadless, args.timeout, args.seed)
+
+    stats.finished = time.monotonic()
+    stats.log()
+
+    return stats.summary()
+
+logger = None
+
+if __name__ == "__main__":
+    logger = get_logger("load_generator")
+
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Load Generator')
+    parser.add_argument("-a", "--address", help="LangGraph server's IP address", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="LangGraph server's serving port", type=int, default=2024)
+    parser.add_argument("-k", "--key", help="LangSmith API access key", type=str, required=False)
+    parser.add_argument("-m", "--mode", help="Arrival mode", type=str, choices=["closed", "open"], default="closed")
+    parser.add_argument("-c", "--concurrency", help="Number of concurrent users in closed-loop mode", type=int, default=4)
+    parser.add_argument("-r", "--rate", help="Arrival rate in requests per second in open-loop mode", type=float, default=1.0)
+    parser.add_argument("-n", "--requests", help="Total number of requests to send", type=int, default=20)
+    parser.add_argument("-D", "--duration", help="Maximum duration of the test in seconds", type=float, required=False)
+    parser.add_argument("-x", "--mix", help="Mix of document size classes and their weights", type=str, default="small=0.6,medium=0.3,large=0.1")
+    parser.add_argument("-z", "--sizes", help="Size of every document size class in KB", type=str, default="small=2,medium=32,large=256")
+    parser.add_argument("-F", "--files-per-request", help="Number of documents in every request", type=int, default=1)
+    parser.add_argument("-t", "--threadless", help="Use threadless client execution", action="store_true")
+    parser.add_argument("-T", "--timeout", help="Timeout of every request in seconds", type=float, default=600)
+    parser.add_argument("-d", "--directory", help="Documents directory path to sample documents from", type=str, required=False)
+    parser.add_argument("-o", "--output", help="Path of a JSON file to store the report in", type=str, required=False)
+    parser.add_argument("-s", "--seed", help="Random seed for reproducible request mixes and arrivals", type=int, default=42)
+    parser.add_argument("-N", "--tenant", help="Tenant of the requests, sharing the LLM capacity with other tenants by weight", type=str, required=False)
+    args = parser.parse_args()
+
+    try:
+        ipaddress.ip_address(args.address)
+    except ValueError:
+        sys.exit(f"Wrong IP address: {args.address}")
+    if args.port < 0 or args.port > 65535:
+        sys.exit(f"Wrong serving port: {args.port}")
+    if args.concurrency < 1 or args.requests < 1 or args.files_per_request < 1 or args.rate <= 0:
+        sys.exit("Concurrency, requests, files per request and rate must be positive")
+
+    documents = None
+
+    if args.directory:
+        if not os.path.exists(args.directory) or not os.path.isdir(args.directory):
+            sys.exit(f"Wrong path to directory with documents: {args.directory}")
+
+        from filesystem_loader import load_local_documents
+
+        documents = load_local_documents(args.directory)
+
+        if not documents:
+            sys.exit(f"No documents found in directory {args.directory}.")
+
+    try:
+        parse_weights(args.mix)
+        parse_weights(args.sizes)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    report = asyncio.run(run_load_test(args, documents))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        logger.info(f"Report stored in {args.output}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Synthetic Corpus Generator.
+
+This script generates a deterministic corpus of synthetic documents, in the information
+structure of the files in Open WebUI, to benchmark the agent with. Documents are either
+English, Greek or mixed plain text, or HTML-laden extractions as Open WebUI produces them
+out of web pages and office documents (tags, comments, entities, runs of spaces and blank
+lines and the broken "label .: value" layouts of Greek forms). The same kind, size and
+seed always produce the same document, so that benchmark results are comparable between
+versions of the agent.
+
+Usage:
+    python synthetic_corpus.py [OPTIONS]
+
+    Options:
+    -k, --kinds: Kinds of documents, among "english", "greek", "mixed" and "html" (default: all)
+    -z, --sizes: Sizes of the documents in KB (default: 1 64 1024)
+    -s, --seed: Random seed of the corpus (default: 0)
+    -o, --output: Path of a JSONL file to write the corpus to, e.g. as the input of the batch runner (required)
+
+    Example:
+    python synthetic_corpus.py -k greek html -z 1 1024 51200 -o corpus.jsonl
+"""
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import json
+import random
+import sys
+
+from logger import get_logger
+
+
+ENGLISH_WORDS = (
+    "the", "bank", "account", "customer", "transaction", "policy", "agreement", "payment", "balance", "of",
+    "interest", "credit", "loan", "report", "quarter", "revenue", "risk", "compliance", "and", "to",
+    "shall", "be", "provided", "within", "days", "notice", "contract", "party", "terms", "period",
+)
+GREEK_WORDS = (
+    "η", "τράπεζα", "λογαριασμός", "πελάτης", "συναλλαγή", "πολιτική", "σύμβαση", "πληρωμή", "υπόλοιπο", "του",
+    "τόκος", "πίστωση", "δάνειο", "έκθεση", "τρίμηνο", "έσοδα", "κίνδυνος", "συμμόρφωση", "και", "στο",
+    "θα", "παρέχεται", "εντός", "ημερών", "ειδοποίηση", "συμβαλλόμενος", "όροι", "περίοδος", "Αριθμός", "Γ.Ε.ΜΗ",
+)
+HTML_BLOCKS = (
+    "<p>{}</p>",
+    "<div class=\"section\"><span>{}</span></div>",
+    "<!-- generated by the document converter -->\n<p>{}</p>",
+    "<li>{}&nbsp;&amp;&nbsp;{}</li>",
+    "<table><tr><td>Αριθμός Γ.Ε.ΜΗ .: {}</td><td>{}</td></tr></table>",
+    "<h2>{}</h2>\n\n\n\n",
+    "<p>{}   ,   {} .</p>",
+)
+DOCUMENT_KINDS = ("english", "greek", "mixed", "html")
+
+logger = None
+
+
+def _sentences(rng: random.Random, words: List[str]) -> Iterator[str]:
+    """Yield synthetic sentences made of words drawn from a vocabulary."""
+    while True:
+        yield " ".join(rng.choices(words, k=rng.randint(8, 24))).capitalize() + "."
+
+def generate_text(kind: str, size_bytes: int, seed: int = 0) -> str:
+    """
+    Generate the deterministic text of a synthetic document.
+
+    Args:
+        kind (str): The kind of the document, one of "english", "greek", "mixed" or "html".
+        size_bytes (int): The minimum UTF-8 size of the text in bytes.
+        seed (int): The random seed of the corpus.
+
+    Returns:
+        str: The text of the document.
+    """
+    if kind not in DOCUMENT_KINDS:
+        raise ValueError(f"Document kind must be one of: {', '.join(DOCUMENT_KINDS)}.")
+
+    # String seeds are hashed deterministically, unlike the built-in hash of strings
+    rng = random.Random(f"{kind}-{size_bytes}-{seed}")
+    words = list(ENGLISH_WORDS if kind == "english" else GREEK_WORDS if kind == "greek" else ENGLISH_WORDS + GREEK_WORDS)
+    sentences = _sentences(rng, words)
+    parts = []
+    length = 0
+
+    while length < size_bytes:
+        if kind == "html":
+            block = rng.choice(HTML_BLOCKS)
+            part = block.format(*(next(sentences) for _ in range(block.count("{}")))) + "\n"
+        else:
+            part = " ".join(next(sentences) for _ in range(rng.randint(2, 6))) + "\n\n"
+
+        parts.append(part)
+        length += len(part.encode("utf-8"))
+
+    return "".join(parts)
+
+def generate_document(kind: str, size_bytes: int, seed: int = 0) -> Dict[str, Any]:
+    """Generate a deterministic synthetic document with the information structure of the files in Open WebUI."""
+    content = generate_text(kind, size_bytes, seed)
+    name = f"{kind}-{size_bytes}-{seed}"
+
+    return {
+        "file": {
+            "id": name,
+            "filename": f"{name}.{'html' if kind == 'html' else 'txt'}",
+            "meta": {
+                "content_type": "text/html" if kind == "html" else "text/plain",
+                "size": len(content.encode("utf-8")),
+            },
+            "data": {
+                "content": content,
+            },
+        }
+    }
+
+def generate_corpus(kinds: Optional[List[str]] = None, sizes_kb: Optional[List[float]] = None, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Lazily generate a document of every kind and size of a corpus."""
+    for kind in kinds or DOCUMENT_KINDS:
+        for size_kb in sizes_kb or (1, 64, 1024):
+            yield generate_document(kind, int(size_kb * 1024), seed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarization LangGraph Agent Synthetic Corpus Generator')
+    parser.add_argument("-k", "--kinds", help="Kinds of documents", type=str, nargs='+', choices=DOCUMENT_KINDS, default=list(DOCUMENT_KINDS))
+    parser.add_argument("-z", "--sizes", help="Sizes of the documents in KB", type=float, nargs='+', default=[1, 64, 1024])
+    parser.add_argument("-s", "--seed", help="Random seed of the corpus", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Path of a JSONL file to write the corpus to", type=str, required=True)
+    args = parser.parse_args()
+
+    if any(size <= 0 for size in args.sizes):
+        sys.exit(f"Wrong document sizes: {args.sizes}")
+
+    logger = get_logger("synthetic_corpus")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        for document in generate_corpus(args.kinds, args.sizes, args.seed):
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            logger.info(f"Generated {document['file']['filename']} ({document['file']['meta']['size']} bytes)")
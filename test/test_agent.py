@@ -23,6 +23,8 @@ Usage:
     -t, --threadless: Use threadless client execution (default: False)
     -d, --directory: Documents directory path (default: ../documents)
     -f, --files: List of specific files to process (default: all files in the directory)
+    -z, --compress: Send the content of the files compressed, either "gzip" or "zstd" (optional)
+    -o, --output-mode: Shape of the documents of the output, either "lean", "stats" or "full" (default: configured by the server)
 
     Example:
     python test_agent.py -a 127.0.0.1 -p 2024 -k YOUR_API_KEY -s True -d path/to/documents/dir -f file1.pdf file2.docx
@@ -37,11 +39,11 @@ import sys
 import time
 import uuid
 
-from filesystem_loader import load_local_documents
+from filesystem_loader import compress_document_data, load_local_documents
 from logger import get_logger
 
 
-async def test_client(url: str, port: int, api_key: str, files: List[Dict[str, Any]], syncronous: bool=False, threadless: bool=False):
+async def test_client(url: str, port: int, api_key: str, files: List[Dict[str, Any]], syncronous: bool=False, threadless: bool=False, output_mode: str=None):
     """Test client connection with one or more input files"""
     logger.info("=== Document Summarization Agent Test ===")
 
@@ -77,8 +79,10 @@ async def test_client(url: str, port: int, api_key: str, files: List[Dict[str, A
             full_response = client.runs.wait(
                 thread_id,
                 "agent",    # Name of assistant (defined in langgraph.json)
+                on_disconnect="cancel",     # Cancel the run, and its LLM calls, if the client goes away
                 input={
                     'files': files,
+                    **({'output_mode': output_mode} if output_mode else {}),
                 },
             )
 
@@ -108,8 +112,10 @@ async def test_client(url: str, port: int, api_key: str, files: List[Dict[str, A
             full_response = await client.runs.wait(
                 thread_id,
                 "agent",    # Name of assistant (defined in langgraph.json)
+                on_disconnect="cancel",     # Cancel the run, and its LLM calls, if the client goes away
                 input={
                     'files': files,
+                    **({'output_mode': output_mode} if output_mode else {}),
                 },
             )
 
@@ -136,6 +142,8 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threadless", help="Use threadless client execution", type=bool, default=False)
     parser.add_argument("-d", "--directory", help="Documents directory path", type=str, default="../documents")
     parser.add_argument("-f", "--files", help="List of specific files to process", type=str, nargs='+', default=[])
+    parser.add_argument("-z", "--compress", help="Send the content of the files compressed", type=str, choices=["gzip", "zstd"], required=False)
+    parser.add_argument("-o", "--output-mode", help="Shape of the documents of the output", type=str, choices=["lean", "stats", "full"], required=False)
     args = parser.parse_args()
 
     try:
@@ -155,8 +163,11 @@ if __name__ == "__main__":
     if not test_files:
         sys.exit(f"No test files found in directory {args.directory}.")
 
+    if args.compress:
+        test_files = [compress_document_data(file, args.compress) for file in test_files]
+
     logger = get_logger("test_agent")
 
     logger.info(f"Found {len(test_files)} test files")
 
-    asyncio.run(test_client(args.address, args.port, args.key, test_files, syncronous=args.synchronous, threadless=args.threadless))
\ No newline at end of file
+    asyncio.run(test_client(args.address, args.port, args.key, test_files, syncronous=args.synchronous, threadless=args.threadless, output_mode=args.output_mode))
\ No newline at end of file
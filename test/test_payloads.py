@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Document Summarization LangGraph Agent Payload Size Test.
+
+This script tests that the runs with a budget are planned from the lengths of the texts of
+their documents, whether inline, compressed or referenced in the file store, and never from
+the size of the original file declared in their metadata, e.g. that of a PDF much larger
+than its text.
+
+Usage:
+    python test_payloads.py [-v]
+"""
+import asyncio
+import base64
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_corpus import generate_text
+
+
+TEXT = generate_text("english", 60 * 1024, seed=0)
+# The size of e.g. a PDF whose text is TEXT
+DECLARED_SIZE = 3 * 1024 * 1024
+STORE_DIR = tempfile.mkdtemp(prefix="payloads-")
+
+# The agent reads its configuration on import, so the environment is set before it is imported by the tests
+os.environ["FILE_STORE_DIR"] = STORE_DIR
+os.environ["LANGSMITH_TRACING"] = "false"
+
+
+def make_file(data: dict, file_id: str = "doc") -> dict:
+    return {"file": {"id": file_id, "filename": f"{file_id}.pdf", "meta": {"content_type": "application/pdf", "size": DECLARED_SIZE}, "data": data}}
+
+
+class ContentSizeTest(unittest.TestCase):
+    '''
+    This is a class for testing the sizes of the documents of a run the
+    budget planner is given, and the plan it makes from them.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        from src.config import FILE_STORE_DIR
+
+        cls.store_dir = FILE_STORE_DIR
+
+        with open(os.path.join(cls.store_dir, "doc.txt"), "w", encoding="utf-8") as f:
+            f.write(TEXT)
+        with open(os.path.join(cls.store_dir, "doc.txt.gz"), "wb") as f:
+            f.write(gzip.compress(TEXT.encode("utf-8")))
+
+    def test_inline_text_ignores_declared_size(self):
+        from src.payloads import content_size
+
+        self.assertEqual(content_size(make_file({"content": TEXT})["file"]["data"]), len(TEXT))
+
+    def test_compressed_and_referenced_content(self):
+        from src.payloads import content_size
+
+        size = len(TEXT.encode("utf-8"))
+        compressed = {"content": base64.b64encode(gzip.compress(TEXT.encode("utf-8"))).decode("ascii"), "content_encoding": "gzip"}
+
+        self.assertEqual(content_size(compressed), size)
+        self.assertEqual(content_size({"path": "doc.txt"}), size)
+        self.assertEqual(content_size({"path": "doc.txt.gz"}), size)
+
+    def test_plan_ignores_declared_size(self):
+        from src.budget import close_budget, get_budget
+        from src.nodes_edges import _map_input
+
+        config = {"configurable": {"run_id": "test-payloads"}}
+        asyncio.run(_map_input({"files": [make_file({"content": TEXT})], "budget": {"max_tokens": 60000}}, config))
+        budget = get_budget("test-payloads")
+
+        try:
+            self.assertEqual(budget.mode, "full")
+            self.assertEqual(budget.map_ratio, 1.0)
+        finally:
+            close_budget("test-payloads")
+
+
+if __name__ == "__main__":
+    unittest.main()